@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Almacén Clave-Valor con Vencimiento
+===================================
+
+Guarda datos de vida corta (códigos de recuperación de contraseña, tokens de
+un solo uso, etc.) en SQLite, así todos los workers de gunicorn ven los
+mismos valores:
+
+- Cada clave vence a los `ttl` segundos; una clave vencida nunca se devuelve.
+- tomar() lee y borra la clave en una sola sentencia, por lo que un token de
+  un solo uso no puede canjearse dos veces aunque lleguen dos peticiones a la
+  vez a workers distintos.
+- Un hilo en segundo plano borra periódicamente las claves vencidas para que
+  la tabla no crezca con códigos que nadie usó.
+- Los espacios separan distintos usos dentro del mismo archivo.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class AlmacenTTL:
+    """Almacén clave-valor con vencimiento, compartido entre procesos"""
+
+    def __init__(self, db_path: str = os.path.join('data', 'almacen_ttl.db'), espacio: str = 'general',
+                 intervalo_limpieza: float = 60.0):
+        self.db_path = db_path
+        self.espacio = espacio
+        self.intervalo_limpieza = intervalo_limpieza
+
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pid = None
+
+        directorio = os.path.dirname(db_path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._crear_tabla()
+
+    @contextmanager
+    def _conectar(self):
+        """Conexión en modo autocommit: cada sentencia es su propia transacción"""
+        conexion = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conexion
+        finally:
+            conexion.close()
+
+    def _crear_tabla(self):
+        with self._conectar() as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('''
+                CREATE TABLE IF NOT EXISTS claves (
+                    espacio TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    expira REAL NOT NULL,
+                    PRIMARY KEY (espacio, clave)
+                )
+            ''')
+            conexion.execute('CREATE INDEX IF NOT EXISTS idx_claves_expira ON claves (expira)')
+
+    def guardar(self, clave: str, valor: Any, ttl: float):
+        """Guarda (o reemplaza) un valor serializable a JSON que vence en `ttl` segundos"""
+        with self._conectar() as conexion:
+            conexion.execute('INSERT OR REPLACE INTO claves (espacio, clave, valor, expira) VALUES (?, ?, ?, ?)',
+                             (self.espacio, clave, json.dumps(valor), time.time() + ttl))
+
+    def agregar(self, clave: str, valor: Any, ttl: float) -> bool:
+        """Guarda el valor solo si la clave no existe (o ya venció); devuelve si se guardó"""
+        ahora = time.time()
+        with self._conectar() as conexion:
+            cursor = conexion.execute('''
+                INSERT INTO claves (espacio, clave, valor, expira) VALUES (?, ?, ?, ?)
+                ON CONFLICT (espacio, clave) DO UPDATE
+                SET valor = excluded.valor, expira = excluded.expira
+                WHERE claves.expira <= ?
+            ''', (self.espacio, clave, json.dumps(valor), ahora + ttl, ahora))
+            return cursor.rowcount > 0
+
+    def obtener(self, clave: str) -> Optional[Any]:
+        """Valor de la clave, o None si no existe o venció"""
+        with self._conectar() as conexion:
+            fila = conexion.execute('SELECT valor FROM claves WHERE espacio = ? AND clave = ? AND expira > ?',
+                                    (self.espacio, clave, time.time())).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def tomar(self, clave: str) -> Optional[Any]:
+        """Obtiene y borra la clave atómicamente (para tokens de un solo uso)"""
+        # SELECT + DELETE en una transacción de escritura: DELETE ... RETURNING
+        # requiere SQLite 3.35, que no siempre trae Python 3.8
+        with self._conectar() as conexion:
+            conexion.execute('BEGIN IMMEDIATE')
+            try:
+                fila = conexion.execute('SELECT valor, expira FROM claves WHERE espacio = ? AND clave = ?',
+                                        (self.espacio, clave)).fetchone()
+                if fila:
+                    conexion.execute('DELETE FROM claves WHERE espacio = ? AND clave = ?', (self.espacio, clave))
+            except BaseException:
+                conexion.execute('ROLLBACK')
+                raise
+            conexion.execute('COMMIT')
+        if not fila or fila[1] <= time.time():
+            return None
+        return json.loads(fila[0])
+
+    def eliminar(self, clave: str):
+        with self._conectar() as conexion:
+            conexion.execute('DELETE FROM claves WHERE espacio = ? AND clave = ?', (self.espacio, clave))
+
+    def limpiar_expirados(self) -> int:
+        """Borra las claves vencidas de todos los espacios; devuelve cuántas borró"""
+        with self._conectar() as conexion:
+            return conexion.execute('DELETE FROM claves WHERE expira <= ?', (time.time(),)).rowcount
+
+    # Limpieza en segundo plano
+    def iniciar_limpieza(self):
+        """Arranca el hilo que borra las claves vencidas (una sola vez por proceso).
+        
+        Tras un fork (workers de gunicorn con preload_app) el hilo del padre no
+        existe en el hijo, así que se arranca de nuevo.
+        """
+        if self._pid == os.getpid():
+            return
+        self._detener = threading.Event()
+        self._pid = os.getpid()
+        self._hilo = threading.Thread(target=self._bucle_limpieza, name=f"almacen-ttl-{self.espacio}", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 5.0):
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout)
+        self._hilo = None
+        self._pid = None
+
+    def _bucle_limpieza(self):
+        while not self._detener.wait(self.intervalo_limpieza):
+            try:
+                borradas = self.limpiar_expirados()
+                if borradas:
+                    logger.debug("🧹 %s claves vencidas borradas del almacén", borradas)
+            except Exception:
+                logger.exception("❌ Error limpiando el almacén de claves")
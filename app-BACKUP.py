@@ -6,9 +6,8 @@ Sistema de Préstamos de Dinero - Aplicación Web
 Una aplicación web moderna y responsive para gestionar préstamos de dinero.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, make_response, Response, stream_with_context, g, abort
 import secrets
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
@@ -19,11 +18,29 @@ from wtforms.validators import DataRequired, Email, NumberRange
 from decimal import Decimal, InvalidOperation
 from datetime import date, timedelta
 import os
+import threading
+import time
+import hashlib
+import logging
 from functools import wraps
-from pdf_generator import PagarePDFGenerator
+from cache_pdf import CachePDF, clave_pagare
+from firmas import GestorFirmas
+from importacion_pagos import leer_pagos, filas_pagos, es_verdadero
+from exportacion_datos import ExportadorDatos, ENTIDADES, FORMATOS, serializar, leer_fecha
+from exportacion_pagares import ExportadorPagares, TRABAJO_EXPORTAR_PAGARES
+from pool_pdf import PoolRenderPDF, PoolOcupado, RenderPendiente, ESTADO_EN_PROCESO, ESTADO_LISTO
+from config_production import get_config
+from optimizacion_web import configurar_optimizacion_web
+from metricas import metricas
+from perfilado import PerfiladorPeticiones, perfilado_solicitado
+from registro import configurar_registro
 
 # Importar módulos del sistema
-from database import Database
+from database import Database, AMBITO_ADMIN, AMBITO_SUPERVISOR, AMBITO_ESTRUCTURA
+from notificador_cambios import notificador
+from cola_trabajos import ColaTrabajos, ESTADO_COMPLETADO, ESTADO_FALLIDO
+from almacen_ttl import AlmacenTTL
+from bandeja_salida import BandejaSalida
 from services import ClienteService, PrestamoService, PagoService, ReporteService, ConfiguracionService
 from models import Usuario
 from forms import LoginForm, CambiarPasswordForm, OlvidePasswordForm, VerificarCodigoForm, RestablecerPasswordForm
@@ -31,21 +48,64 @@ from pagare_generator import PagareGenerator
 from whatsapp_sender import WhatsAppSender
 import json
 
+configurar_registro(os.getenv('LOG_LEVEL', get_config().LOG_LEVEL))
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'tu_clave_secreta_aqui_cambiala_en_produccion'
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hora
 csrf = CSRFProtect(app)
+configurar_optimizacion_web(app, get_config())
 
 # Inicializar servicios
 db = Database()
+cola_trabajos = ColaTrabajos(os.path.join(db.data_dir, 'trabajos.db'),
+                             hilos=int(os.getenv('COLA_TRABAJOS_HILOS', 2)))
 cliente_service = ClienteService(db)
-prestamo_service = PrestamoService(db)
+prestamo_service = PrestamoService(db, cola_trabajos)
 pago_service = PagoService(db)
 reporte_service = ReporteService(db)
 configuracion_service = ConfiguracionService(db)
-
-# Configuración para emails de recuperación
-RECOVERY_CODES = {}  # En producción, usar Redis o base de datos
+cache_pdf = CachePDF(os.path.join(db.data_dir, 'cache_pdf'),
+                     tamano_maximo=int(os.getenv('CACHE_PDF_MB', 200)) * 1024 * 1024)
+pool_pdf = PoolRenderPDF.desde_entorno(cache_pdf)
+gestor_firmas = GestorFirmas(os.path.join('static', 'firmas'),
+                             conservar_anteriores=int(os.getenv('FIRMAS_CONSERVAR_ANTERIORES', 2)))
+exportador_pagares = ExportadorPagares(db, cache_pdf, cola_trabajos, os.path.join(db.data_dir, 'exportaciones'),
+                                       buscar_firma=lambda prestamo: buscar_firma_prestamo(prestamo),
+                                       procesos=int(os.getenv('EXPORTACION_PROCESOS', 0)) or None)
+
+# Códigos de recuperación de contraseña, compartidos entre workers
+RECOVERY_CODES = AlmacenTTL(os.path.join(db.data_dir, 'almacen_ttl.db'), espacio='recuperacion')
+CODIGO_RECUPERACION_SEGUNDOS = 10 * 60  # Vigencia de un código de recuperación
+
+# Configuración del canal de eventos (SSE) del dashboard
+SSE_ESPERA_CAMBIOS = 5  # Segundos entre verificaciones de cambios hechos por otros workers
+SSE_INTERVALO_LATIDO = 15  # Segundos sin eventos antes de enviar un comentario de latido
+SSE_DURACION_MAXIMA = 300  # Segundos antes de cerrar el stream (EventSource reconecta solo)
+SSE_REINTENTO_MS = 3000  # Espera del navegador antes de reconectar
+# Streams SSE simultáneos por worker: cada uno ocupa un hilo de gthread durante
+# SSE_DURACION_MAXIMA, así que debe quedar por debajo de "threads" en gunicorn.conf.py
+SSE_MAXIMO_STREAMS = int(os.getenv('SSE_MAXIMO_STREAMS', 8))
+SSE_REINTENTO_OCUPADO_MS = 30000  # Espera sugerida al rechazar un stream por exceso
+streams_sse = threading.BoundedSemaphore(SSE_MAXIMO_STREAMS)
+
+# Segundos que el cliente espera antes de consultar de nuevo un PDF que se está generando
+PDF_REINTENTO_SEGUNDOS = 3
+
+# Pagos aceptados en una importación masiva
+IMPORTACION_PAGOS_MAXIMO = 20000
+
+# Resultados de la búsqueda de clientes (typeahead)
+BUSQUEDA_LIMITE_DEFECTO = 20
+BUSQUEDA_LIMITE_MAXIMO = 50
+
+# Token para que Prometheus lea /metrics sin sesión (si no se define, solo admins)
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN')
+
+# Perfilado a pedido (?perfilar=1 o X-Perfilar: 1), solo con el permiso ver_todos_usuarios
+perfilador = PerfiladorPeticiones(os.path.join(db.data_dir, 'perfiles'),
+                                  maximo=int(os.getenv('PERFILES_MAXIMO', 50)))
 
 try:
     from config_email import SMTP_CONFIG, SYSTEM_CONFIG
@@ -63,6 +123,35 @@ except ImportError:
         'tiempo_expiracion_token': 24
     }
 
+# Bandejas de salida de email: la cuenta del sistema (códigos de recuperación)
+# y la cuenta de Gmail para pagarés, si está configurada en el entorno
+bandeja_salida = BandejaSalida.desde_config(SMTP_CONFIG, os.path.join(db.data_dir, 'bandeja_salida.db'))
+
+GMAIL_USER = os.getenv('GMAIL_USER')
+GMAIL_APP_PASSWORD = os.getenv('GMAIL_APP_PASSWORD')
+bandeja_pagares = None
+if GMAIL_USER and GMAIL_APP_PASSWORD:
+    bandeja_pagares = BandejaSalida.desde_config(
+        {'server': 'smtp.gmail.com', 'port': 587, 'username': GMAIL_USER, 'password': GMAIL_APP_PASSWORD},
+        os.path.join(db.data_dir, 'bandeja_salida.db'), cuenta='pagares')
+
+# Hilos en segundo plano: se arrancan en cada proceso que atiende peticiones y no
+# al importar, porque con preload_app de gunicorn el módulo se importa en el
+# proceso maestro y los workers (creados con fork) no heredan sus hilos
+def iniciar_hilos_segundo_plano():
+    cola_trabajos.iniciar()
+    bandeja_salida.iniciar()
+    if bandeja_pagares:
+        bandeja_pagares.iniciar()
+    RECOVERY_CODES.iniciar_limpieza()
+
+# Para el hook post_worker_init de gunicorn.conf.py
+app.extensions['hilos_segundo_plano'] = iniciar_hilos_segundo_plano
+
+@app.before_request
+def asegurar_hilos_segundo_plano():
+    iniciar_hilos_segundo_plano()
+
 # Decoradores para requerir login y permisos
 def login_required(f):
     @wraps(f)
@@ -111,6 +200,145 @@ def permisos_requeridos(permisos: list):
         return decorated_function
     return decorator
 
+def ambito_datos(usuario_id: int, rol: str) -> str:
+    """Determina el ámbito de visibilidad de datos de un usuario según su rol"""
+    if rol == 'admin':
+        return AMBITO_ADMIN
+    if rol in ['supervisor', 'consultor']:
+        return AMBITO_SUPERVISOR
+    return db.ambito_usuario(usuario_id)
+
+def ambito_datos_sesion() -> str:
+    """Determina el ámbito de visibilidad de datos del usuario en sesión"""
+    return ambito_datos(session['user_id'], session.get('rol'))
+
+def respuesta_condicional(f):
+    """Decorador que responde 304 si los datos del ámbito del usuario no cambiaron.
+    
+    La versión de datos se consulta antes de ejecutar la vista, así que si hay
+    una escritura concurrente el ETag enviado queda desactualizado y el cliente
+    vuelve a pedir los datos en la siguiente consulta.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        ambito = ambito_datos_sesion()
+        secuencia, modificado = db.obtener_version_datos(ambito)
+        
+        # El ETag depende de la ruta y del usuario porque el contenido incluye datos de la sesión
+        clave = f"{request.path}:{session['user_id']}:{ambito}:{secuencia}:{modificado.isoformat() if modificado else ''}"
+        etag = hashlib.sha1(clave.encode()).hexdigest()
+        
+        if request.if_none_match.contains_weak(etag):
+            respuesta = make_response('', 304)
+        elif (not request.if_none_match and modificado and request.if_modified_since
+                and request.if_modified_since >= modificado.astimezone().replace(microsecond=0)):
+            respuesta = make_response('', 304)
+        else:
+            respuesta = None
+        
+        metricas.registrar_cache('etag', respuesta is not None)
+        if respuesta is None:
+            respuesta = make_response(f(*args, **kwargs))
+            if respuesta.status_code != 200:
+                return respuesta
+        
+        respuesta.set_etag(etag, weak=True)
+        if modificado:
+            respuesta.last_modified = modificado.astimezone()
+        # Obligar al navegador a revalidar en cada consulta
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+        return respuesta
+    return decorated_function
+
+# Instrumentación de peticiones
+@app.before_request
+def iniciar_medicion():
+    request.inicio_medicion = time.perf_counter()
+    metricas.iniciar_peticion(request.url_rule.rule if request.url_rule else 'sin_ruta')
+
+@app.after_request
+def registrar_medicion(response):
+    inicio = getattr(request, 'inicio_medicion', None)
+    if inicio is not None:
+        metricas.registrar_peticion(metricas.ruta_actual, request.method, response.status_code,
+                                    time.perf_counter() - inicio)
+    metricas.finalizar_peticion()
+    return response
+
+def puede_perfilar() -> bool:
+    if 'user_id' not in session:
+        return False
+    usuario = db.obtener_usuario(session['user_id'], session['user_id'], False)
+    return bool(usuario and usuario.tiene_permiso('ver_todos_usuarios'))
+
+@app.before_request
+def iniciar_perfil():
+    # Solo se consulta el permiso si la petición pide perfilado
+    if perfilado_solicitado(request.environ) and puede_perfilar():
+        g.perfil = perfilador.iniciar()
+
+@app.after_request
+def guardar_perfil(response):
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        response.headers['X-Perfil'] = perfilador.finalizar(perfil, request.method, request.full_path,
+                                                            response.status_code, session.get('username'))
+    return response
+
+@app.teardown_request
+def descartar_perfil(error=None):
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        perfilador.descartar(perfil)
+
+# Pagarés en PDF
+def buscar_firma_prestamo(prestamo):
+    """Ruta de la firma digital vigente registrada en el préstamo, o None"""
+    if prestamo.firma_path and os.path.exists(prestamo.firma_path):
+        return prestamo.firma_path
+    return None
+
+def obtener_pagare_pdf(prestamo, cliente, firma=None, tiempo_espera=None):
+    """Devuelve (ruta, contenido, clave) del PDF del pagaré.
+    
+    Si el PDF está en caché se devuelve su ruta; si no, se genera en el pool de
+    procesos y se devuelve el contenido. Lanza RenderPendiente si tarda más que
+    el tiempo de espera y PoolOcupado si hay demasiados PDFs generándose.
+    """
+    clave = clave_pagare(prestamo, cliente, firma)
+    ruta, contenido = pool_pdf.obtener(clave, prestamo, cliente, firma, tiempo_espera)
+    return ruta, contenido, clave
+
+def leer_pagare_pdf(prestamo, cliente, firma=None) -> bytes:
+    """Contenido del PDF del pagaré (de la caché o recién generado)"""
+    ruta, contenido, _ = obtener_pagare_pdf(prestamo, cliente, firma)
+    if contenido is None:
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+    return contenido
+
+def respuesta_pagare_pendiente(prestamo_id):
+    """Respuesta 202 para un pagaré que sigue generándose: el cliente consulta el estado"""
+    url_estado = url_for('estado_pagare_pdf', prestamo_id=prestamo_id)
+    respuesta = jsonify({
+        'success': False,
+        'pendiente': True,
+        'message': 'El PDF del pagaré se está generando, intenta de nuevo en unos segundos',
+        'url_estado': url_estado,
+        'url_descarga': url_for('descargar_pagare_pdf', prestamo_id=prestamo_id)
+    })
+    respuesta.status_code = 202
+    respuesta.headers['Location'] = url_estado
+    respuesta.headers['Retry-After'] = str(PDF_REINTENTO_SEGUNDOS)
+    return respuesta
+
+def respuesta_pool_ocupado():
+    """Respuesta 503 cuando el pool de PDFs no admite más trabajos"""
+    respuesta = jsonify({'success': False, 'error': 'Hay muchos PDFs generándose, intenta de nuevo en unos segundos'})
+    respuesta.status_code = 503
+    respuesta.headers['Retry-After'] = str(PDF_REINTENTO_SEGUNDOS)
+    return respuesta
+
 # Formularios
 class ClienteForm(FlaskForm):
     nombre = StringField('Nombre', validators=[DataRequired()])
@@ -570,6 +798,70 @@ def nuevo_pago():
         flash(f'Error: {e}', 'error')
         return redirect(url_for('pagos'))
 
+@app.route('/api/pagos/importar', methods=['POST'])
+@csrf.exempt
+@permiso_requerido('pagos.crear')
+def api_importar_pagos():
+    """Importa un lote de pagos (archivo CSV/JSON o JSON en el cuerpo) con una sola escritura"""
+    try:
+        es_admin = session.get('rol') == 'admin'
+        datos = request.get_json(silent=True)
+        
+        if 'archivo' in request.files:
+            archivo = request.files['archivo']
+            filas = leer_pagos(archivo.read(), archivo.filename or '')
+        elif datos is not None:
+            filas = filas_pagos(datos)
+        else:
+            filas = leer_pagos(request.get_data(), 'pagos.csv' if request.mimetype == 'text/csv' else '')
+        
+        parcial = es_verdadero(request.values.get('parcial', ''))
+        if isinstance(datos, dict):
+            parcial = es_verdadero(datos.get('parcial', parcial))
+        
+        if not filas:
+            return jsonify({'success': False, 'error': 'No se recibieron pagos'}), 400
+        if len(filas) > IMPORTACION_PAGOS_MAXIMO:
+            return jsonify({'success': False,
+                            'error': f'Máximo {IMPORTACION_PAGOS_MAXIMO} pagos por importación'}), 413
+        
+        resultado = pago_service.importar_pagos(filas, session['user_id'], es_admin, parcial)
+        return jsonify({'success': resultado['aplicado'], **resultado}), 200 if resultado['aplicado'] else 422
+        
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'success': False, 'error': f'Archivo inválido: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/exportar/<entidad>.<formato>')
+@login_required
+def exportar_datos(entidad, formato):
+    """Exporta clientes, préstamos o pagos en CSV o JSON lines, generando la respuesta por bloques"""
+    if entidad not in ENTIDADES or formato not in FORMATOS:
+        return jsonify({'success': False, 'error': 'Exportación no disponible'}), 404
+    
+    usuario_actual = db.obtener_usuario(session['user_id'], session['user_id'], False)
+    if not usuario_actual or not usuario_actual.tiene_permiso(f'{entidad}.ver'):
+        return jsonify({'success': False, 'error': 'No tiene permisos para exportar estos datos'}), 403
+    
+    try:
+        desde = leer_fecha(request.args.get('desde'))
+        hasta = leer_fecha(request.args.get('hasta'))
+        operador_id = request.args.get('operador_id', type=int)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    filas = ExportadorDatos(db).filas(entidad, session['user_id'], usuario_actual.rol == 'admin',
+                                      request.args.get('estado') or None, desde, hasta, operador_id)
+    nombre = f"{entidad}_{datetime.now().strftime('%Y%m%d_%H%M')}.{formato}"
+    
+    respuesta = Response(stream_with_context(serializar(filas, entidad, formato)),
+                         mimetype=FORMATOS[formato])
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    respuesta.headers['Cache-Control'] = 'no-store'
+    respuesta.headers['X-Accel-Buffering'] = 'no'
+    return respuesta
+
 @app.route('/pagos/<int:pago_id>/eliminar', methods=['POST'])
 @permiso_requerido('pagos.eliminar')
 def eliminar_pago(pago_id):
@@ -623,6 +915,7 @@ def reportes():
 
 @app.route('/api/reporte-general')
 @login_required
+@respuesta_condicional
 def api_reporte_general():
     """API para obtener reporte general"""
     try:
@@ -643,6 +936,67 @@ def api_reporte_general():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def estadisticas_usuario(usuario: Usuario) -> dict:
+    """Calcula las estadísticas generales visibles para un usuario"""
+    if usuario.rol in ['supervisor', 'consultor']:
+        # Para supervisores, usar None como usuario_id para que vea todos los usuarios no-admin
+        return reporte_service.generar_reporte_general(None, False)
+    return reporte_service.generar_reporte_general(usuario.id, usuario.rol == 'admin')
+
+@app.route('/api/eventos')
+@login_required
+def api_eventos():
+    """Canal SSE que envía las estadísticas del dashboard cuando cambian los datos"""
+    usuario_actual = db.obtener_usuario(session['user_id'], session['user_id'], False)
+    if not usuario_actual:
+        return jsonify({'error': 'Usuario no encontrado'}), 404
+    
+    # Sin hilos libres el worker no podría atender el resto de las peticiones
+    if not streams_sse.acquire(blocking=False):
+        logger.warning("🚦 Stream SSE rechazado: %s streams abiertos en el worker", SSE_MAXIMO_STREAMS)
+        respuesta = Response(f"retry: {SSE_REINTENTO_OCUPADO_MS}\n\n", status=503, mimetype='text/event-stream')
+        respuesta.headers['Retry-After'] = str(SSE_REINTENTO_OCUPADO_MS // 1000)
+        return respuesta
+    
+    ambito = ambito_datos(usuario_actual.id, usuario_actual.rol)
+    ultimo_evento = request.headers.get('Last-Event-ID')
+    
+    def generar_eventos():
+        enviadas = None
+        secuencia_enviada = -1
+        inicio = ultimo_envio = time.monotonic()
+        
+        yield f"retry: {SSE_REINTENTO_MS}\n\n"
+        while time.monotonic() - inicio < SSE_DURACION_MAXIMA:
+            secuencia, _ = db.obtener_version_datos(ambito)
+            if secuencia != secuencia_enviada:
+                stats = estadisticas_usuario(usuario_actual)
+                if enviadas is None:
+                    # Al reconectar con la versión vigente el navegador ya tiene estos datos
+                    cambios = {} if ultimo_evento == str(secuencia) else stats
+                else:
+                    # Enviar solo los valores que cambiaron
+                    cambios = {k: v for k, v in stats.items() if enviadas.get(k) != v}
+                
+                if cambios:
+                    yield f"id: {secuencia}\nevent: estadisticas\ndata: {json.dumps(cambios)}\n\n"
+                    ultimo_envio = time.monotonic()
+                
+                enviadas = stats
+                secuencia_enviada = secuencia
+            elif time.monotonic() - ultimo_envio >= SSE_INTERVALO_LATIDO:
+                yield ": latido\n\n"
+                ultimo_envio = time.monotonic()
+            
+            notificador.esperar([ambito, AMBITO_ESTRUCTURA], secuencia_enviada, SSE_ESPERA_CAMBIOS)
+    
+    respuesta = Response(generar_eventos(), mimetype='text/event-stream')
+    # Se libera al cerrar la respuesta, aunque el cliente se desconecte antes del primer evento
+    respuesta.call_on_close(streams_sse.release)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    respuesta.headers['X-Accel-Buffering'] = 'no'  # Evitar buffering en proxies (nginx)
+    return respuesta
+
 @app.route('/api/reporte-cliente/<int:cliente_id>')
 @login_required
 def api_reporte_cliente(cliente_id):
@@ -658,43 +1012,44 @@ def api_reporte_cliente(cliente_id):
 
 @app.route('/api/prestamos-activos')
 @login_required
+@respuesta_condicional
 def api_prestamos_activos():
     """API para obtener préstamos activos"""
     try:
         usuario_actual = db.obtener_usuario(session['user_id'], session['user_id'], False)
         es_admin = usuario_actual.rol == 'admin' if usuario_actual else False
         
-        print(f"🔍 API Préstamos Activos - Usuario: {usuario_actual.rol if usuario_actual else 'None'}, ID: {session['user_id']}")
+        logger.debug("🔍 API Préstamos Activos - Usuario: %s, ID: %s", usuario_actual.rol if usuario_actual else 'None', session['user_id'])
         
         # Para supervisores, permitir ver préstamos de usuarios no-admin
         if usuario_actual and usuario_actual.rol in ['supervisor', 'consultor']:
             es_admin = False  # Usar filtrado de supervisor en lugar de admin
             # Para supervisores, usar None como usuario_id para que vea todos los usuarios no-admin
             prestamos = prestamo_service.listar_prestamos_activos(None, es_admin)
-            print(f"👁️ Supervisor/Consultor - Préstamos encontrados: {len(prestamos)}")
+            logger.debug("👁️ Supervisor/Consultor - Préstamos encontrados: %s", len(prestamos))
         elif usuario_actual and usuario_actual.rol == 'admin':
             es_admin = True
             prestamos = prestamo_service.listar_prestamos_activos(session['user_id'], es_admin)
-            print(f"👑 Admin - Préstamos encontrados: {len(prestamos)}")
+            logger.debug("👑 Admin - Préstamos encontrados: %s", len(prestamos))
         else:
             prestamos = prestamo_service.listar_prestamos_activos(session['user_id'], es_admin)
-            print(f"👤 Usuario normal - Préstamos encontrados: {len(prestamos)}")
+            logger.debug("👤 Usuario normal - Préstamos encontrados: %s", len(prestamos))
         
         prestamos_data = []
         
         for prestamo in prestamos:
-            print(f"📋 Procesando préstamo ID: {prestamo.id}, Cliente ID: {prestamo.cliente_id}")
+            logger.debug("📋 Procesando préstamo ID: %s, Cliente ID: %s", prestamo.id, prestamo.cliente_id)
             
             # Para supervisores, usar None como usuario_id para que puedan ver todos los clientes de usuarios no-admin
             if usuario_actual and usuario_actual.rol in ['supervisor', 'consultor']:
                 cliente = cliente_service.obtener_cliente(prestamo.cliente_id, None, es_admin)
-                print(f"👁️ Supervisor buscando cliente {prestamo.cliente_id} con usuario_id=None")
+                logger.debug("👁️ Supervisor buscando cliente %s con usuario_id=None", prestamo.cliente_id)
             else:
                 cliente = cliente_service.obtener_cliente(prestamo.cliente_id, session['user_id'], es_admin)
-                print(f"👤 Usuario normal buscando cliente {prestamo.cliente_id} con usuario_id={session['user_id']}")
+                logger.debug("👤 Usuario normal buscando cliente %s con usuario_id=%s", prestamo.cliente_id, session['user_id'])
             
             if cliente:  # Solo incluir si el cliente es accesible
-                print(f"✅ Cliente encontrado: {cliente.nombre} {cliente.apellido}")
+                logger.debug("✅ Cliente encontrado: %s %s", cliente.nombre, cliente.apellido)
                 
                 # Obtener información del usuario creador del préstamo
                 usuario_creador = None
@@ -714,21 +1069,77 @@ def api_prestamos_activos():
                     'usuario_creador_id': prestamo.usuario_id
                 })
             else:
-                print(f"❌ Cliente {prestamo.cliente_id} no accesible para este usuario")
+                logger.debug("❌ Cliente %s no accesible para este usuario", prestamo.cliente_id)
         
-        print(f"📊 Total de préstamos procesados: {len(prestamos_data)}")
+        logger.debug("📊 Total de préstamos procesados: %s", len(prestamos_data))
         return jsonify(prestamos_data)
     except Exception as e:
-        print(f"❌ Error en API préstamos activos: {e}")
+        logger.exception("❌ Error en API préstamos activos")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/trabajos/<int:trabajo_id>')
+@login_required
+def api_estado_trabajo(trabajo_id):
+    """Estado de un trabajo en segundo plano (pendiente, en_proceso, completado, fallido)"""
+    trabajo = cola_trabajos.obtener(trabajo_id)
+    
+    # Solo el dueño del trabajo o el administrador (como en la descarga de exportaciones):
+    # los resultados pueden incluir datos de préstamos de otros usuarios
+    if not trabajo or (session.get('rol') != 'admin' and trabajo['datos'].get('usuario_id') != session['user_id']):
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    
+    return jsonify({
+        'id': trabajo['id'],
+        'tipo': trabajo['tipo'],
+        'estado': trabajo['estado'],
+        'intentos': trabajo['intentos'],
+        'max_intentos': trabajo['max_intentos'],
+        'resultado': trabajo['resultado'],
+        'error': trabajo['error'],
+        'progreso': trabajo['progreso'],
+        'creado': trabajo['creado'],
+        'actualizado': trabajo['actualizado']
+    })
+
+@app.route('/metrics')
+@csrf.exempt
+def metrics():
+    """Métricas de este worker en formato de texto de Prometheus"""
+    autorizado = bool(METRICAS_TOKEN) and secrets.compare_digest(
+        request.headers.get('Authorization', ''), f"Bearer {METRICAS_TOKEN}")
+    if not autorizado and session.get('rol') != 'admin':
+        return Response('No autorizado\n', status=401, mimetype='text/plain')
+    
+    return Response(metricas.exportar_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/admin/perfiles')
+@permiso_requerido('ver_todos_usuarios')
+def perfiles():
+    """Perfiles de peticiones guardados por el perfilado a pedido"""
+    return render_template('perfiles.html', perfiles=perfilador.listar(), maximo=perfilador.maximo)
+
+@app.route('/admin/perfiles/<perfil_id>.<tipo>')
+@permiso_requerido('ver_todos_usuarios')
+def descargar_perfil(perfil_id, tipo):
+    """Descarga el archivo pstats o el volcado collapsed (flamegraph) de un perfil"""
+    ruta = perfilador.ruta_archivo(perfil_id, tipo)
+    if not ruta:
+        abort(404)
+
+    from flask import send_file
+    return send_file(ruta, as_attachment=True,
+                     mimetype='application/octet-stream' if tipo == 'pstats' else 'text/plain')
+
 @app.route('/api/buscar-cliente')
+@login_required
 def api_buscar_cliente():
-    """API para buscar clientes"""
+    """API para buscar clientes (typeahead); `limite` acota la cantidad de resultados"""
     termino = request.args.get('q', '')
     if not termino:
         return jsonify([])
     
+    limite = min(max(request.args.get('limite', BUSQUEDA_LIMITE_DEFECTO, type=int), 1), BUSQUEDA_LIMITE_MAXIMO)
+    
     try:
         # Obtener usuario actual para pasar los parámetros correctos
         usuario_actual = db.obtener_usuario(session['user_id'], session['user_id'], False)
@@ -736,9 +1147,9 @@ def api_buscar_cliente():
         
         # Para supervisores y consultores, usar None como usuario_id
         if usuario_actual and usuario_actual.rol in ['supervisor', 'consultor']:
-            clientes = cliente_service.buscar_cliente(termino, None, es_admin)
+            clientes = cliente_service.buscar_cliente(termino, None, es_admin, limite)
         else:
-            clientes = cliente_service.buscar_cliente(termino, session['user_id'], es_admin)
+            clientes = cliente_service.buscar_cliente(termino, session['user_id'], es_admin, limite)
         return jsonify([{
             'id': c.id,
             'nombre': c.nombre,
@@ -937,27 +1348,19 @@ def guardar_firma_digital(prestamo_id):
         if not firma_base64:
             return jsonify({'success': False, 'error': 'No se recibió la firma'})
         
-        # Guardar la firma en el sistema de archivos
+        # Decodificar la imagen y guardarla normalizada (una sola vez, al subirla)
         import base64
-        import os
-        from datetime import datetime
         
-        # Crear directorio para firmas si no existe
-        firmas_dir = 'static/firmas'
-        os.makedirs(firmas_dir, exist_ok=True)
-        
-        # Generar nombre único para la firma
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        nombre_archivo = f"firma_prestamo_{prestamo_id}_{timestamp}.png"
-        ruta_firma = os.path.join(firmas_dir, nombre_archivo)
-        
-        # Decodificar y guardar la imagen
-        firma_data = base64.b64decode(firma_base64.split(',')[1])
-        with open(ruta_firma, 'wb') as f:
-            f.write(firma_data)
+        try:
+            firma_data = base64.b64decode(firma_base64.split(',')[-1])
+            ruta_firma, firma_hash = gestor_firmas.guardar(prestamo_id, firma_data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)})
         
-        # Guardar la ruta de la firma en la base de datos (opcional)
-        # Aquí podrías agregar un campo 'firma_digital' al modelo Prestamo
+        # Registrar la firma vigente en el préstamo y borrar las reemplazadas fuera de la retención
+        descartadas = db.registrar_firma_prestamo(prestamo_id, ruta_firma, firma_hash,
+                                                  gestor_firmas.conservar_anteriores)
+        gestor_firmas.eliminar(descartadas or [])
         
         return jsonify({
             'success': True, 
@@ -985,15 +1388,7 @@ def enviar_pagare_firmado_whatsapp(prestamo_id):
             return jsonify({'success': False, 'error': 'Cliente no encontrado'})
         
         # Buscar si existe una firma digital guardada
-        import os
-        firmas_dir = 'static/firmas'
-        firma_encontrada = None
-        
-        if os.path.exists(firmas_dir):
-            for archivo in os.listdir(firmas_dir):
-                if archivo.startswith(f"firma_prestamo_{prestamo_id}_"):
-                    firma_encontrada = archivo
-                    break
+        firma_encontrada = buscar_firma_prestamo(prestamo)
         
         # Generar mensaje de WhatsApp
         from datetime import datetime, timedelta
@@ -1072,43 +1467,19 @@ def enviar_pagare_pdf_whatsapp(prestamo_id):
         if not cliente:
             return jsonify({'success': False, 'error': 'Cliente no encontrado'})
         
-        # Generar PDF del pagaré
-        import os
+        # Obtener el PDF del pagaré (de la caché si los datos no cambiaron)
         from datetime import datetime
         
-        # Crear directorio de PDFs si no existe
-        pdfs_dir = 'static/pdfs'
-        os.makedirs(pdfs_dir, exist_ok=True)
-        
-        # Generar nombre del archivo PDF
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        nombre_pdf = f"pagare_prestamo_{prestamo_id}_{timestamp}.pdf"
-        ruta_pdf = os.path.join(pdfs_dir, nombre_pdf)
-        
-        # Buscar si existe una firma digital
-        firmas_dir = 'static/firmas'
-        firma_encontrada = None
-        
-        if os.path.exists(firmas_dir):
-            for archivo in os.listdir(firmas_dir):
-                if archivo.startswith(f"firma_prestamo_{prestamo_id}_"):
-                    firma_encontrada = os.path.join(firmas_dir, archivo)
-                    break
-        
-        # Generar PDF
-        pdf_generator = PagarePDFGenerator()
+        firma_encontrada = buscar_firma_prestamo(prestamo)
+        nombre_pdf = f"pagare_prestamo_{prestamo_id}.pdf"
         
-        if firma_encontrada:
-            success, message = pdf_generator.generar_pagare_con_firma_pdf(
-                prestamo, cliente, firma_encontrada, ruta_pdf
-            )
-        else:
-            success, message = pdf_generator.generar_pagare_pdf(
-                prestamo, cliente, ruta_pdf
-            )
-        
-        if not success:
-            return jsonify({'success': False, 'error': f'Error al generar PDF: {message}'})
+        # El mensaje no adjunta el PDF: basta con dejarlo generándose en segundo plano
+        try:
+            obtener_pagare_pdf(prestamo, cliente, firma_encontrada, tiempo_espera=0)
+        except (RenderPendiente, PoolOcupado):
+            pass
+        except Exception as e:
+            return jsonify({'success': False, 'error': f'Error al generar PDF: {e}'})
         
         # Crear mensaje de WhatsApp con el PDF
         telefono = cliente.telefono
@@ -1174,67 +1545,27 @@ def enviar_pagare_email(prestamo_id):
         if not cliente.email:
             return jsonify({'success': False, 'error': 'El cliente no tiene email registrado'})
         
-        # Generar PDF del pagaré
-        import os
+        # Obtener el PDF del pagaré (de la caché si los datos no cambiaron)
         from datetime import datetime
         
-        # Crear directorio de PDFs si no existe
-        pdfs_dir = 'static/pdfs'
-        os.makedirs(pdfs_dir, exist_ok=True)
-        
-        # Generar nombre del archivo PDF
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        nombre_pdf = f"pagare_prestamo_{prestamo_id}_{timestamp}.pdf"
-        ruta_pdf = os.path.join(pdfs_dir, nombre_pdf)
-        
-        # Buscar si existe una firma digital
-        firmas_dir = 'static/firmas'
-        firma_encontrada = None
-        
-        if os.path.exists(firmas_dir):
-            for archivo in os.listdir(firmas_dir):
-                if archivo.startswith(f"firma_prestamo_{prestamo_id}_"):
-                    firma_encontrada = os.path.join(firmas_dir, archivo)
-                    break
-        
-        # Generar PDF
-        pdf_generator = PagarePDFGenerator()
+        firma_encontrada = buscar_firma_prestamo(prestamo)
+        nombre_pdf = f"pagare_prestamo_{prestamo_id}.pdf"
         
-        if firma_encontrada:
-            success, message = pdf_generator.generar_pagare_con_firma_pdf(
-                prestamo, cliente, firma_encontrada, ruta_pdf
-            )
-        else:
-            success, message = pdf_generator.generar_pagare_pdf(
-                prestamo, cliente, ruta_pdf
-            )
-        
-        if not success:
-            return jsonify({'success': False, 'error': f'Error al generar PDF: {message}'})
+        try:
+            contenido_pdf = leer_pagare_pdf(prestamo, cliente, firma_encontrada)
+        except RenderPendiente:
+            return respuesta_pagare_pendiente(prestamo_id)
+        except PoolOcupado:
+            return respuesta_pool_ocupado()
+        except Exception as e:
+            return jsonify({'success': False, 'error': f'Error al generar PDF: {e}'})
         
-        # Implementar envío real por email usando Gmail SMTP
+        # Encolar el email en la bandeja de salida; se envía en segundo plano
         try:
-            import smtplib
-            from email.mime.multipart import MIMEMultipart
-            from email.mime.text import MIMEText
             from email.mime.base import MIMEBase
             from email import encoders
             
-            # Configuración de Gmail (requiere configuración previa)
-            # Para usar Gmail, necesitas:
-            # 1. Activar verificación en 2 pasos
-            # 2. Generar contraseña de aplicación
-            # 3. Configurar variables de entorno
-            
-            # Leer configuración desde variables de entorno
-            import os
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            gmail_user = os.getenv('GMAIL_USER')
-            gmail_password = os.getenv('GMAIL_APP_PASSWORD')
-            
-            if not gmail_user or not gmail_password:
+            if bandeja_pagares is None:
                 return jsonify({
                     'success': False, 
                     'error': 'Configuración de email no encontrada. Contacta al administrador.',
@@ -1244,7 +1575,7 @@ def enviar_pagare_email(prestamo_id):
             
             # Crear mensaje
             msg = MIMEMultipart()
-            msg['From'] = gmail_user
+            msg['From'] = GMAIL_USER
             msg['To'] = cliente.email
             msg['Subject'] = f'Pagaré - Préstamo #{prestamo.id} - {cliente.nombre} {cliente.apellido}'
             
@@ -1269,9 +1600,8 @@ def enviar_pagare_email(prestamo_id):
             msg.attach(MIMEText(body, 'plain', 'utf-8'))
             
             # Adjuntar PDF
-            with open(ruta_pdf, 'rb') as attachment:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment.read())
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(contenido_pdf)
             
             encoders.encode_base64(part)
             part.add_header(
@@ -1280,18 +1610,13 @@ def enviar_pagare_email(prestamo_id):
             )
             msg.attach(part)
             
-            # Enviar email
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(gmail_user, gmail_password)
-            text = msg.as_string()
-            server.sendmail(gmail_user, cliente.email, text)
-            server.quit()
+            mensaje_id = bandeja_pagares.encolar(msg)
             
             return jsonify({
                 'success': True,
-                'message': 'Pagaré en PDF generado y enviado por email exitosamente',
+                'message': 'Pagaré en PDF generado; el email se enviará en unos segundos',
                 'email': cliente.email,
+                'mensaje_id': mensaje_id,
                 'pdf_generado': nombre_pdf,
                 'tiene_firma': firma_encontrada is not None
             })
@@ -1379,52 +1704,148 @@ def descargar_pagare_pdf(prestamo_id):
             return redirect(url_for('prestamos'))
         
         # Buscar si existe una firma digital
-        import os
-        firmas_dir = 'static/firmas'
-        firma_encontrada = None
+        firma_encontrada = buscar_firma_prestamo(prestamo)
         
-        if os.path.exists(firmas_dir):
-            for archivo in os.listdir(firmas_dir):
-                if archivo.startswith(f"firma_prestamo_{prestamo_id}_"):
-                    firma_encontrada = os.path.join(firmas_dir, archivo)
-                    break
-        
-        # Generar nombre del archivo PDF
-        from datetime import datetime
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        nombre_pdf = f"pagare_prestamo_{prestamo_id}_{timestamp}.pdf"
-        ruta_pdf = os.path.join('static/pdfs', nombre_pdf)
+        # El ETag es la clave de caché: si el navegador ya tiene esta versión no hace falta el PDF
+        clave = clave_pagare(prestamo, cliente, firma_encontrada)
+        if request.if_none_match.contains(clave):
+            respuesta = make_response('', 304)
+            respuesta.set_etag(clave)
+            return respuesta
         
-        # Crear instancia del generador de PDF
-        pdf_generator = PagarePDFGenerator()
-        
-        # Generar PDF con o sin firma
-        if firma_encontrada:
-            success, message = pdf_generator.generar_pagare_con_firma_pdf(
-                prestamo, cliente, firma_encontrada, ruta_pdf
-            )
-        else:
-            success, message = pdf_generator.generar_pagare_pdf(
-                prestamo, cliente, ruta_pdf
-            )
-        
-        if success:
-            # Retornar el archivo PDF para descarga
-            from flask import send_file
-            return send_file(
-                ruta_pdf,
-                as_attachment=True,
-                download_name=nombre_pdf,
-                mimetype='application/pdf'
-            )
-        else:
-            flash(f'Error al generar PDF: {message}', 'error')
+        # Obtener el PDF (solo se genera si cambió el préstamo, el cliente o la firma)
+        try:
+            ruta_pdf, contenido_pdf, clave = obtener_pagare_pdf(prestamo, cliente, firma_encontrada)
+        except RenderPendiente:
+            # Render largo: el navegador vuelve a pedir la descarga cuando pasa la espera
+            respuesta = respuesta_pagare_pendiente(prestamo_id)
+            respuesta.headers['Refresh'] = f"{PDF_REINTENTO_SEGUNDOS}; url={request.path}"
+            return respuesta
+        except PoolOcupado:
+            flash('Hay muchos PDFs generándose, intenta de nuevo en unos segundos', 'warning')
             return redirect(url_for('prestamos'))
+        
+        # Retornar el PDF para descarga (archivo de la caché o recién generado en memoria);
+        # el ETag permite responder 304 si no cambió
+        from flask import send_file
+        from io import BytesIO
+        respuesta = send_file(
+            ruta_pdf or BytesIO(contenido_pdf),
+            as_attachment=True,
+            download_name=f"pagare_prestamo_{prestamo_id}.pdf",
+            mimetype='application/pdf',
+            etag=clave,
+            conditional=True
+        )
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+        return respuesta
             
     except Exception as e:
         flash(f'Error al generar PDF: {e}', 'error')
         return redirect(url_for('prestamos'))
 
+@app.route('/prestamos/<int:prestamo_id>/pagare-pdf/estado')
+@permiso_requerido('prestamos.ver')
+def estado_pagare_pdf(prestamo_id):
+    """Estado de la generación del PDF del pagaré, para consultar renders largos"""
+    try:
+        usuario_actual = db.obtener_usuario(session['user_id'], session['user_id'], False)
+        es_admin = usuario_actual.rol == 'admin' if usuario_actual else False
+        
+        prestamo = prestamo_service.obtener_prestamo(prestamo_id, session['user_id'], es_admin)
+        if not prestamo:
+            return jsonify({'success': False, 'error': 'Préstamo no encontrado'}), 404
+        
+        cliente = cliente_service.obtener_cliente(prestamo.cliente_id, session['user_id'], es_admin)
+        if not cliente:
+            return jsonify({'success': False, 'error': 'Cliente no encontrado'}), 404
+        
+        firma_encontrada = buscar_firma_prestamo(prestamo)
+        clave = clave_pagare(prestamo, cliente, firma_encontrada)
+        estado, error = pool_pdf.estado(clave)
+        
+        if estado is None:
+            # Render de otro worker o que todavía no empezó: se lanza aquí (si ya está en
+            # curso en este proceso se reutiliza)
+            try:
+                pool_pdf.enviar(clave, prestamo, cliente, firma_encontrada)
+            except PoolOcupado:
+                pass
+            estado = ESTADO_EN_PROCESO
+        
+        respuesta = jsonify({
+            'success': error is None,
+            'estado': estado,
+            'listo': estado == ESTADO_LISTO,
+            'error': error,
+            'url_descarga': url_for('descargar_pagare_pdf', prestamo_id=prestamo_id)
+        })
+        if estado == ESTADO_EN_PROCESO:
+            respuesta.headers['Retry-After'] = str(PDF_REINTENTO_SEGUNDOS)
+        return respuesta
+            
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/exportaciones/pagares', methods=['POST'])
+@csrf.exempt
+@permiso_requerido('prestamos.ver')
+def api_exportar_pagares():
+    """Inicia la exportación en ZIP de los pagarés de los préstamos activos visibles"""
+    try:
+        es_admin = session.get('rol') == 'admin'
+        datos = request.get_json(silent=True) or request.form.to_dict()
+        
+        # Opcional: solo los préstamos de un operador (siempre dentro de lo que ve el usuario)
+        operador_id = datos.get('operador_id')
+        if operador_id in (None, ''):
+            operador_id = None
+        else:
+            try:
+                operador_id = int(operador_id)
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'error': 'operador_id debe ser un número'}), 400
+        
+        trabajo_id = exportador_pagares.solicitar(session['user_id'], es_admin, operador_id)
+        respuesta = jsonify({
+            'success': True,
+            'trabajo_id': trabajo_id,
+            'url_estado': url_for('api_estado_trabajo', trabajo_id=trabajo_id),
+            'url_descarga': url_for('descargar_exportacion_pagares', trabajo_id=trabajo_id)
+        })
+        respuesta.status_code = 202
+        respuesta.headers['Location'] = url_for('api_estado_trabajo', trabajo_id=trabajo_id)
+        return respuesta
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/exportaciones/pagares/<int:trabajo_id>/descargar')
+@permiso_requerido('prestamos.ver')
+def descargar_exportacion_pagares(trabajo_id):
+    """Descarga el ZIP de una exportación de pagarés terminada"""
+    trabajo = cola_trabajos.obtener(trabajo_id)
+    
+    # Solo quien pidió la exportación o el administrador
+    if (not trabajo or trabajo['tipo'] != TRABAJO_EXPORTAR_PAGARES
+            or (session.get('rol') != 'admin' and trabajo['datos'].get('usuario_id') != session['user_id'])):
+        return jsonify({'success': False, 'error': 'Exportación no encontrada'}), 404
+    
+    if trabajo['estado'] != ESTADO_COMPLETADO:
+        respuesta = jsonify({'success': False, 'estado': trabajo['estado'], 'progreso': trabajo['progreso'],
+                             'error': trabajo['error']})
+        respuesta.status_code = 409 if trabajo['estado'] == ESTADO_FALLIDO else 202
+        respuesta.headers['Retry-After'] = str(PDF_REINTENTO_SEGUNDOS)
+        return respuesta
+    
+    ruta_zip = exportador_pagares.ruta_zip(trabajo_id)
+    if not os.path.exists(ruta_zip):
+        return jsonify({'success': False, 'error': 'La exportación ya expiró, solicítala de nuevo'}), 410
+    
+    from flask import send_file
+    return send_file(ruta_zip, as_attachment=True, mimetype='application/zip',
+                     download_name=f"pagares_{trabajo['creado'][:10]}_{trabajo_id}.zip")
+
 # Crear directorio de templates si no existe
 os.makedirs('templates', exist_ok=True)
 os.makedirs('static/css', exist_ok=True)
@@ -1699,39 +2120,26 @@ def eliminar_usuario_completo(usuario_id):
     return redirect(url_for('usuarios'))
 
 # Funciones auxiliares para recuperación de contraseña
+def clave_codigo_recuperacion(codigo):
+    """Clave con la que se guarda un código (el código en sí no queda en disco)"""
+    return hashlib.sha256(codigo.encode('utf-8')).hexdigest()
+
 def generar_codigo_recuperacion(usuario_id):
     """Genera un código de 6 dígitos para recuperación de contraseña"""
-    codigo = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
-    RECOVERY_CODES[codigo] = {
-        'usuario_id': usuario_id,
-        'timestamp': datetime.now(),
-        'usado': False
-    }
-    return codigo
+    # Reintentar si el código ya está en uso por otro usuario
+    while True:
+        codigo = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
+        if RECOVERY_CODES.agregar(clave_codigo_recuperacion(codigo), {'usuario_id': usuario_id},
+                                  CODIGO_RECUPERACION_SEGUNDOS):
+            return codigo
 
 def verificar_codigo_recuperacion(codigo):
-    """Verifica si un código de recuperación es válido"""
-    if codigo not in RECOVERY_CODES:
-        return None
-    
-    codigo_data = RECOVERY_CODES[codigo]
-    
-    # Verificar si el código ha expirado (10 minutos)
-    if datetime.now() - codigo_data['timestamp'] > timedelta(minutes=10):
-        del RECOVERY_CODES[codigo]
-        return None
-    
-    # Verificar si ya fue usado
-    if codigo_data['usado']:
-        del RECOVERY_CODES[codigo]
-        return None
-    
-    # Marcar como usado
-    codigo_data['usado'] = True
-    return codigo_data['usuario_id']
+    """Verifica si un código de recuperación es válido (cada código sirve una sola vez)"""
+    codigo_data = RECOVERY_CODES.tomar(clave_codigo_recuperacion(codigo))
+    return codigo_data['usuario_id'] if codigo_data else None
 
 def enviar_email_codigo(email, username, codigo):
-    """Envía email con código de recuperación de contraseña"""
+    """Encola el email con el código de recuperación de contraseña"""
     try:
         # Crear mensaje
         msg = MIMEMultipart()
@@ -1757,15 +2165,8 @@ def enviar_email_codigo(email, username, codigo):
         
         msg.attach(MIMEText(body, 'plain'))
         
-        # Conectar al servidor SMTP
-        server = smtplib.SMTP(SMTP_CONFIG['server'], SMTP_CONFIG['port'])
-        server.starttls()
-        server.login(SMTP_CONFIG['username'], SMTP_CONFIG['password'])
-        
-        # Enviar email
-        text = msg.as_string()
-        server.sendmail(SMTP_CONFIG['username'], email, text)
-        server.quit()
+        # Encolar en la bandeja de salida; el envío se hace en segundo plano
+        bandeja_salida.encolar(msg)
         
         return True
         
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Bandeja de Salida de Emails
+===========================
+
+Los emails no se envían dentro de la petición web: se guardan en una bandeja
+de salida (SQLite) y un hilo en segundo plano los entrega por lotes usando
+una conexión SMTP reutilizada:
+
+- La conexión se verifica con NOOP si estuvo inactiva y se reabre si el
+  servidor la cerró; se cierra sola tras un tiempo sin envíos.
+- Un error temporal (conexión, códigos 4xx) reintenta el mensaje con espera
+  exponencial; un rechazo permanente (5xx) lo marca como fallido.
+- Cada instancia entrega los mensajes de su cuenta SMTP, así varias cuentas
+  comparten el mismo archivo de bandeja.
+
+Para pruebas se puede apuntar a un servidor SMTP local de depuración, p. ej.
+con las variables SMTP_SERVIDOR=localhost SMTP_PUERTO=1025 SMTP_TLS=0.
+"""
+
+import json
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from email.message import Message
+from email.utils import getaddresses
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Estados de un mensaje
+ESTADO_PENDIENTE = 'pendiente'
+ESTADO_ENVIANDO = 'enviando'
+ESTADO_ENVIADO = 'enviado'
+ESTADO_FALLIDO = 'fallido'
+
+class BandejaSalida:
+    """Cola persistente de emails entregada por una conexión SMTP reutilizada"""
+
+    def __init__(self, db_path: str, servidor: str, puerto: int, usuario: Optional[str] = None,
+                 password: Optional[str] = None, usar_tls: bool = True, cuenta: str = 'sistema',
+                 tamano_lote: int = 20, max_intentos: int = 5, espera_reintento: float = 30.0,
+                 intervalo_consulta: float = 2.0, inactividad_maxima: float = 60.0,
+                 verificar_despues: float = 10.0, timeout: float = 30.0, plazo_bloqueo: float = 300.0):
+        self.db_path = db_path
+        self.servidor = servidor
+        self.puerto = puerto
+        self.usuario = usuario
+        self.password = password
+        self.usar_tls = usar_tls
+        self.cuenta = cuenta
+        self.tamano_lote = tamano_lote
+        self.max_intentos = max_intentos
+        self.espera_reintento = espera_reintento
+        self.intervalo_consulta = intervalo_consulta
+        self.inactividad_maxima = inactividad_maxima
+        self.verificar_despues = verificar_despues
+        self.timeout = timeout
+        self.plazo_bloqueo = plazo_bloqueo
+
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._ultimo_uso = 0.0
+        self._hay_mensajes = threading.Condition()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pid = None
+
+        directorio = os.path.dirname(db_path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._crear_tabla()
+
+    @classmethod
+    def desde_config(cls, smtp_config: Dict[str, Any], db_path: str, **opciones) -> 'BandejaSalida':
+        """Crea la bandeja a partir de un diccionario como SMTP_CONFIG.
+
+        SMTP_SERVIDOR, SMTP_PUERTO y SMTP_TLS en el entorno tienen prioridad,
+        para poder apuntar a un servidor local en pruebas.
+        """
+        return cls(
+            db_path,
+            servidor=os.getenv('SMTP_SERVIDOR', smtp_config.get('server', 'localhost')),
+            puerto=int(os.getenv('SMTP_PUERTO', smtp_config.get('port', 587))),
+            usuario=smtp_config.get('username'),
+            password=smtp_config.get('password'),
+            usar_tls=os.getenv('SMTP_TLS', '1' if smtp_config.get('use_tls', True) else '0') != '0',
+            **opciones
+        )
+
+    @contextmanager
+    def _conectar(self):
+        conexion = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conexion.row_factory = sqlite3.Row
+        try:
+            yield conexion
+        finally:
+            conexion.close()
+
+    def _crear_tabla(self):
+        with self._conectar() as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('''
+                CREATE TABLE IF NOT EXISTS mensajes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cuenta TEXT NOT NULL,
+                    remitente TEXT NOT NULL,
+                    destinatarios TEXT NOT NULL,
+                    asunto TEXT,
+                    contenido TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    disponible_desde REAL NOT NULL,
+                    error TEXT,
+                    creado TEXT NOT NULL,
+                    enviado TEXT
+                )
+            ''')
+            conexion.execute('CREATE INDEX IF NOT EXISTS idx_mensajes_estado '
+                             'ON mensajes (cuenta, estado, disponible_desde)')
+
+    # Encolado y consulta
+    def encolar(self, mensaje: Message, destinatarios: Optional[List[str]] = None) -> int:
+        """Guarda un email para su envío y devuelve su ID.
+
+        El remitente sale de la cabecera From (o del usuario SMTP) y los
+        destinatarios de To/Cc/Bcc si no se indican.
+        """
+        remitente = mensaje['From'] or self.usuario
+        if destinatarios is None:
+            campos = mensaje.get_all('To', []) + mensaje.get_all('Cc', []) + mensaje.get_all('Bcc', [])
+            destinatarios = [direccion for _, direccion in getaddresses(campos) if direccion]
+        if not destinatarios:
+            raise ValueError("El mensaje no tiene destinatarios")
+
+        with self._conectar() as conexion:
+            cursor = conexion.execute(
+                'INSERT INTO mensajes (cuenta, remitente, destinatarios, asunto, contenido, estado, '
+                'disponible_desde, creado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.cuenta, remitente, json.dumps(destinatarios), mensaje['Subject'], mensaje.as_string(),
+                 ESTADO_PENDIENTE, time.time(), datetime.now().isoformat()))
+            mensaje_id = cursor.lastrowid
+
+        with self._hay_mensajes:
+            self._hay_mensajes.notify()
+        return mensaje_id
+
+    def obtener(self, mensaje_id: int) -> Optional[Dict[str, Any]]:
+        """Obtiene el estado de un mensaje (sin el contenido)"""
+        with self._conectar() as conexion:
+            fila = conexion.execute(
+                'SELECT id, cuenta, destinatarios, asunto, estado, intentos, error, creado, enviado '
+                'FROM mensajes WHERE id = ?', (mensaje_id,)).fetchone()
+        if not fila:
+            return None
+        mensaje = dict(fila)
+        mensaje['destinatarios'] = json.loads(mensaje['destinatarios'])
+        return mensaje
+
+    # Hilo de envío
+    def iniciar(self):
+        """Arranca el hilo de envío (una sola vez por proceso).
+        
+        Si la bandeja viene de un fork (workers de gunicorn con preload_app),
+        el hilo y la conexión SMTP del padre no sirven: se descartan sin
+        cerrar la conexión, que sigue siendo del padre.
+        """
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            self._smtp = None
+        self._hay_mensajes = threading.Condition()
+        self._detener = threading.Event()
+        self._pid = os.getpid()
+        self._hilo = threading.Thread(target=self._bucle, name=f"bandeja-salida-{self.cuenta}", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 5.0):
+        """Detiene el hilo de envío; los mensajes pendientes quedan en la bandeja"""
+        self._detener.set()
+        with self._hay_mensajes:
+            self._hay_mensajes.notify_all()
+        if self._hilo:
+            self._hilo.join(timeout)
+            self._hilo = None
+        self._pid = None
+        self._cerrar_conexion()
+
+    def enviar_pendientes(self) -> int:
+        """Envía en el hilo actual los mensajes disponibles; devuelve cuántos se enviaron"""
+        enviados = 0
+        while True:
+            lote = self._tomar_lote()
+            if not lote:
+                return enviados
+            enviados += self._enviar_lote(lote)
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                lote = self._tomar_lote()
+                if lote:
+                    self._enviar_lote(lote)
+                    continue
+            except Exception:
+                logger.exception("❌ Error en la bandeja de salida")
+
+            if self._smtp and time.monotonic() - self._ultimo_uso > self.inactividad_maxima:
+                self._cerrar_conexion()
+
+            with self._hay_mensajes:
+                self._hay_mensajes.wait(self.intervalo_consulta)
+
+    def _tomar_lote(self) -> List[sqlite3.Row]:
+        """Marca atómicamente como 'enviando' el próximo lote de mensajes disponibles"""
+        ahora = time.time()
+        # SELECT + UPDATE dentro de BEGIN IMMEDIATE en lugar de UPDATE ... RETURNING,
+        # que requiere SQLite 3.35 (no siempre presente con Python 3.8)
+        with self._conectar() as conexion:
+            conexion.execute('BEGIN IMMEDIATE')
+            try:
+                lote = conexion.execute('''
+                    SELECT id, remitente, destinatarios, contenido, intentos + 1 AS intentos
+                    FROM mensajes
+                    WHERE cuenta = ? AND estado IN (?, ?) AND disponible_desde <= ?
+                    ORDER BY disponible_desde, id
+                    LIMIT ?
+                ''', (self.cuenta, ESTADO_PENDIENTE, ESTADO_ENVIANDO, ahora, self.tamano_lote)).fetchall()
+                conexion.executemany(
+                    'UPDATE mensajes SET estado = ?, intentos = intentos + 1, disponible_desde = ? WHERE id = ?',
+                    [(ESTADO_ENVIANDO, ahora + self.plazo_bloqueo, mensaje['id']) for mensaje in lote])
+            except BaseException:
+                conexion.execute('ROLLBACK')
+                raise
+            conexion.execute('COMMIT')
+        return lote
+
+    def _enviar_lote(self, lote: List[sqlite3.Row]) -> int:
+        enviados = 0
+        for posicion, mensaje in enumerate(lote):
+            try:
+                smtp = self._obtener_conexion()
+                smtp.sendmail(mensaje['remitente'], json.loads(mensaje['destinatarios']),
+                              mensaje['contenido'].encode('utf-8'))
+                self._ultimo_uso = time.monotonic()
+            except smtplib.SMTPRecipientsRefused as e:
+                # Rechazo de todos los destinatarios: es definitivo solo si ninguno fue temporal
+                # (4xx, p. ej. greylisting o buzón lleno)
+                permanente = bool(e.recipients) and all(codigo >= 500 for codigo, _ in e.recipients.values())
+                self._registrar_fallo(mensaje, e, permanente)
+            except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                self._registrar_fallo(mensaje, e, permanente=e.smtp_code >= 500)
+            except (smtplib.SMTPException, OSError) as e:
+                # Falla de conexión: se reintenta este mensaje y los que quedaban en el lote
+                self._cerrar_conexion()
+                for pendiente in lote[posicion:]:
+                    self._registrar_fallo(pendiente, e, permanente=False)
+                break
+            else:
+                self._actualizar(mensaje['id'], estado=ESTADO_ENVIADO, error=None,
+                                 enviado=datetime.now().isoformat())
+                enviados += 1
+
+        if enviados:
+            logger.info("📧 Bandeja de salida (%s): %s de %s mensajes enviados", self.cuenta, enviados, len(lote))
+        return enviados
+
+    def _registrar_fallo(self, mensaje: sqlite3.Row, error: Exception, permanente: bool):
+        if permanente or mensaje['intentos'] >= self.max_intentos:
+            self._actualizar(mensaje['id'], estado=ESTADO_FALLIDO, error=str(error))
+            logger.error("❌ Email #%s no enviado: %s", mensaje['id'], error)
+            return
+
+        espera = self.espera_reintento * 2 ** (mensaje['intentos'] - 1)
+        self._actualizar(mensaje['id'], estado=ESTADO_PENDIENTE, error=str(error),
+                         disponible_desde=time.time() + espera)
+        logger.warning("⚠️ Email #%s falló (intento %s/%s), reintento en %.0fs: %s",
+                       mensaje['id'], mensaje['intentos'], self.max_intentos, espera, error)
+
+    def _actualizar(self, mensaje_id: int, **campos):
+        asignaciones = ', '.join(f"{campo} = ?" for campo in campos)
+        with self._conectar() as conexion:
+            conexion.execute(f'UPDATE mensajes SET {asignaciones} WHERE id = ?', (*campos.values(), mensaje_id))
+
+    # Conexión SMTP
+    def _obtener_conexion(self) -> smtplib.SMTP:
+        """Devuelve la conexión abierta, verificándola si estuvo inactiva, o abre una nueva"""
+        if self._smtp is not None and time.monotonic() - self._ultimo_uso > self.verificar_despues:
+            try:
+                codigo, _ = self._smtp.noop()
+                if codigo != 250:
+                    raise smtplib.SMTPServerDisconnected(f"NOOP respondió {codigo}")
+                self._ultimo_uso = time.monotonic()
+            except (smtplib.SMTPException, OSError):
+                self._cerrar_conexion()
+
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.servidor, self.puerto, timeout=self.timeout)
+            if self.usar_tls:
+                smtp.starttls()
+            if self.usuario and self.password:
+                smtp.login(self.usuario, self.password)
+            self._smtp = smtp
+            self._ultimo_uso = time.monotonic()
+        return self._smtp
+
+    def _cerrar_conexion(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
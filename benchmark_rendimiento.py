@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Benchmark de Almacenamiento y Servicios
+=======================================
+
+Mide cada método público de Database y los servicios más usados sobre
+carteras sintéticas (generador_datos.py) de varios tamaños, para ver cómo
+escala cada operación y detectar regresiones entre versiones:
+
+- Para cada escala (cantidad de préstamos) genera una cartera nueva en un
+  directorio temporal, con la misma semilla: los resultados son comparables.
+- Cada operación se ejecuta una vez de calentamiento y luego --repeticiones
+  veces; se informa la mediana y el p95 en milisegundos y cuánto crece de
+  la escala menor a la mayor.
+- --guardar escribe los resultados en JSON (línea base) y --comparar los
+  contrasta con una línea base anterior; sale con código 1 si alguna
+  operación es más lenta que la tolerancia.
+
+Backends: "json" (archivos de data/, por defecto) y "postgresql" (el
+adaptador de database_postgresql.py). El de PostgreSQL usa la base indicada
+en BENCHMARK_DATABASE_URL, nunca DATABASE_URL, porque vacía las tablas
+antes de cargar cada escala; el esquema debe existir (migrate_to_postgresql.py
+y migraciones_postgresql.py).
+
+Uso: python benchmark_rendimiento.py [--escalas 100 1000 5000] [--repeticiones 5]
+     [--backend json|postgresql] [--guardar base.json] [--comparar base.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from generador_datos import PASSWORD_PRUEBA, DatosSinteticos, GeneradorDatos, guardar_json
+
+ESCALAS = (100, 1000, 5000)
+REPETICIONES = 5
+SEMILLA = 42
+# Una operación es regresión si su mediana supera la de la línea base por este factor
+TOLERANCIA = 1.3
+# ...y por al menos estos milisegundos (las operaciones de microsegundos son puro ruido)
+DIFERENCIA_MINIMA_MS = 0.5
+
+# (nombre, operación) u (nombre, operación, preparación): la preparación corre antes
+# de cada ejecución sin medirse (p. ej. crear el registro que la operación elimina)
+Operacion = Union[Tuple[str, Callable[[Any], Any]], Tuple[str, Callable[[Any], Any], Callable[[Any], Any]]]
+
+class Referencias:
+    """IDs de referencia de una cartera: el admin y el operador más cargado con sus registros"""
+
+    def __init__(self, datos: DatosSinteticos):
+        self.admin = datos.usuarios[0]
+        # El operador con más préstamos activos: el caso más pesado para un usuario normal
+        cantidades = {}
+        for prestamo in datos.prestamos:
+            cantidades[prestamo.usuario_id] = cantidades.get(prestamo.usuario_id, 0) + (prestamo.estado == 'activo')
+        operador_id = max(cantidades, key=cantidades.get)
+        self.operador = next(u for u in datos.usuarios if u.id == operador_id)
+
+        self.cliente = next(c for c in datos.clientes if c.usuario_id == operador_id)
+        # Los activos con más saldo: los pagos de 1.00 del benchmark no llegan a cancelarlos
+        activos = sorted((p for p in datos.prestamos if p.usuario_id == operador_id and p.estado == 'activo'
+                          and p.calcular_saldo_pendiente() > 50),
+                         key=lambda p: p.calcular_saldo_pendiente(), reverse=True)[:20]
+        self.prestamo = activos[0] if activos else next(p for p in datos.prestamos if p.usuario_id == operador_id)
+        self.prestamos_activos = activos or [self.prestamo]
+        self.pago = next((p for p in datos.pagos if p.usuario_id == operador_id), datos.pagos[0])
+        self.clientes_creados, self.prestamos_creados, self.pagos_creados = [], [], []
+        self.usuarios_creados = []
+        self.siguiente = 0
+
+    def prestamo_para_pago(self):
+        """Préstamo activo al que registrar el próximo pago (rota entre los activos del operador)"""
+        self.siguiente += 1
+        return self.prestamos_activos[self.siguiente % len(self.prestamos_activos)]
+
+# Backend JSON
+class ContextoJSON(Referencias):
+    """Base de datos y servicios sobre la cartera guardada en JSON"""
+
+    def __init__(self, datos: DatosSinteticos, data_dir: str):
+        from services import PagoService, PrestamoService, ReporteService
+
+        super().__init__(datos)
+        self.db = guardar_json(datos, data_dir)
+        self.pagos_service = PagoService(self.db)
+        self.prestamos_service = PrestamoService(self.db)
+        self.reportes_service = ReporteService(self.db)
+
+def _nuevo_cliente(ctx):
+    from models import Cliente
+
+    ctx.siguiente += 1
+    cliente = ctx.db.agregar_cliente(Cliente(0, 'Benchmark', f'Cliente {ctx.siguiente}',
+                                             f'B{time.time_ns() % 10**10}', '900000000'), ctx.operador.id)
+    ctx.clientes_creados.append(cliente.id)
+    return cliente
+
+def _nuevo_prestamo(ctx):
+    from models import Prestamo
+
+    prestamo = ctx.db.agregar_prestamo(Prestamo(0, ctx.cliente.id, Decimal('500'), Decimal('20'), 30, 'simple'),
+                                       ctx.operador.id)
+    ctx.prestamos_creados.append(prestamo.id)
+    return prestamo
+
+def _nuevo_pago(ctx):
+    from models import Pago
+
+    pago = ctx.db.agregar_pago(Pago(0, ctx.prestamo_para_pago().id, Decimal('1.00')), ctx.operador.id)
+    ctx.pagos_creados.append(pago.id)
+    return pago
+
+def _nuevos_pagos_lote(ctx, cantidad: int = 10):
+    from models import Pago
+
+    prestamos = {}
+    pagos = []
+    for _ in range(cantidad):
+        prestamo_id = ctx.prestamo_para_pago().id
+        prestamo = prestamos.get(prestamo_id) or ctx.db.obtener_prestamo(prestamo_id, ctx.operador.id)
+        prestamos[prestamo_id] = prestamo
+        pago = Pago(0, prestamo_id, Decimal('1.00'))
+        prestamo.agregar_pago(pago)
+        pagos.append(pago)
+    return ctx.db.agregar_pagos_lote(pagos, list(prestamos.values()), ctx.operador.id)
+
+def _nuevo_usuario(ctx):
+    from models import Usuario
+
+    nombre = f'benchmark{time.time_ns()}'
+    usuario = ctx.db.agregar_usuario(Usuario(0, nombre, ctx.operador.password_hash, 'Usuario Benchmark',
+                                             f'{nombre}@prueba.local', 'operador'), ctx.admin.id)
+    ctx.usuarios_creados.append(usuario.id)
+    return usuario
+
+def _actualizar_cliente(ctx):
+    cliente = ctx.db.obtener_cliente(ctx.cliente.id, ctx.operador.id)
+    cliente.telefono = f'9{ctx.siguiente:08d}'
+    return ctx.db.actualizar_cliente(cliente, ctx.operador.id)
+
+def _actualizar_prestamo(ctx):
+    prestamo = ctx.db.obtener_prestamo(ctx.prestamo.id, ctx.operador.id)
+    prestamo.descripcion = f'benchmark {ctx.siguiente}'
+    return ctx.db.actualizar_prestamo(prestamo, ctx.operador.id)
+
+# Las eliminaciones borran lo creado por las operaciones agregar_* (que se miden antes)
+def _eliminar_pago(ctx):
+    if ctx.pagos_creados:
+        return ctx.db.eliminar_pago(ctx.pagos_creados.pop(), ctx.operador.id)
+
+def _eliminar_prestamo(ctx):
+    if ctx.prestamos_creados:
+        return ctx.db.eliminar_prestamo(ctx.prestamos_creados.pop(), ctx.operador.id)
+
+def _eliminar_cliente(ctx):
+    if ctx.clientes_creados:
+        return ctx.db.eliminar_cliente(ctx.clientes_creados.pop(), ctx.operador.id)
+
+def _eliminar_cliente_completo(ctx):
+    if ctx.clientes_creados:
+        return ctx.db.eliminar_cliente_completo(ctx.clientes_creados.pop())
+
+def _actualizar_usuario(ctx):
+    usuario = ctx.db.obtener_usuario(ctx.operador.id, ctx.admin.id, True)
+    usuario.nombre = f'{ctx.operador.nombre} {ctx.siguiente}'
+    return ctx.db.actualizar_usuario(usuario, ctx.admin.id, True)
+
+def _eliminar_usuario(ctx):
+    if ctx.usuarios_creados:
+        return ctx.db.eliminar_usuario(ctx.usuarios_creados.pop(), ctx.admin.id, True)
+
+def _eliminar_usuario_completo(ctx):
+    if ctx.usuarios_creados:
+        return ctx.db.eliminar_usuario_completo(ctx.usuarios_creados.pop(), ctx.admin.id, True)
+
+def _registrar_firma(ctx):
+    # Solo registra la ruta: no se escriben ni borran archivos de firmas
+    ctx.siguiente += 1
+    return ctx.db.registrar_firma_prestamo(ctx.prestamo.id, f'firmas/benchmark_{ctx.siguiente}.png',
+                                           f'{ctx.siguiente:064x}')
+
+def _actualizar_configuracion(ctx):
+    configuracion = ctx.db.obtener_configuracion()
+    return ctx.db.actualizar_configuracion(configuracion)
+
+def _registrar_accesos(ctx):
+    ctx.db.registrar_acceso(ctx.operador.id, datetime.now())
+    return ctx.db.guardar_accesos_pendientes()
+
+OPERACIONES_JSON: List[Operacion] = [
+    # Lecturas
+    ('db.listar_clientes (operador)', lambda c: c.db.listar_clientes(c.operador.id)),
+    ('db.listar_clientes (admin)', lambda c: c.db.listar_clientes(c.admin.id, True)),
+    ('db.obtener_cliente', lambda c: c.db.obtener_cliente(c.cliente.id, c.operador.id)),
+    ('db.obtener_cliente_por_dni', lambda c: c.db.obtener_cliente_por_dni(c.cliente.dni, c.operador.id)),
+    ('db.buscar_clientes', lambda c: c.db.buscar_clientes(c.cliente.apellido[:4], c.operador.id)),
+    ('db.listar_prestamos (operador)', lambda c: c.db.listar_prestamos(c.operador.id)),
+    ('db.listar_prestamos (admin)', lambda c: c.db.listar_prestamos(c.admin.id, True)),
+    ('db.obtener_prestamo', lambda c: c.db.obtener_prestamo(c.prestamo.id, c.operador.id)),
+    ('db.obtener_prestamos_por_id', lambda c: c.db.obtener_prestamos_por_id(c.operador.id)),
+    ('db.iterar_visibles (pagos)', lambda c: sum(1 for _ in c.db.iterar_visibles(c.db.pagos_file, c.operador.id))),
+    ('db.obtener_prestamos_activos', lambda c: c.db.obtener_prestamos_activos(c.operador.id)),
+    ('db.obtener_prestamos_vencidos', lambda c: c.db.obtener_prestamos_vencidos()),
+    ('db.listar_pagos (operador)', lambda c: c.db.listar_pagos(c.operador.id)),
+    ('db.listar_pagos (préstamo)', lambda c: c.db.listar_pagos(c.operador.id, False, c.prestamo.id)),
+    ('db.obtener_pago', lambda c: c.db.obtener_pago(c.pago.id, c.operador.id)),
+    ('db.obtener_estadisticas (operador)', lambda c: c.db.obtener_estadisticas(c.operador.id)),
+    ('db.obtener_estadisticas (admin)', lambda c: c.db.obtener_estadisticas(c.admin.id, True)),
+    ('db.listar_usuarios', lambda c: c.db.listar_usuarios(c.admin.id, True)),
+    ('db.obtener_usuario', lambda c: c.db.obtener_usuario(c.operador.id, c.admin.id, True)),
+    ('db.obtener_usuario_por_username', lambda c: c.db.obtener_usuario_por_username(c.operador.username)),
+    ('db.obtener_usuario_por_email', lambda c: c.db.obtener_usuario_por_email(c.operador.email)),
+    ('db.verificar_login', lambda c: c.db.verificar_login(c.operador.username, PASSWORD_PRUEBA)),
+    ('db.obtener_configuracion', lambda c: c.db.obtener_configuracion()),
+    ('db.obtener_version_datos', lambda c: c.db.obtener_version_datos(c.db.ambito_usuario(c.operador.id))),
+    # Escrituras
+    ('db.agregar_cliente', _nuevo_cliente),
+    ('db.actualizar_cliente', _actualizar_cliente),
+    ('db.agregar_prestamo', _nuevo_prestamo),
+    ('db.actualizar_prestamo', _actualizar_prestamo),
+    ('db.agregar_pago', _nuevo_pago),
+    ('db.agregar_pagos_lote (10)', _nuevos_pagos_lote),
+    ('db.eliminar_pago', _eliminar_pago),
+    ('db.eliminar_prestamo', _eliminar_prestamo),
+    ('db.eliminar_cliente', _eliminar_cliente),
+    ('db.eliminar_cliente_completo', _eliminar_cliente_completo, _nuevo_cliente),
+    ('db.registrar_firma_prestamo', _registrar_firma),
+    ('db.agregar_usuario', _nuevo_usuario),
+    ('db.actualizar_usuario', _actualizar_usuario),
+    ('db.cambiar_password_usuario', lambda c: c.db.cambiar_password_usuario(c.operador.id, PASSWORD_PRUEBA)),
+    ('db.eliminar_usuario', _eliminar_usuario),
+    ('db.eliminar_usuario_completo', _eliminar_usuario_completo, _nuevo_usuario),
+    ('db.guardar_accesos_pendientes', _registrar_accesos),
+    ('db.actualizar_configuracion', _actualizar_configuracion),
+    ('db.cambiar_nombre_sistema', lambda c: c.db.cambiar_nombre_sistema('Sistema de Préstamos')),
+    # Servicios
+    ('PagoService.registrar_pago', lambda c: c.pagos_service.registrar_pago(
+        c.prestamo_para_pago().id, Decimal('1.00'), usuario_id=c.operador.id)),
+    ('PrestamoService.listar_prestamos_activos (operador)',
+     lambda c: c.prestamos_service.listar_prestamos_activos(c.operador.id)),
+    ('PrestamoService.listar_prestamos_activos (admin)',
+     lambda c: c.prestamos_service.listar_prestamos_activos(c.admin.id, True)),
+    ('PrestamoService.calcular_estadisticas_prestamos',
+     lambda c: c.prestamos_service.calcular_estadisticas_prestamos(c.operador.id)),
+    ('ReporteService.generar_reporte_prestamos_activos',
+     lambda c: c.reportes_service.generar_reporte_prestamos_activos(c.operador.id)),
+    ('ReporteService.generar_reporte_general (obtener_estadisticas)',
+     lambda c: c.reportes_service.generar_reporte_general(c.operador.id)),
+]
+
+# Backend PostgreSQL
+def cargar_postgresql(datos: DatosSinteticos, db):
+    """Vacía las tablas de la base de benchmark y carga la cartera con COPY"""
+    import io
+
+    from migrate_to_postgresql import _valor_copy
+
+    filas = {
+        'usuarios': (('id', 'username', 'password_hash', 'nombre', 'email', 'rol', 'activo', 'fecha_creacion'),
+                     [(u.id, u.username, u.password_hash, u.nombre, u.email, u.rol, u.activo, u.fecha_registro)
+                      for u in datos.usuarios]),
+        'clientes': (('id', 'dni', 'nombre', 'apellido', 'telefono', 'email', 'usuario_id', 'usuario_creador_id',
+                      'fecha_creacion', 'activo'),
+                     [(c.id, c.dni, c.nombre, c.apellido, c.telefono, c.email, c.usuario_id, c.usuario_id,
+                       c.fecha_registro, c.activo) for c in datos.clientes]),
+        'prestamos': (('id', 'cliente_id', 'monto_original', 'monto_restante', 'tasa_interes', 'plazo_meses',
+                       'fecha_inicio', 'fecha_vencimiento', 'estado', 'usuario_id', 'usuario_creador_id',
+                       'fecha_creacion'),
+                      [(p.id, p.cliente_id, p.monto, max(Decimal('0'), p.calcular_saldo_pendiente()).quantize(
+                          Decimal('0.01')), p.tasa_interes, math.ceil(p.plazo_dias / 30), p.fecha_inicio,
+                        p.fecha_inicio + timedelta(days=p.plazo_dias), p.estado, p.usuario_id, p.usuario_id,
+                        p.fecha_creacion) for p in datos.prestamos]),
+        'pagos': (('id', 'prestamo_id', 'monto', 'fecha_pago', 'tipo_pago', 'usuario_id', 'fecha_creacion',
+                   'observaciones'),
+                  [(p.id, p.prestamo_id, p.monto, p.fecha.date(), 'cuota', p.usuario_id, p.fecha, p.concepto)
+                   for p in datos.pagos]),
+    }
+
+    with db.conexion() as conexion:
+        with conexion.cursor() as cursor:
+            # TRUNCATE no dispara los triggers por fila: los resúmenes se vacían aparte
+            cursor.execute("SELECT to_regclass('resumen_prestamos') IS NOT NULL")
+            resumenes = ', resumen_prestamos, resumen_pagos' if cursor.fetchone()[0] else ''
+            cursor.execute(f"TRUNCATE pagos, prestamos, clientes, usuarios{resumenes} RESTART IDENTITY CASCADE")
+            for tabla, (columnas, registros) in filas.items():
+                buffer = io.StringIO(''.join('\t'.join(_valor_copy(v) for v in registro) + '\n'
+                                             for registro in registros))
+                cursor.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN", buffer)
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), "
+                               f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {tabla}")
+            cursor.execute("ANALYZE")
+
+class ContextoPostgreSQL(Referencias):
+    """Adaptadores de PostgreSQL con la cartera cargada"""
+
+    def __init__(self, datos: DatosSinteticos, db):
+        from database_postgresql import ClientePostgreSQL, PagoPostgreSQL, PrestamoPostgreSQL, UsuarioPostgreSQL
+
+        cargar_postgresql(datos, db)
+        self.db = db
+        self.usuarios = UsuarioPostgreSQL(db)
+        self.clientes = ClientePostgreSQL(db)
+        self.prestamos = PrestamoPostgreSQL(db)
+        self.pagos = PagoPostgreSQL(db)
+
+        super().__init__(datos)
+
+OPERACIONES_POSTGRESQL: List[Operacion] = [
+    ('usuarios.obtener_usuario', lambda c: c.usuarios.obtener_usuario(c.operador.id)),
+    ('usuarios.obtener_usuario_por_username', lambda c: c.usuarios.obtener_usuario_por_username(c.operador.username)),
+    ('clientes.obtener_cliente', lambda c: c.clientes.obtener_cliente(c.cliente.id, c.operador.id)),
+    ('clientes.listar_clientes (operador)', lambda c: c.clientes.listar_clientes(c.operador.id)),
+    ('clientes.listar_clientes (admin)', lambda c: c.clientes.listar_clientes(c.admin.id, True)),
+    ('clientes.buscar_clientes', lambda c: c.clientes.buscar_clientes(c.cliente.apellido[:4], c.operador.id)),
+    ('prestamos.obtener_prestamo', lambda c: c.prestamos.obtener_prestamo(c.prestamo.id, c.operador.id)),
+    ('prestamos.listar_prestamos_activos (operador)', lambda c: c.prestamos.listar_prestamos_activos(c.operador.id)),
+    ('prestamos.listar_prestamos_activos (admin)', lambda c: c.prestamos.listar_prestamos_activos(c.admin.id, True)),
+    ('prestamos.obtener_estadisticas (operador)', lambda c: c.prestamos.obtener_estadisticas(c.operador.id)),
+    ('prestamos.obtener_estadisticas (admin)', lambda c: c.prestamos.obtener_estadisticas(c.admin.id, True)),
+    ('prestamos.iterar_prestamos (admin)', lambda c: sum(1 for _ in c.prestamos.iterar_prestamos(c.admin.id, True))),
+    ('pagos.obtener_pagos_por_prestamo', lambda c: c.pagos.obtener_pagos_por_prestamo(c.prestamo.id)),
+    ('pagos.obtener_estadisticas_pagos (operador)', lambda c: c.pagos.obtener_estadisticas_pagos(c.operador.id)),
+    ('pagos.crear_pago', lambda c: c.pagos.crear_pago(c.prestamo.id, 1.0, date.today(), usuario_id=c.operador.id)),
+]
+
+# Medición
+def medir(operacion: Callable[[Any], Any], contexto, repeticiones: int,
+          preparar: Optional[Callable[[Any], Any]] = None) -> Dict[str, float]:
+    """Mediana, p95 y mínimo (ms) de `repeticiones` ejecuciones tras una de calentamiento"""
+    if preparar:
+        preparar(contexto)
+    operacion(contexto)
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar(contexto)
+        inicio = time.perf_counter()
+        operacion(contexto)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(tiempos[min(len(tiempos) - 1, math.ceil(len(tiempos) * 0.95) - 1)], 3),
+        'min_ms': round(tiempos[0], 3),
+    }
+
+def ejecutar(backend: str, escalas: List[int], repeticiones: int, semilla: int = SEMILLA) -> Dict[str, Any]:
+    """Corre todas las operaciones del backend en cada escala"""
+    resultados: Dict[str, Dict[str, Dict[str, float]]] = {}
+    tamanos = {}
+
+    db_postgresql = None
+    if backend == 'postgresql':
+        url = os.getenv('BENCHMARK_DATABASE_URL')
+        if not url:
+            raise SystemExit("❌ Configure BENCHMARK_DATABASE_URL (una base de prueba: se vacía en cada escala)")
+        os.environ['DATABASE_URL'] = url
+        from database_postgresql import PostgreSQLDatabase
+        db_postgresql = PostgreSQLDatabase()
+
+    try:
+        for escala in escalas:
+            print(f"🎲 Escala {escala}: generando cartera...")
+            datos = GeneradorDatos(semilla, hoy=date.today()).generar(escala)
+            tamanos[str(escala)] = datos.resumen()
+
+            directorio = tempfile.mkdtemp(prefix=f'benchmark_{escala}_')
+            try:
+                if backend == 'json':
+                    contexto, operaciones = ContextoJSON(datos, directorio), OPERACIONES_JSON
+                else:
+                    contexto, operaciones = ContextoPostgreSQL(datos, db_postgresql), OPERACIONES_POSTGRESQL
+
+                for nombre, operacion, *preparar in operaciones:
+                    medicion = medir(operacion, contexto, repeticiones, *preparar)
+                    resultados.setdefault(nombre, {})[str(escala)] = medicion
+                    print(f"   ⏱️  {nombre}: {medicion['mediana_ms']:.2f} ms")
+            finally:
+                shutil.rmtree(directorio, ignore_errors=True)
+    finally:
+        if db_postgresql:
+            db_postgresql.close()
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'backend': backend,
+        'semilla': semilla,
+        'repeticiones': repeticiones,
+        'escalas': [str(escala) for escala in escalas],
+        'tamanos': tamanos,
+        'resultados': resultados,
+    }
+
+def imprimir_curvas(informe: Dict[str, Any]):
+    """Tabla de medianas por escala y factor de crecimiento de la menor a la mayor"""
+    escalas = informe['escalas']
+    ancho = max(len(nombre) for nombre in informe['resultados']) + 2
+    print()
+    print(f"📈 Mediana (ms) por cantidad de préstamos - backend {informe['backend']}")
+    print('Operación'.ljust(ancho) + ''.join(e.rjust(11) for e in escalas) + 'crece'.rjust(9))
+    for nombre, por_escala in informe['resultados'].items():
+        medianas = [por_escala.get(e, {}).get('mediana_ms') for e in escalas]
+        celdas = ''.join((f"{m:.2f}" if m is not None else '-').rjust(11) for m in medianas)
+        crece = f"x{medianas[-1] / medianas[0]:.1f}" if len(medianas) > 1 and medianas[0] else ''
+        print(nombre.ljust(ancho) + celdas + crece.rjust(9))
+
+def comparar(informe: Dict[str, Any], base: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Operaciones/escalas cuya mediana supera la de la línea base por más de `tolerancia`"""
+    regresiones = []
+    print()
+    print(f"🔎 Comparación con la línea base del {base.get('fecha', '?')} (tolerancia x{tolerancia})")
+    for nombre, por_escala in informe['resultados'].items():
+        for escala, medicion in por_escala.items():
+            anterior = base.get('resultados', {}).get(nombre, {}).get(escala)
+            if not anterior or not anterior['mediana_ms']:
+                continue
+            factor = medicion['mediana_ms'] / anterior['mediana_ms']
+            if abs(medicion['mediana_ms'] - anterior['mediana_ms']) < DIFERENCIA_MINIMA_MS:
+                continue
+            if factor > tolerancia:
+                regresiones.append(f"{nombre} @ {escala}")
+                print(f"   ❌ {nombre} @ {escala}: {anterior['mediana_ms']:.2f} → "
+                      f"{medicion['mediana_ms']:.2f} ms (x{factor:.2f})")
+            elif factor < 1 / tolerancia:
+                print(f"   🚀 {nombre} @ {escala}: {anterior['mediana_ms']:.2f} → "
+                      f"{medicion['mediana_ms']:.2f} ms (x{factor:.2f})")
+    if not regresiones:
+        print("   ✅ Sin regresiones")
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de Database y servicios a varias escalas")
+    parser.add_argument('--escalas', type=int, nargs='+', default=list(ESCALAS),
+                        help=f"Cantidades de préstamos (por defecto: {' '.join(map(str, ESCALAS))})")
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--backend', choices=('json', 'postgresql'), default='json')
+    parser.add_argument('--semilla', type=int, default=SEMILLA)
+    parser.add_argument('--guardar', help="Guardar los resultados como línea base JSON")
+    parser.add_argument('--comparar', help="Línea base JSON con la que comparar")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+    args = parser.parse_args()
+
+    informe = ejecutar(args.backend, sorted(args.escalas), args.repeticiones, args.semilla)
+    imprimir_curvas(informe)
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"💾 Línea base guardada en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        if comparar(informe, base, args.tolerancia):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
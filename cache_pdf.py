@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Caché de PDFs de Pagarés
+========================
+
+Los PDFs se guardan con el hash de su contenido de origen como nombre: los
+datos del préstamo y del cliente que aparecen en el pagaré, el contenido de
+la firma y la versión de la plantilla. Si nada cambió, la misma clave apunta
+al PDF ya generado y basta con enviar el archivo; el hash sirve además como
+ETag para que el navegador no vuelva a descargarlo.
+
+La carpeta tiene un límite de tamaño y de archivos; al superarlo se borran
+los PDFs usados hace más tiempo (LRU, según la fecha de modificación que se
+actualiza en cada acierto). Funciona entre procesos porque todo el estado
+está en el sistema de archivos.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Callable, Optional, Tuple
+
+from metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# Versión de la plantilla del pagaré: incrementarla invalida los PDFs cacheados
+VERSION_PLANTILLA_PAGARE = 2
+
+def hash_archivo(ruta: Optional[str]) -> Optional[str]:
+    """SHA-256 del contenido de un archivo (None si no hay archivo)"""
+    if not ruta:
+        return None
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(65536), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+def clave_pagare(prestamo, cliente, firma_path: Optional[str] = None, firma_hash: Optional[str] = None) -> str:
+    """Clave de caché del PDF del pagaré a partir de los datos que aparecen en él"""
+    # La firma registrada en el préstamo ya tiene su hash: no hace falta leer el archivo
+    if firma_hash is None and firma_path and firma_path == getattr(prestamo, 'firma_path', None):
+        firma_hash = prestamo.firma_hash
+    datos = {
+        'plantilla': VERSION_PLANTILLA_PAGARE,
+        'prestamo': {
+            'id': prestamo.id,
+            'monto': str(prestamo.monto),
+            'tasa_interes': str(prestamo.tasa_interes),
+            'plazo_dias': prestamo.plazo_dias,
+            'tipo_interes': prestamo.tipo_interes,
+            'fecha_inicio': prestamo.fecha_inicio.isoformat(),
+        },
+        'cliente': {
+            'nombre': cliente.nombre,
+            'apellido': cliente.apellido,
+            'dni': cliente.dni,
+            'telefono': cliente.telefono,
+            'email': cliente.email,
+        },
+        'firma': firma_hash or hash_archivo(firma_path),
+    }
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode('utf-8')).hexdigest()
+
+class CachePDF:
+    """Carpeta de PDFs direccionados por contenido con expulsión LRU"""
+
+    def __init__(self, directorio: str = os.path.join('data', 'cache_pdf'),
+                 tamano_maximo: int = 200 * 1024 * 1024, max_archivos: int = 2000):
+        # Ruta absoluta: send_file resuelve las rutas relativas desde la raíz de la app
+        self.directorio = os.path.abspath(directorio)
+        self.tamano_maximo = tamano_maximo
+        self.max_archivos = max_archivos
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.pdf")
+
+    def obtener(self, clave: str) -> Optional[str]:
+        """Ruta del PDF cacheado, marcándolo como usado, o None si no existe"""
+        ruta = self.ruta(clave)
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            return None
+        return ruta
+
+    def guardar(self, clave: str, contenido: bytes) -> str:
+        """Guarda un PDF en la caché (escritura atómica) y devuelve su ruta"""
+        ruta = self.ruta(clave)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, 'wb') as f:
+                f.write(contenido)
+            os.replace(temporal, ruta)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        
+        self._expulsar()
+        return ruta
+
+    def obtener_o_generar(self, clave: str, generar: Callable[[], bytes]) -> Tuple[Optional[str], Optional[bytes]]:
+        """Devuelve el PDF de la clave, generándolo si no está en caché.
+
+        Si estaba en caché devuelve (ruta, None) para enviar el archivo; si no,
+        `generar` produce el PDF en memoria, se guarda y se devuelve (None, contenido)
+        para enviarlo sin volver a leerlo del disco.
+        """
+        ruta = self.obtener(clave)
+        metricas.registrar_cache('pdf_pagare', ruta is not None)
+        if ruta:
+            return ruta, None
+
+        # Evitar que dos peticiones del mismo proceso generen el mismo PDF a la vez
+        with self._lock_clave(clave):
+            ruta = self.obtener(clave)
+            if ruta:
+                return ruta, None
+
+            contenido = generar()
+            self.guardar(clave, contenido)
+        return None, contenido
+
+    def _lock_clave(self, clave: str) -> threading.Lock:
+        with self._locks_lock:
+            if len(self._locks) > 1000:
+                self._locks = {k: v for k, v in self._locks.items() if v.locked()}
+            return self._locks.setdefault(clave, threading.Lock())
+
+    def _expulsar(self):
+        """Borra los PDFs usados hace más tiempo hasta respetar los límites"""
+        archivos = []
+        for entrada in os.scandir(self.directorio):
+            if entrada.name.endswith('.pdf'):
+                try:
+                    stat = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                archivos.append((stat.st_mtime, stat.st_size, entrada.path))
+
+        total = sum(tamano for _, tamano, _ in archivos)
+        if total <= self.tamano_maximo and len(archivos) <= self.max_archivos:
+            return
+
+        archivos.sort()
+        restantes = len(archivos)
+        for _, tamano, ruta in archivos:
+            if total <= self.tamano_maximo and restantes <= self.max_archivos:
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
+            restantes -= 1
+            logger.debug("🗑️ PDF expulsado de la caché: %s", ruta)
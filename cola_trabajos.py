@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Cola de Trabajos en Segundo Plano
+=================================
+
+Cola local y durable para tareas que no deben bloquear una petición web
+(generación de pagarés, envíos por WhatsApp, etc.):
+
+- Los trabajos se guardan en SQLite (data/trabajos.db), así sobreviven a un
+  reinicio y pueden compartirse entre los workers de gunicorn.
+- Un grupo de hilos toma los trabajos pendientes. La toma es atómica y con
+  un plazo de bloqueo: si el proceso muere a mitad de un trabajo, otro lo
+  retoma cuando vence el plazo.
+- Un trabajo que falla se reintenta con espera exponencial hasta agotar
+  `max_intentos`; entonces queda en estado "fallido" con el último error.
+  Un trabajo abandonado también cuenta como intento: si ya agotó
+  `max_intentos` no se retoma, queda "fallido" como abandonado.
+- Los trabajos largos pueden informar su avance con reportar_progreso().
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Estados de un trabajo
+ESTADO_PENDIENTE = 'pendiente'
+ESTADO_EN_PROCESO = 'en_proceso'
+ESTADO_COMPLETADO = 'completado'
+ESTADO_FALLIDO = 'fallido'
+
+class ColaTrabajos:
+    """Cola de trabajos persistida en SQLite y ejecutada por un grupo de hilos"""
+
+    def __init__(self, db_path: str = os.path.join('data', 'trabajos.db'), hilos: int = 2,
+                 max_intentos: int = 3, espera_reintento: float = 5.0, plazo_bloqueo: float = 300.0,
+                 intervalo_consulta: float = 2.0):
+        self.db_path = db_path
+        self.hilos = hilos
+        self.max_intentos = max_intentos
+        self.espera_reintento = espera_reintento
+        self.plazo_bloqueo = plazo_bloqueo
+        self.intervalo_consulta = intervalo_consulta
+
+        self._manejadores: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._hay_trabajo = threading.Condition()
+        self._detener = threading.Event()
+        self._hilos = []
+        self._pid = None
+        self._local = threading.local()
+
+        directorio = os.path.dirname(db_path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._crear_tabla()
+
+    @contextmanager
+    def _conectar(self):
+        """Conexión en modo autocommit: cada sentencia es su propia transacción"""
+        conexion = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conexion.row_factory = sqlite3.Row
+        try:
+            yield conexion
+        finally:
+            conexion.close()
+
+    @contextmanager
+    def _transaccion(self):
+        """Conexión dentro de BEGIN IMMEDIATE: lo leído no cambia hasta el COMMIT.
+
+        Reemplaza a UPDATE ... RETURNING, que requiere SQLite 3.35 y no está
+        en todas las compilaciones de Python 3.8 (runtime.txt).
+        """
+        with self._conectar() as conexion:
+            conexion.execute('BEGIN IMMEDIATE')
+            try:
+                yield conexion
+            except BaseException:
+                conexion.execute('ROLLBACK')
+                raise
+            conexion.execute('COMMIT')
+
+    def _crear_tabla(self):
+        with self._conectar() as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('''
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tipo TEXT NOT NULL,
+                    datos TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    max_intentos INTEGER NOT NULL,
+                    disponible_desde REAL NOT NULL,
+                    resultado TEXT,
+                    error TEXT,
+                    progreso TEXT,
+                    creado TEXT NOT NULL,
+                    actualizado TEXT NOT NULL
+                )
+            ''')
+            conexion.execute('CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, disponible_desde)')
+
+            # Tablas creadas antes de que existiera el progreso
+            columnas = {fila['name'] for fila in conexion.execute('PRAGMA table_info(trabajos)')}
+            if 'progreso' not in columnas:
+                conexion.execute('ALTER TABLE trabajos ADD COLUMN progreso TEXT')
+
+    # Registro y encolado
+    def registrar(self, tipo: str, manejador: Callable[[Dict[str, Any]], Any]):
+        """Asocia un tipo de trabajo con la función que lo ejecuta.
+
+        La función recibe los datos del trabajo; lo que devuelva se guarda como
+        resultado (debe ser serializable a JSON) y si lanza una excepción el
+        trabajo se reintenta.
+        """
+        self._manejadores[tipo] = manejador
+
+    def encolar(self, tipo: str, datos: Dict[str, Any], max_intentos: Optional[int] = None) -> int:
+        """Agrega un trabajo a la cola y devuelve su ID"""
+        ahora = datetime.now().isoformat()
+        with self._conectar() as conexion:
+            cursor = conexion.execute(
+                'INSERT INTO trabajos (tipo, datos, estado, max_intentos, disponible_desde, creado, actualizado) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (tipo, json.dumps(datos, ensure_ascii=False), ESTADO_PENDIENTE,
+                 max_intentos or self.max_intentos, time.time(), ahora, ahora))
+            trabajo_id = cursor.lastrowid
+
+        with self._hay_trabajo:
+            self._hay_trabajo.notify()
+        return trabajo_id
+
+    def obtener(self, trabajo_id: int) -> Optional[Dict[str, Any]]:
+        """Obtiene el estado de un trabajo"""
+        with self._conectar() as conexion:
+            fila = conexion.execute('SELECT * FROM trabajos WHERE id = ?', (trabajo_id,)).fetchone()
+        if not fila:
+            return None
+
+        trabajo = dict(fila)
+        trabajo['datos'] = json.loads(trabajo['datos'])
+        trabajo['resultado'] = json.loads(trabajo['resultado']) if trabajo['resultado'] else None
+        trabajo['progreso'] = json.loads(trabajo['progreso']) if trabajo['progreso'] else None
+        del trabajo['disponible_desde']
+        return trabajo
+
+    @property
+    def trabajo_actual(self) -> Optional[int]:
+        """ID del trabajo que se ejecuta en el hilo actual (None fuera de un trabajo)"""
+        return getattr(self._local, 'trabajo_id', None)
+
+    def reportar_progreso(self, hechos: int, total: int, **detalles):
+        """Guarda el avance del trabajo que se ejecuta en el hilo actual.
+
+        También renueva el plazo de bloqueo, así un trabajo largo que sigue
+        avanzando no se considera abandonado.
+        """
+        trabajo_id = self.trabajo_actual
+        if trabajo_id is None:
+            return
+        progreso = {'hechos': hechos, 'total': total, **detalles}
+        self._actualizar(trabajo_id, progreso=json.dumps(progreso, ensure_ascii=False),
+                         disponible_desde=time.time() + self.plazo_bloqueo)
+
+    # Ejecución
+    def iniciar(self):
+        """Arranca los hilos de trabajo (una sola vez por proceso).
+        
+        Se puede llamar en cada petición: solo arranca si los hilos no son de
+        este proceso (nunca iniciados, detenidos o heredados de un fork, como
+        en los workers de gunicorn con preload_app).
+        """
+        if self._pid == os.getpid():
+            return
+        # Tras un fork solo existe el hilo que lo hizo: los hilos y el estado
+        # de los locks del padre no sirven en el hijo
+        self._hay_trabajo = threading.Condition()
+        self._detener = threading.Event()
+        self._hilos = []
+        self._pid = os.getpid()
+        for i in range(self.hilos):
+            hilo = threading.Thread(target=self._bucle, name=f"cola-trabajos-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        logger.info("🧵 Cola de trabajos iniciada con %s hilos", self.hilos)
+
+    def detener(self, timeout: float = 5.0):
+        """Detiene los hilos; los trabajos pendientes quedan en la cola"""
+        self._detener.set()
+        with self._hay_trabajo:
+            self._hay_trabajo.notify_all()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+        self._pid = None
+
+    def procesar_pendientes(self) -> int:
+        """Ejecuta en el hilo actual los trabajos disponibles; devuelve cuántos procesó"""
+        procesados = 0
+        while self._procesar_siguiente():
+            procesados += 1
+        return procesados
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                if self._procesar_siguiente():
+                    continue
+            except Exception:
+                logger.exception("❌ Error en la cola de trabajos")
+
+            # Esperar un aviso de encolado o el intervalo (trabajos de otros procesos y reintentos)
+            with self._hay_trabajo:
+                self._hay_trabajo.wait(self.intervalo_consulta)
+
+    def _tomar_siguiente(self) -> Optional[sqlite3.Row]:
+        """Marca atómicamente como en proceso el próximo trabajo disponible"""
+        ahora = time.time()
+        tipos = list(self._manejadores)
+        if not tipos:
+            return None
+
+        marcadores = ','.join('?' * len(tipos))
+        with self._transaccion() as conexion:
+            # Trabajos abandonados (venció el plazo de bloqueo) que ya agotaron sus intentos
+            abandonados = conexion.execute(f'''
+                UPDATE trabajos
+                SET estado = ?, error = ?, actualizado = ?
+                WHERE tipo IN ({marcadores}) AND estado = ? AND disponible_desde <= ?
+                  AND intentos >= max_intentos
+            ''', (ESTADO_FALLIDO, 'Trabajo abandonado: el proceso que lo ejecutaba no terminó',
+                  datetime.now().isoformat(), *tipos, ESTADO_EN_PROCESO, ahora)).rowcount
+            if abandonados:
+                logger.error("❌ %s trabajo(s) abandonado(s) sin intentos restantes quedaron fallidos", abandonados)
+
+            fila = conexion.execute(f'''
+                SELECT id FROM trabajos
+                WHERE tipo IN ({marcadores}) AND disponible_desde <= ?
+                  AND estado IN (?, ?) AND intentos < max_intentos
+                ORDER BY disponible_desde, id
+                LIMIT 1
+            ''', (*tipos, ahora, ESTADO_PENDIENTE, ESTADO_EN_PROCESO)).fetchone()
+            if fila is None:
+                return None
+            conexion.execute(
+                'UPDATE trabajos SET estado = ?, intentos = intentos + 1, disponible_desde = ?, actualizado = ? '
+                'WHERE id = ?',
+                (ESTADO_EN_PROCESO, ahora + self.plazo_bloqueo, datetime.now().isoformat(), fila['id']))
+            return conexion.execute('SELECT * FROM trabajos WHERE id = ?', (fila['id'],)).fetchone()
+
+    def _procesar_siguiente(self) -> bool:
+        trabajo = self._tomar_siguiente()
+        if trabajo is None:
+            return False
+
+        self._local.trabajo_id = trabajo['id']
+        try:
+            resultado = self._manejadores[trabajo['tipo']](json.loads(trabajo['datos']))
+        except Exception as e:
+            self._registrar_fallo(trabajo, e)
+        else:
+            self._actualizar(trabajo['id'], estado=ESTADO_COMPLETADO, error=None,
+                             resultado=json.dumps(resultado, ensure_ascii=False) if resultado is not None else None)
+            logger.info("✅ Trabajo #%s (%s) completado", trabajo['id'], trabajo['tipo'])
+        finally:
+            self._local.trabajo_id = None
+        return True
+
+    def _registrar_fallo(self, trabajo: sqlite3.Row, error: Exception):
+        if trabajo['intentos'] >= trabajo['max_intentos']:
+            self._actualizar(trabajo['id'], estado=ESTADO_FALLIDO, error=str(error))
+            logger.error("❌ Trabajo #%s (%s) falló definitivamente: %s", trabajo['id'], trabajo['tipo'], error)
+            return
+
+        espera = self.espera_reintento * 2 ** (trabajo['intentos'] - 1)
+        self._actualizar(trabajo['id'], estado=ESTADO_PENDIENTE, error=str(error),
+                         disponible_desde=time.time() + espera)
+        logger.warning("⚠️ Trabajo #%s (%s) falló (intento %s/%s), reintento en %.0fs: %s",
+                       trabajo['id'], trabajo['tipo'], trabajo['intentos'], trabajo['max_intentos'], espera, error)
+
+    def _actualizar(self, trabajo_id: int, **campos):
+        campos['actualizado'] = datetime.now().isoformat()
+        asignaciones = ', '.join(f"{campo} = ?" for campo in campos)
+        with self._conectar() as conexion:
+            conexion.execute(f'UPDATE trabajos SET {asignaciones} WHERE id = ?', (*campos.values(), trabajo_id))
@@ -42,10 +42,17 @@ class DatabaseConfig:
             return {
                 'database_url': cls.get_database_url(),
                 'type': 'postgresql',
-                'pool_size': 10,
-                'max_overflow': 20,
-                'pool_timeout': 30,
-                'pool_recycle': 1800,
+                # Conexiones que se mantienen abiertas y extra que se abren bajo demanda
+                'pool_size': int(os.getenv('DB_POOL_SIZE', 2)),
+                'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', 18)),
+                # Segundos de espera por una conexión libre antes de fallar
+                'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+                # Edad máxima (segundos) de una conexión antes de reemplazarla
+                'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+                # Segundos sin uso tras los que se verifica la conexión con SELECT 1
+                'pool_pre_ping': int(os.getenv('DB_POOL_PRE_PING', 30)),
+                # Sentencias preparadas por conexión (desactivar con PgBouncer en modo transacción)
+                'prepared_statements': os.getenv('DB_PREPARED_STATEMENTS', 'true').lower() == 'true',
             }
         else:
             return {
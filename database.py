@@ -1,8 +1,35 @@
+import atexit
 import json
+import logging
 import os
-from typing import List, Optional, Dict, Any
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from models import Cliente, Prestamo, Pago, Usuario
 from decimal import Decimal
+from notificador_cambios import notificador
+from indice_busqueda import IndiceBusquedaClientes
+from metricas import metricas
+
+try:
+    import fcntl
+except ImportError:  # Windows (versión de escritorio): solo se serializa dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Ámbitos de visibilidad para los que se mantiene una versión de datos
+AMBITO_ADMIN = 'admin'
+AMBITO_SUPERVISOR = 'supervisor'
+AMBITO_ESTRUCTURA = 'estructura'
+
+# Segundos entre escrituras de los últimos accesos acumulados
+INTERVALO_GUARDADO_ACCESOS = 30
+
+# Tamaño máximo de un registro al recorrer un archivo por bloques (más que esto es un archivo dañado)
+REGISTRO_JSON_MAXIMO = 16 * 1024 * 1024
 
 class Database:
     def __init__(self, data_dir: str = "data"):
@@ -12,6 +39,19 @@ class Database:
         self.pagos_file = os.path.join(data_dir, "pagos.json")
         self.usuarios_file = os.path.join(data_dir, "usuarios.json")
         self.configuracion_file = os.path.join(data_dir, "configuracion.json")
+        self.versiones_file = os.path.join(data_dir, "versiones.json")
+        # Locks de los archivos que se leen, modifican y reescriben (ver _bloqueo_archivo)
+        self._locks_archivos = {'versiones': threading.Lock(), 'usuarios': threading.Lock()}
+        
+        # Índice de búsqueda de clientes, construido al primer uso
+        self._indice_clientes = IndiceBusquedaClientes()
+        self._firma_indice_clientes = None
+        self._indice_lock = threading.RLock()
+        
+        # Últimos accesos pendientes de guardar (usuario_id -> fecha)
+        self._accesos_pendientes: Dict[int, datetime] = {}
+        self._accesos_lock = threading.Lock()
+        self._hilo_accesos = None
         
         # Crear directorio de datos si no existe
         os.makedirs(data_dir, exist_ok=True)
@@ -47,15 +87,83 @@ class Database:
     def _load_json(self, file_path: str) -> List[Dict[str, Any]]:
         """Carga datos desde un archivo JSON"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(file_path, 'rb') as f:
+                contenido = f.read()
+        except FileNotFoundError:
+            metricas.registrar_json('lectura', 0)
+            return []
+        
+        metricas.registrar_json('lectura', len(contenido))
+        try:
+            return json.loads(contenido)
+        except json.JSONDecodeError:
             return []
     
+    def _iterar_json(self, file_path: str, tamano_bloque: int = 64 * 1024) -> Iterator[Dict[str, Any]]:
+        """Recorre los elementos de un archivo JSON (una lista) de a uno, leyendo por bloques.
+        
+        En memoria queda solo el bloque actual y el elemento que se está
+        decodificando, no el archivo completo como con _load_json. Si el
+        archivo está dañado se detiene (como _load_json, que devuelve []).
+        """
+        decodificador = json.JSONDecoder()
+        leidos = 0
+        try:
+            archivo = open(file_path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            metricas.registrar_json('lectura', 0)
+            return
+        
+        with archivo:
+            buffer, posicion, abierta = '', 0, False
+            while True:
+                # Saltar espacios y separadores entre elementos
+                while posicion < len(buffer) and buffer[posicion] in ' \t\r\n,':
+                    posicion += 1
+                if posicion < len(buffer) and not abierta:
+                    if buffer[posicion] != '[':
+                        logger.error("❌ %s no contiene una lista JSON", file_path)
+                        break
+                    abierta = True
+                    posicion += 1
+                    continue
+                if posicion < len(buffer) and buffer[posicion] == ']':
+                    break
+                
+                elemento = None
+                if posicion < len(buffer):
+                    try:
+                        elemento, posicion = decodificador.raw_decode(buffer, posicion)
+                    except json.JSONDecodeError:
+                        elemento = None  # Elemento incompleto: falta leer otro bloque
+                
+                if elemento is None:
+                    if len(buffer) - posicion > REGISTRO_JSON_MAXIMO:
+                        logger.error("❌ %s tiene un registro dañado o demasiado grande", file_path)
+                        break
+                    bloque = archivo.read(tamano_bloque)
+                    if not bloque:
+                        if posicion < len(buffer):
+                            logger.error("❌ %s está incompleto o dañado", file_path)
+                        break
+                    leidos += len(bloque)
+                    buffer, posicion = buffer[posicion:] + bloque, 0
+                    continue
+                
+                yield elemento
+        
+        metricas.registrar_json('lectura', leidos)
+    
     def _save_json(self, file_path: str, data: List[Dict[str, Any]]):
         """Guarda datos en un archivo JSON"""
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        contenido = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        # Escritura atómica: con varios hilos escribiendo a la vez, abrir el archivo con 'wb'
+        # lo trunca y los lectores ven JSON a medias (que _load_json devuelve como lista vacía)
+        temporal = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, file_path)
+        metricas.registrar_json('escritura', len(contenido))
     
     def _get_next_id(self, file_path: str) -> int:
         """Obtiene el siguiente ID disponible"""
@@ -64,6 +172,126 @@ class Database:
             return 1
         return max(item['id'] for item in data) + 1
     
+    # Índice de búsqueda de clientes
+    def _firma_archivo(self, file_path: str) -> Optional[Tuple[int, int]]:
+        """Firma (fecha de modificación, tamaño) de un archivo para detectar cambios"""
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _guardar_clientes(self, clientes: List[Dict[str, Any]], agregados: List[Dict[str, Any]] = (),
+                          eliminados: List[int] = ()):
+        """Guarda los clientes y aplica el cambio al índice de búsqueda.
+        
+        Si el archivo fue modificado por otro proceso desde la última
+        sincronización, el índice queda desactualizado y se reconstruye en la
+        próxima búsqueda.
+        """
+        with self._indice_lock:
+            firma_previa = self._firma_archivo(self.clientes_file)
+            self._save_json(self.clientes_file, clientes)
+            
+            if self._firma_indice_clientes is None or self._firma_indice_clientes != firma_previa:
+                self._firma_indice_clientes = None
+                return
+            
+            for cliente_id in eliminados:
+                self._indice_clientes.eliminar(cliente_id)
+            for cliente_data in agregados:
+                self._indice_clientes.agregar(cliente_data)
+            self._firma_indice_clientes = self._firma_archivo(self.clientes_file)
+    
+    def _obtener_indice_clientes(self) -> IndiceBusquedaClientes:
+        """Devuelve el índice de búsqueda, reconstruyéndolo si el archivo de clientes cambió"""
+        firma = self._firma_archivo(self.clientes_file)
+        vigente = firma == self._firma_indice_clientes
+        metricas.registrar_cache('indice_clientes', vigente)
+        if not vigente:
+            self._indice_clientes.construir(self._load_json(self.clientes_file))
+            self._firma_indice_clientes = firma
+        return self._indice_clientes
+    
+    # Versiones de datos por ámbito de visibilidad
+    @staticmethod
+    def ambito_usuario(usuario_id: int) -> str:
+        """Clave del ámbito de un usuario que solo ve sus propios datos"""
+        return f"usuario:{usuario_id}"
+    
+    def _load_versiones(self) -> Dict[str, Any]:
+        """Carga el archivo de versiones de datos"""
+        versiones = self._load_json(self.versiones_file)
+        return versiones if isinstance(versiones, dict) else {}
+    
+    @contextmanager
+    def _bloqueo_archivo(self, nombre: str):
+        """Exclusión mutua entre hilos y workers para leer-modificar-reemplazar <nombre>.json.
+        
+        Sin él, dos escrituras simultáneas leen la misma versión del archivo y
+        la segunda en guardar descarta los cambios de la primera. No es
+        reentrante: dentro del bloque no se debe volver a pedir el mismo.
+        """
+        with self._locks_archivos[nombre]:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.data_dir, f"{nombre}.lock"), 'a') as bloqueo:
+                fcntl.flock(bloqueo, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(bloqueo, fcntl.LOCK_UN)
+    
+    def _marcar_cambio(self, *usuario_ids: Optional[int], estructura: bool = False):
+        """Incrementa la versión de datos de los ámbitos afectados por una escritura.
+        
+        Cada escritura avanza una secuencia global (ámbito admin) y marca los
+        ámbitos de los usuarios propietarios de los datos modificados. Si algún
+        propietario no es admin, también se marca el ámbito de supervisores.
+        Los cambios en usuarios afectan a todos los ámbitos (estructura).
+        """
+        ambitos = {AMBITO_ADMIN}
+        if estructura:
+            ambitos.add(AMBITO_ESTRUCTURA)
+        
+        propietarios = {u for u in usuario_ids if u is not None}
+        if propietarios:
+            roles = {u['id']: u.get('rol') for u in self._load_json(self.usuarios_file)}
+            for propietario_id in propietarios:
+                ambitos.add(self.ambito_usuario(propietario_id))
+                if roles.get(propietario_id) != 'admin':
+                    ambitos.add(AMBITO_SUPERVISOR)
+        
+        # Sin el bloqueo, dos escrituras simultáneas leen la misma secuencia y una pisa
+        # las marcas de la otra (sus usuarios seguirían recibiendo 304 con datos viejos)
+        with self._bloqueo_archivo('versiones'):
+            versiones = self._load_versiones()
+            secuencia = versiones.get(AMBITO_ADMIN, {}).get('secuencia', 0) + 1
+            marca = {'secuencia': secuencia, 'modificado': datetime.now().isoformat()}
+            for ambito in ambitos:
+                versiones[ambito] = marca
+            
+            # Escritura atómica: otros workers pueden estar leyendo el archivo
+            temporal = f"{self.versiones_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(versiones, f)
+            os.replace(temporal, self.versiones_file)
+        
+        # Avisar a las conexiones de eventos de este proceso
+        notificador.publicar(ambitos, secuencia)
+    
+    def obtener_version_datos(self, ambito: str) -> Tuple[int, Optional[datetime]]:
+        """Obtiene la versión (secuencia, fecha de modificación) de un ámbito de visibilidad"""
+        versiones = self._load_versiones()
+        candidatos = [versiones.get(ambito), versiones.get(AMBITO_ESTRUCTURA)]
+        candidatos = [v for v in candidatos if v]
+        if not candidatos:
+            return 0, None
+        
+        ultima = max(candidatos, key=lambda v: v['secuencia'])
+        return ultima['secuencia'], datetime.fromisoformat(ultima['modificado'])
+    
     def _filtrar_por_usuario(self, data: List[Dict[str, Any]], usuario_id: int, es_admin: bool = False) -> List[Dict[str, Any]]:
         """Filtra datos por usuario, los admins pueden ver todo"""
         if es_admin:
@@ -125,22 +353,24 @@ class Database:
         clientes = self._load_json(self.clientes_file)
         cliente.id = self._get_next_id(self.clientes_file)
         cliente.usuario_id = usuario_id
-        clientes.append(cliente.to_dict())
-        self._save_json(self.clientes_file, clientes)
+        cliente_data = cliente.to_dict()
+        clientes.append(cliente_data)
+        self._guardar_clientes(clientes, agregados=[cliente_data])
+        self._marcar_cambio(usuario_id)
         return cliente
     
     def obtener_cliente(self, cliente_id: int, usuario_id: int, es_admin: bool = False) -> Optional[Cliente]:
         """Obtiene un cliente por ID, respetando el aislamiento de datos"""
-        print(f"🔍 obtener_cliente - cliente_id: {cliente_id}, usuario_id: {usuario_id}, es_admin: {es_admin}")
+        logger.debug("🔍 obtener_cliente - cliente_id: %s, usuario_id: %s, es_admin: %s", cliente_id, usuario_id, es_admin)
         
         clientes = self._load_json(self.clientes_file)
         for cliente_data in clientes:
             if cliente_data['id'] == cliente_id:
-                print(f"📋 Cliente encontrado: {cliente_data['nombre']} {cliente_data['apellido']}, usuario_id: {cliente_data.get('usuario_id')}")
+                logger.debug("📋 Cliente encontrado: %s %s, usuario_id: %s", cliente_data['nombre'], cliente_data['apellido'], cliente_data.get('usuario_id'))
                 
                 # Si usuario_id es None, significa que es un supervisor que quiere ver todos los usuarios no-admin
                 if usuario_id is None:
-                    print(f"👁️ Supervisor buscando cliente - verificando si pertenece a usuario no-admin")
+                    logger.debug("👁️ Supervisor buscando cliente - verificando si pertenece a usuario no-admin")
                     # Verificar que el cliente pertenezca a un usuario no-admin
                     usuarios = self._load_json(self.usuarios_file)
                     usuario_propietario = None
@@ -150,23 +380,23 @@ class Database:
                             break
                     
                     if usuario_propietario:
-                        print(f"👤 Usuario propietario: {usuario_propietario['username']}, Rol: {usuario_propietario['rol']}")
-                    # Solo incluir si el usuario propietario no es admin
+                        logger.debug("👤 Usuario propietario: %s, Rol: %s", usuario_propietario['username'], usuario_propietario['rol'])
+                        # Solo incluir si el usuario propietario no es admin
                         if usuario_propietario.get('rol') != 'admin':
-                            print(f"✅ Cliente accesible para supervisor")
-                        return Cliente.from_dict(cliente_data)
+                            logger.debug("✅ Cliente accesible para supervisor")
+                            return Cliente.from_dict(cliente_data)
                         else:
-                            print(f"❌ Cliente pertenece a admin - no accesible")
+                            logger.debug("❌ Cliente pertenece a admin - no accesible")
                     else:
-                        print(f"❌ No se encontró usuario propietario")
+                        logger.debug("❌ No se encontró usuario propietario")
                 # Verificar si el usuario puede ver este cliente
                 elif es_admin or cliente_data.get('usuario_id') == usuario_id:
-                    print(f"✅ Cliente accesible para usuario normal/admin")
+                    logger.debug("✅ Cliente accesible para usuario normal/admin")
                     return Cliente.from_dict(cliente_data)
                 else:
-                    print(f"❌ Cliente no accesible - usuario_id no coincide")
+                    logger.debug("❌ Cliente no accesible - usuario_id no coincide")
         
-        print(f"❌ Cliente {cliente_id} no encontrado o no accesible")
+        logger.debug("❌ Cliente %s no encontrado o no accesible", cliente_id)
         return None
     
     def obtener_cliente_por_dni(self, dni: str, usuario_id: int, es_admin: bool = False) -> Optional[Cliente]:
@@ -256,7 +486,8 @@ class Database:
                 
                 # Si llegamos aquí, el usuario tiene permisos para modificar
                 clientes[i] = cliente.to_dict()
-                self._save_json(self.clientes_file, clientes)
+                self._guardar_clientes(clientes, agregados=[clientes[i]])
+                self._marcar_cambio(cliente_data.get('usuario_id'), cliente.usuario_id)
                 return True
         
         return False
@@ -309,7 +540,7 @@ class Database:
         clientes_filtrados = [c for c in clientes if c['id'] != cliente_id]
         
         if len(clientes_filtrados) < len(clientes):
-            self._save_json(self.clientes_file, clientes_filtrados)
+            self._guardar_clientes(clientes_filtrados, eliminados=[cliente_id])
             
             # También eliminar todos los préstamos asociados a este cliente
             prestamos = self._load_json(self.prestamos_file)
@@ -324,6 +555,11 @@ class Database:
             pagos_filtrados = [p for p in pagos if p['prestamo_id'] not in prestamos_ids_eliminados]
             self._save_json(self.pagos_file, pagos_filtrados)
             
+            propietarios = [c.get('usuario_id') for c in clientes if c['id'] == cliente_id]
+            propietarios += [p.get('usuario_id') for p in prestamos_eliminados]
+            propietarios += [p.get('usuario_id') for p in pagos if p['prestamo_id'] in prestamos_ids_eliminados]
+            self._marcar_cambio(*propietarios)
+            
             return True
         
         return False
@@ -335,7 +571,7 @@ class Database:
         clientes_filtrados = [c for c in clientes if c['id'] != cliente_id]
         
         if len(clientes_filtrados) < len(clientes):
-            self._save_json(self.clientes_file, clientes_filtrados)
+            self._guardar_clientes(clientes_filtrados, eliminados=[cliente_id])
             
             # Eliminar préstamos asociados
             prestamos = self._load_json(self.prestamos_file)
@@ -350,6 +586,11 @@ class Database:
             pagos_filtrados = [p for p in pagos if p['prestamo_id'] not in prestamos_ids_eliminados]
             self._save_json(self.pagos_file, pagos_filtrados)
             
+            propietarios = [c.get('usuario_id') for c in clientes if c['id'] == cliente_id]
+            propietarios += [p.get('usuario_id') for p in prestamos_eliminados]
+            propietarios += [p.get('usuario_id') for p in pagos if p['prestamo_id'] in prestamos_ids_eliminados]
+            self._marcar_cambio(*propietarios)
+            
             return True
         
         return False
@@ -362,6 +603,7 @@ class Database:
         prestamo.usuario_id = usuario_id
         prestamos.append(prestamo.to_dict())
         self._save_json(self.prestamos_file, prestamos)
+        self._marcar_cambio(usuario_id)
         return prestamo
     
     def obtener_prestamo(self, prestamo_id: int, usuario_id: int, es_admin: bool = False) -> Optional[Prestamo]:
@@ -439,9 +681,36 @@ class Database:
                 if es_admin or prestamo_data.get('usuario_id') == usuario_id:
                     prestamos[i] = prestamo.to_dict()
                     self._save_json(self.prestamos_file, prestamos)
+                    self._marcar_cambio(prestamo_data.get('usuario_id'), prestamo.usuario_id)
                     return True
         return False
     
+    def registrar_firma_prestamo(self, prestamo_id: int, ruta: str, firma_hash: str,
+                                 conservar_anteriores: int = 2) -> Optional[List[str]]:
+        """Registra la firma vigente de un préstamo.
+        
+        La firma anterior pasa a la lista de firmas reemplazadas, que se recorta a
+        `conservar_anteriores`. Devuelve las rutas que quedaron fuera (para borrar
+        los archivos) o None si el préstamo no existe.
+        """
+        prestamos = self._load_json(self.prestamos_file)
+        for prestamo_data in prestamos:
+            if prestamo_data['id'] == prestamo_id:
+                anteriores = prestamo_data.get('firmas_anteriores', [])
+                if prestamo_data.get('firma_path') and prestamo_data['firma_path'] != ruta:
+                    anteriores.append(prestamo_data['firma_path'])
+                
+                corte = max(len(anteriores) - conservar_anteriores, 0)
+                descartadas, anteriores = anteriores[:corte], anteriores[corte:]
+                
+                prestamo_data['firma_path'] = ruta
+                prestamo_data['firma_hash'] = firma_hash
+                prestamo_data['firmas_anteriores'] = anteriores
+                self._save_json(self.prestamos_file, prestamos)
+                self._marcar_cambio(prestamo_data.get('usuario_id'))
+                return descartadas
+        return None
+    
     def eliminar_prestamo(self, prestamo_id: int, usuario_id: int, es_admin: bool = False) -> bool:
         """Elimina un préstamo físicamente de la base de datos, respetando el aislamiento de datos"""
         # Verificar si el usuario puede eliminar este préstamo
@@ -461,6 +730,10 @@ class Database:
             pagos_filtrados = [p for p in pagos if p['prestamo_id'] != prestamo_id]
             self._save_json(self.pagos_file, pagos_filtrados)
             
+            propietarios = [prestamo.usuario_id]
+            propietarios += [p.get('usuario_id') for p in pagos if p['prestamo_id'] == prestamo_id]
+            self._marcar_cambio(*propietarios)
+            
             return True
         
         return False
@@ -480,9 +753,58 @@ class Database:
         pago.usuario_id = usuario_id
         pagos.append(pago.to_dict())
         self._save_json(self.pagos_file, pagos)
+        self._marcar_cambio(usuario_id)
         
         return pago
     
+    def iterar_visibles(self, file_path: str, usuario_id: int, es_admin: bool = False) -> Iterator[Dict[str, Any]]:
+        """Recorre los registros de un archivo visibles para el usuario (para exportaciones).
+        
+        Lee el archivo por bloques y entrega los registros de a uno: la memoria
+        no crece con el tamaño del archivo.
+        """
+        filtro = self._filtro_visibilidad(usuario_id, es_admin)
+        for item in self._iterar_json(file_path):
+            if filtro is None or filtro(item):
+                yield item
+    
+    def obtener_prestamos_por_id(self, usuario_id: int, es_admin: bool = False) -> Dict[int, Prestamo]:
+        """Préstamos visibles para el usuario indexados por ID, con una sola lectura"""
+        filtro = self._filtro_visibilidad(usuario_id, es_admin)
+        return {p['id']: Prestamo.from_dict(p) for p in self._load_json(self.prestamos_file)
+                if filtro is None or filtro(p)}
+    
+    def obtener_clientes_por_id(self, usuario_id: int, es_admin: bool = False) -> Dict[int, Cliente]:
+        """Clientes visibles para el usuario indexados por ID, con una sola lectura"""
+        filtro = self._filtro_visibilidad(usuario_id, es_admin)
+        return {c['id']: Cliente.from_dict(c) for c in self._load_json(self.clientes_file)
+                if filtro is None or filtro(c)}
+    
+    def agregar_pagos_lote(self, pagos: List[Pago], prestamos: List[Prestamo], usuario_id: int) -> List[Pago]:
+        """Guarda varios pagos y los préstamos que actualizan con una escritura por archivo.
+        
+        Los pagos ya deben estar agregados a sus préstamos (Prestamo.agregar_pago);
+        aquí se les asignan los IDs y se guardan ambos archivos una sola vez.
+        """
+        pagos_data = self._load_json(self.pagos_file)
+        siguiente_id = max((p['id'] for p in pagos_data), default=0) + 1
+        for pago in pagos:
+            pago.id = siguiente_id
+            pago.usuario_id = usuario_id
+            siguiente_id += 1
+        pagos_data.extend(pago.to_dict() for pago in pagos)
+        
+        actualizados = {prestamo.id: prestamo for prestamo in prestamos}
+        prestamos_data = self._load_json(self.prestamos_file)
+        for i, prestamo_data in enumerate(prestamos_data):
+            if prestamo_data['id'] in actualizados:
+                prestamos_data[i] = actualizados[prestamo_data['id']].to_dict()
+        
+        self._save_json(self.prestamos_file, prestamos_data)
+        self._save_json(self.pagos_file, pagos_data)
+        self._marcar_cambio(usuario_id, *{prestamo.usuario_id for prestamo in prestamos})
+        return pagos
+    
     def obtener_pago(self, pago_id: int, usuario_id: int, es_admin: bool = False) -> Optional[Pago]:
         """Obtiene un pago específico, respetando el aislamiento de datos"""
         # Obtener el usuario actual para verificar su rol
@@ -553,33 +875,47 @@ class Database:
     def eliminar_pago(self, pago_id: int, usuario_id: int, es_admin: bool = False) -> bool:
         """Elimina un pago específico físicamente de la base de datos, respetando el aislamiento de datos"""
         pagos = self._load_json(self.pagos_file)
-        pago_encontrado = False
+        pago_encontrado = None
         
         for i, pago_data in enumerate(pagos):
             if pago_data['id'] == pago_id:
                 # Verificar si el usuario puede eliminar este pago
                 if es_admin or pago_data.get('usuario_id') == usuario_id:
                     del pagos[i]
-                    pago_encontrado = True
+                    pago_encontrado = pago_data
                     break
         
         if pago_encontrado:
             self._save_json(self.pagos_file, pagos)
+            self._marcar_cambio(pago_encontrado.get('usuario_id'))
             return True
         
         return False
     
     # Métodos de búsqueda y reportes
-    def buscar_clientes(self, termino: str, usuario_id: int, es_admin: bool = False) -> List[Cliente]:
-        """Busca clientes por nombre, apellido o DNI, respetando el aislamiento de datos"""
-        termino = termino.lower()
-        clientes = self.listar_clientes(usuario_id, es_admin)
-        return [
-            cliente for cliente in clientes
-            if (termino in cliente.nombre.lower() or 
-                termino in cliente.apellido.lower() or 
-                termino in cliente.dni.lower())
-        ]
+    def buscar_clientes(self, termino: str, usuario_id: int, es_admin: bool = False, limite: int = 20) -> List[Cliente]:
+        """Busca clientes por nombre, apellido, DNI o teléfono, respetando el aislamiento de datos.
+        
+        Usa el índice de búsqueda (sin distinguir acentos ni mayúsculas, por
+        prefijo de palabra; ver indice_busqueda) y devuelve los `limite`
+        resultados más relevantes.
+        """
+        filtro = self._filtro_visibilidad(usuario_id, es_admin)
+        with self._indice_lock:
+            resultados = self._obtener_indice_clientes().buscar(termino, filtro, limite)
+        return [Cliente.from_dict(cliente_data) for cliente_data in resultados]
+    
+    def _filtro_visibilidad(self, usuario_id: int, es_admin: bool = False):
+        """Construye un filtro por registro equivalente a _filtrar_por_usuario"""
+        if es_admin:
+            return None
+        
+        roles = {u['id']: u.get('rol') for u in self._load_json(self.usuarios_file)}
+        if usuario_id is None or roles.get(usuario_id) in ['supervisor', 'consultor']:
+            # Supervisores y consultores ven datos de usuarios no-admin
+            return lambda item: item.get('usuario_id') in roles and roles[item['usuario_id']] != 'admin'
+        
+        return lambda item: item.get('usuario_id') == usuario_id
     
     def obtener_prestamos_activos(self, usuario_id: int = None, es_admin: bool = False) -> List[Prestamo]:
         """Obtiene todos los préstamos activos, respetando el aislamiento de datos"""
@@ -653,11 +989,13 @@ class Database:
     # Métodos para Usuarios
     def agregar_usuario(self, usuario: 'Usuario', usuario_creador_id: int) -> 'Usuario':
         """Agrega un nuevo usuario asociado al usuario que lo creó"""
-        usuarios = self._load_json(self.usuarios_file)
-        usuario.id = self._get_next_id(self.usuarios_file)
-        usuario.usuario_creador_id = usuario_creador_id
-        usuarios.append(usuario.to_dict())
-        self._save_json(self.usuarios_file, usuarios)
+        with self._bloqueo_archivo('usuarios'):
+            usuarios = self._load_json(self.usuarios_file)
+            usuario.id = max((u['id'] for u in usuarios), default=0) + 1
+            usuario.usuario_creador_id = usuario_creador_id
+            usuarios.append(usuario.to_dict())
+            self._save_json(self.usuarios_file, usuarios)
+        self._marcar_cambio(estructura=True)
         return usuario
     
     def obtener_usuario(self, usuario_id: int, usuario_actual_id: int, es_admin: bool = False) -> Optional['Usuario']:
@@ -670,7 +1008,7 @@ class Database:
                 if usuario_data['id'] == usuario_id:
                     # Los supervisores y consultores pueden ver usuarios no-admin
                     if usuario_data.get('rol') != 'admin':
-                        return Usuario.from_dict(usuario_data)
+                        return self._usuario_desde_dict(usuario_data)
             return None
         
         # Obtener el usuario actual para verificar su rol
@@ -684,13 +1022,13 @@ class Database:
             if usuario_data['id'] == usuario_id:
                 # Verificar si el usuario puede ver este usuario
                 if es_admin:
-                    return Usuario.from_dict(usuario_data)
+                    return self._usuario_desde_dict(usuario_data)
                 elif usuario_actual and usuario_actual.get('rol') in ['supervisor', 'consultor']:
                     # Los supervisores y consultores pueden ver usuarios no-admin
                     if usuario_data.get('rol') != 'admin':
-                        return Usuario.from_dict(usuario_data)
+                        return self._usuario_desde_dict(usuario_data)
                 elif usuario_data.get('usuario_creador_id') == usuario_actual_id or usuario_id == usuario_actual_id:
-                    return Usuario.from_dict(usuario_data)
+                    return self._usuario_desde_dict(usuario_data)
         return None
     
     def obtener_usuario_por_username(self, username: str) -> Optional['Usuario']:
@@ -698,7 +1036,7 @@ class Database:
         usuarios = self._load_json(self.usuarios_file)
         for usuario_data in usuarios:
             if usuario_data['username'] == username and usuario_data['activo']:
-                return Usuario.from_dict(usuario_data)
+                return self._usuario_desde_dict(usuario_data)
         return None
     
     def obtener_usuario_por_email(self, email: str) -> Optional['Usuario']:
@@ -706,21 +1044,23 @@ class Database:
         usuarios = self._load_json(self.usuarios_file)
         for usuario_data in usuarios:
             if usuario_data.get('email') == email and usuario_data['activo']:
-                return Usuario.from_dict(usuario_data)
+                return self._usuario_desde_dict(usuario_data)
         return None
     
     def cambiar_password_usuario(self, usuario_id: int, nueva_password: str) -> bool:
         """Cambia la contraseña de un usuario"""
         try:
-            usuarios = self._load_json(self.usuarios_file)
-            for i, usuario_data in enumerate(usuarios):
-                if usuario_data['id'] == usuario_id:
-                    # Crear objeto Usuario y cambiar contraseña
-                    usuario = Usuario.from_dict(usuario_data)
-                    usuario.password_hash = Usuario.hash_password(nueva_password)
-                    usuarios[i] = usuario.to_dict()
-                    self._save_json(self.usuarios_file, usuarios)
-                    return True
+            password_hash = Usuario.hash_password(nueva_password)
+            with self._bloqueo_archivo('usuarios'):
+                usuarios = self._load_json(self.usuarios_file)
+                for i, usuario_data in enumerate(usuarios):
+                    if usuario_data['id'] == usuario_id:
+                        # Crear objeto Usuario y cambiar contraseña
+                        usuario = self._usuario_desde_dict(usuario_data)
+                        usuario.password_hash = password_hash
+                        usuarios[i] = usuario.to_dict()
+                        self._save_json(self.usuarios_file, usuarios)
+                        return True
             return False
         except Exception as e:
             print(f"Error al cambiar contraseña: {e}")
@@ -739,33 +1079,38 @@ class Database:
         
         if es_admin:
             # Los admins pueden ver todos los usuarios
-            return [Usuario.from_dict(usuario_data) for usuario_data in usuarios if usuario_data['activo']]
+            return [self._usuario_desde_dict(usuario_data) for usuario_data in usuarios if usuario_data['activo']]
         elif usuario_actual and usuario_actual.get('rol') in ['supervisor', 'consultor']:
             # Los supervisores y consultores pueden ver usuarios no-admin
             usuarios_filtrados = [
                 usuario_data for usuario_data in usuarios 
                 if usuario_data['activo'] and usuario_data.get('rol') != 'admin'
             ]
-            return [Usuario.from_dict(usuario_data) for usuario_data in usuarios_filtrados]
+            return [self._usuario_desde_dict(usuario_data) for usuario_data in usuarios_filtrados]
         else:
             # Los usuarios solo pueden ver los que crearon
             usuarios_filtrados = [
                 usuario_data for usuario_data in usuarios 
                 if usuario_data['activo'] and usuario_data.get('usuario_creador_id') == usuario_actual_id
             ]
-            return [Usuario.from_dict(usuario_data) for usuario_data in usuarios_filtrados]
+            return [self._usuario_desde_dict(usuario_data) for usuario_data in usuarios_filtrados]
     
     def actualizar_usuario(self, usuario: 'Usuario', usuario_actual_id: int, es_admin: bool = False) -> bool:
         """Actualiza un usuario existente, respetando el aislamiento de datos"""
-        usuarios = self._load_json(self.usuarios_file)
-        for i, usuario_data in enumerate(usuarios):
-            if usuario_data['id'] == usuario.id:
-                # Verificar si el usuario puede modificar este usuario
-                if es_admin or usuario_data.get('usuario_creador_id') == usuario_actual_id or usuario.id == usuario_actual_id:
-                    usuarios[i] = usuario.to_dict()
-                    self._save_json(self.usuarios_file, usuarios)
-                    return True
-        return False
+        with self._bloqueo_archivo('usuarios'):
+            usuarios = self._load_json(self.usuarios_file)
+            actualizado = False
+            for i, usuario_data in enumerate(usuarios):
+                if usuario_data['id'] == usuario.id:
+                    # Verificar si el usuario puede modificar este usuario
+                    if es_admin or usuario_data.get('usuario_creador_id') == usuario_actual_id or usuario.id == usuario_actual_id:
+                        usuarios[i] = usuario.to_dict()
+                        self._save_json(self.usuarios_file, usuarios)
+                        actualizado = True
+                    break
+        if actualizado:
+            self._marcar_cambio(estructura=True)
+        return actualizado
     
     def eliminar_usuario(self, usuario_id: int, usuario_actual_id: int, es_admin: bool = False) -> bool:
         """Elimina un usuario, respetando el aislamiento de datos"""
@@ -830,15 +1175,20 @@ class Database:
             # Los usuarios normales no pueden eliminar a otros
             return False
         
-        # Eliminar físicamente el usuario
-        usuarios_filtrados = [u for u in usuarios if u['id'] != usuario_id]
-        if len(usuarios_filtrados) < len(usuarios):
-            self._save_json(self.usuarios_file, usuarios_filtrados)
-            
+        # Eliminar físicamente el usuario (releyendo el archivo bajo el bloqueo)
+        with self._bloqueo_archivo('usuarios'):
+            usuarios = self._load_json(self.usuarios_file)
+            usuarios_filtrados = [u for u in usuarios if u['id'] != usuario_id]
+            eliminado = len(usuarios_filtrados) < len(usuarios)
+            if eliminado:
+                self._save_json(self.usuarios_file, usuarios_filtrados)
+        
+        if eliminado:
             # Eliminar todos los clientes del usuario
             clientes = self._load_json(self.clientes_file)
             clientes_filtrados = [c for c in clientes if c.get('usuario_id') != usuario_id]
-            self._save_json(self.clientes_file, clientes_filtrados)
+            self._guardar_clientes(clientes_filtrados,
+                                   eliminados=[c['id'] for c in clientes if c.get('usuario_id') == usuario_id])
             
             # Eliminar todos los préstamos del usuario
             prestamos = self._load_json(self.prestamos_file)
@@ -850,6 +1200,8 @@ class Database:
             pagos_filtrados = [p for p in pagos if p.get('usuario_id') != usuario_id]
             self._save_json(self.pagos_file, pagos_filtrados)
             
+            self._marcar_cambio(estructura=True)
+            
             return True
         
         return False
@@ -859,10 +1211,77 @@ class Database:
         usuario = self.obtener_usuario_por_username(username)
         if usuario and usuario.verificar_password(password):
             usuario.actualizar_ultimo_acceso()
-            self.actualizar_usuario(usuario, usuario.id, False)  # El usuario puede actualizarse a sí mismo
+            self.registrar_acceso(usuario.id, usuario.ultimo_acceso)
             return usuario
         return None
     
+    # Últimos accesos
+    def _usuario_desde_dict(self, usuario_data: Dict[str, Any]) -> 'Usuario':
+        """Crea el Usuario incluyendo su último acceso aún no guardado"""
+        usuario = Usuario.from_dict(usuario_data)
+        pendiente = self._accesos_pendientes.get(usuario.id)
+        if pendiente and (usuario.ultimo_acceso is None or pendiente > usuario.ultimo_acceso):
+            usuario.ultimo_acceso = pendiente
+        return usuario
+    
+    def registrar_acceso(self, usuario_id: int, momento: datetime):
+        """Anota el último acceso de un usuario; se guarda en lote cada INTERVALO_GUARDADO_ACCESOS.
+        
+        Así un cambio de turno con muchos logins seguidos no reescribe
+        usuarios.json una vez por cada uno.
+        """
+        with self._accesos_lock:
+            self._accesos_pendientes[usuario_id] = momento
+            
+            # El hilo se crea en el proceso que atiende los logins (después del fork de gunicorn)
+            if self._hilo_accesos is None or not self._hilo_accesos.is_alive():
+                if self._hilo_accesos is None:
+                    # Guardar lo pendiente al apagar (el registro se hereda en los procesos hijos)
+                    atexit.register(self.guardar_accesos_pendientes)
+                self._hilo_accesos = threading.Thread(target=self._bucle_accesos, name="guardado-accesos",
+                                                      daemon=True)
+                self._hilo_accesos.start()
+    
+    def guardar_accesos_pendientes(self) -> int:
+        """Escribe de una vez los últimos accesos acumulados; devuelve cuántos guardó"""
+        with self._accesos_lock:
+            if not self._accesos_pendientes:
+                return 0
+            pendientes = self._accesos_pendientes
+            self._accesos_pendientes = {}
+        
+        try:
+            # Bajo el bloqueo de usuarios: sin él, un cambio de contraseña o de permisos
+            # guardado durante esta escritura se perdería
+            with self._bloqueo_archivo('usuarios'):
+                usuarios = self._load_json(self.usuarios_file)
+                for usuario_data in usuarios:
+                    momento = pendientes.get(usuario_data['id'])
+                    guardado = usuario_data.get('ultimo_acceso')
+                    if momento and (not guardado or datetime.fromisoformat(guardado) < momento):
+                        usuario_data['ultimo_acceso'] = momento.isoformat()
+                # El último acceso no cambia permisos ni visibilidad: no se marca cambio de estructura
+                self._save_json(self.usuarios_file, usuarios)
+        except Exception:
+            # Devolver los pendientes para el próximo intento (sin pisar accesos más nuevos)
+            with self._accesos_lock:
+                for usuario_id, momento in pendientes.items():
+                    actual = self._accesos_pendientes.get(usuario_id)
+                    if actual is None or actual < momento:
+                        self._accesos_pendientes[usuario_id] = momento
+            raise
+        
+        logger.debug("🕒 Últimos accesos guardados: %s usuarios", len(pendientes))
+        return len(pendientes)
+    
+    def _bucle_accesos(self):
+        while True:
+            time.sleep(INTERVALO_GUARDADO_ACCESOS)
+            try:
+                self.guardar_accesos_pendientes()
+            except Exception:
+                logger.exception("❌ Error guardando los últimos accesos")
+    
     # Métodos para Configuración del Sistema
     def obtener_configuracion(self) -> Dict[str, Any]:
         """Obtiene la configuración actual del sistema"""
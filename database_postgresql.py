@@ -5,17 +5,209 @@ Reemplaza el sistema de archivos JSON por una base de datos PostgreSQL real
 """
 
 import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import errors
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extras import RealDictCursor
-from psycopg2.pool import SimpleConnectionPool
-from typing import List, Optional, Dict, Any
+from psycopg2.pool import PoolError
+from typing import List, Optional, Dict, Any, Iterator
 from datetime import datetime, date
 import json
 from dotenv import load_dotenv
 
+from config_database import DatabaseConfig
+from metricas import metricas
+
 # Cargar variables de entorno
 load_dotenv()
 
+# Filas que trae cada viaje al servidor en las lecturas con cursor del servidor
+ITERSIZE_LECTURAS = 2000
+
+class PoolAgotado(PoolError):
+    """No se liberó ninguna conexión dentro del tiempo de espera del pool"""
+
+class PoolConexiones:
+    """Pool de conexiones seguro entre hilos (workers gthread de gunicorn)
+    
+    - Mantiene abiertas `minimo` conexiones y abre hasta `maximo` bajo demanda;
+      con todas en uso, el pedido espera hasta `tiempo_espera` segundos.
+    - Las conexiones con más de `reciclar` segundos se cierran y reemplazan.
+    - Una conexión que estuvo libre más de `verificar_tras` segundos se prueba
+      con SELECT 1 antes de entregarla (el servidor puede haberla cerrado).
+    - Registra en las métricas los pedidos, la espera y los agotamientos.
+    """
+    
+    def __init__(self, dsn: str, minimo: int = 1, maximo: int = 20, tiempo_espera: float = 30,
+                 reciclar: int = 1800, verificar_tras: int = 30, nombre: str = 'principal'):
+        if maximo < 1 or minimo > maximo:
+            raise ValueError("El pool necesita 1 <= minimo <= maximo")
+        
+        self.dsn = dsn
+        self.minimo = minimo
+        self.maximo = maximo
+        self.tiempo_espera = tiempo_espera
+        self.reciclar = reciclar
+        self.verificar_tras = verificar_tras
+        self.nombre = nombre
+        
+        self._condicion = threading.Condition()
+        # Conexiones libres: (conexión, momento de creación, momento en que se liberó)
+        self._libres = []
+        self._creadas = {}  # id(conexión) -> momento de creación
+        self._preparadas = {}  # id(conexión) -> nombres de las sentencias preparadas en esa sesión
+        self._en_uso = 0
+        self._cerrado = False
+        
+        for _ in range(minimo):
+            conexion = self._abrir()
+            self._libres.append((conexion, self._creadas[id(conexion)], time.monotonic()))
+        self._publicar_estado()
+    
+    @classmethod
+    def desde_config(cls, config: Dict[str, Any], dsn: str = None) -> 'PoolConexiones':
+        """Crea el pool con la configuración de DatabaseConfig.get_database_config()"""
+        return cls(dsn or config['database_url'],
+                   minimo=config.get('pool_size', 1),
+                   maximo=config.get('pool_size', 1) + config.get('max_overflow', 0),
+                   tiempo_espera=config.get('pool_timeout', 30),
+                   reciclar=config.get('pool_recycle', 1800),
+                   verificar_tras=config.get('pool_pre_ping', 30))
+    
+    def _abrir(self):
+        conexion = psycopg2.connect(self.dsn)
+        self._creadas[id(conexion)] = time.monotonic()
+        return conexion
+    
+    def _descartar(self, conexion):
+        self._creadas.pop(id(conexion), None)
+        self._preparadas.pop(id(conexion), None)
+        try:
+            conexion.close()
+        except Exception:
+            pass
+    
+    def _publicar_estado(self):
+        metricas.registrar_conexiones_pool(self.nombre, self._en_uso, len(self._libres))
+    
+    def _sana(self, conexion, creada: float, liberada: float) -> bool:
+        """Verifica que una conexión libre se pueda seguir usando"""
+        if conexion.closed:
+            return False
+        ahora = time.monotonic()
+        if self.reciclar and ahora - creada > self.reciclar:
+            return False
+        if self.verificar_tras is not None and ahora - liberada > self.verificar_tras:
+            try:
+                with conexion.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                conexion.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+    
+    def obtener(self):
+        """Saca una conexión del pool (esperando si están todas en uso)"""
+        inicio = time.monotonic()
+        agotado = False
+        with self._condicion:
+            while True:
+                if self._cerrado:
+                    raise PoolError("El pool de conexiones está cerrado")
+                if self._libres or self._en_uso + len(self._libres) < self.maximo:
+                    break
+                agotado = True
+                restante = self.tiempo_espera - (time.monotonic() - inicio)
+                if restante <= 0:
+                    metricas.registrar_checkout_pool(self.nombre, time.monotonic() - inicio, True, expirado=True)
+                    raise PoolAgotado(f"Sin conexiones libres tras {self.tiempo_espera}s "
+                                      f"({self.maximo} en uso)")
+                self._condicion.wait(restante)
+            
+            libre = self._libres.pop() if self._libres else None
+            self._en_uso += 1
+            self._publicar_estado()
+        
+        # Verificar o abrir fuera del lock: puede tardar lo que tarde la red
+        try:
+            if libre and not self._sana(*libre):
+                self._descartar(libre[0])
+                libre = None
+            conexion = libre[0] if libre else self._abrir()
+        except Exception:
+            with self._condicion:
+                self._en_uso -= 1
+                self._publicar_estado()
+                self._condicion.notify()
+            raise
+        
+        metricas.registrar_checkout_pool(self.nombre, time.monotonic() - inicio, agotado)
+        return conexion
+    
+    def devolver(self, conexion, descartar: bool = False):
+        """Devuelve una conexión al pool (o la cierra si quedó inutilizable)"""
+        if not descartar and not conexion.closed:
+            try:
+                # No dejar transacciones abiertas en una conexión libre
+                if conexion.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                    conexion.rollback()
+            except psycopg2.Error:
+                descartar = True
+        
+        with self._condicion:
+            self._en_uso -= 1
+            if descartar or conexion.closed or self._cerrado:
+                self._descartar(conexion)
+            else:
+                self._libres.append((conexion, self._creadas.get(id(conexion), time.monotonic()), time.monotonic()))
+            self._publicar_estado()
+            self._condicion.notify()
+    
+    @contextmanager
+    def conexion(self):
+        """Conexión prestada por la duración del bloque: commit al salir, rollback si hay error"""
+        conexion = self.obtener()
+        descartar = False
+        try:
+            yield conexion
+            conexion.commit()
+        except Exception:
+            try:
+                conexion.rollback()
+            except psycopg2.Error:
+                pass
+            # Conexión caída: no devolverla al pool
+            descartar = bool(conexion.closed)
+            raise
+        finally:
+            self.devolver(conexion, descartar)
+    
+    def sentencias_preparadas(self, conexion) -> set:
+        """Nombres de las sentencias ya preparadas en la sesión de esta conexión
+        
+        Solo la usa el hilo que tiene la conexión prestada; al reciclar o
+        descartar la conexión el registro se borra con ella.
+        """
+        return self._preparadas.setdefault(id(conexion), set())
+    
+    def estado(self) -> Dict[str, int]:
+        with self._condicion:
+            return {'en_uso': self._en_uso, 'libres': len(self._libres), 'maximo': self.maximo}
+    
+    def cerrar(self):
+        """Cierra las conexiones libres; las que están en uso se cierran al devolverse"""
+        with self._condicion:
+            self._cerrado = True
+            for conexion, _, _ in self._libres:
+                self._descartar(conexion)
+            self._libres = []
+            self._publicar_estado()
+            self._condicion.notify_all()
+
 class PostgreSQLDatabase:
     """Clase para manejar la base de datos PostgreSQL"""
     
@@ -28,73 +220,105 @@ class PostgreSQLDatabase:
         if self.database_url.startswith('postgres://'):
             self.database_url = self.database_url.replace('postgres://', 'postgresql://', 1)
         
-        # Pool de conexiones
-        self.pool = SimpleConnectionPool(
-            minconn=1,
-            maxconn=20,
-            dsn=self.database_url
-        )
+        config = DatabaseConfig.get_database_config()
+        
+        # Pool de conexiones (seguro entre hilos)
+        self.pool = PoolConexiones.desde_config(config, self.database_url)
+        
+        # Desactivar detrás de un pooler en modo transacción (las sesiones no se conservan)
+        self.usar_preparadas = config.get('prepared_statements', True)
+    
+    def conexion(self):
+        """Context manager con una conexión del pool (commit al salir, rollback si hay error)"""
+        return self.pool.conexion()
     
     def get_connection(self):
-        """Obtiene una conexión del pool"""
-        return self.pool.getconn()
+        """Obtiene una conexión del pool (preferir `with db.conexion()`)"""
+        return self.pool.obtener()
     
     def return_connection(self, conn):
         """Devuelve una conexión al pool"""
-        self.pool.putconn(conn)
+        self.pool.devolver(conn)
     
     def execute_query(self, query: str, params: tuple = None, fetch: bool = True):
         """Ejecuta una consulta SQL"""
-        conn = None
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            cursor.execute(query, params)
-            
-            if fetch:
-                result = cursor.fetchall()
-            else:
-                conn.commit()
-                result = cursor.rowcount
-            
-            cursor.close()
-            return result
-            
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if conn:
-                self.return_connection(conn)
+        with self.conexion() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall() if fetch else cursor.rowcount
+    
+    def ejecutar_preparada(self, nombre: str, query: str, params: tuple = (), fetch: bool = True):
+        """Ejecuta una consulta frecuente como sentencia preparada
+        
+        La primera vez en cada conexión se hace PREPARE `nombre` y desde ahí
+        solo se envía EXECUTE con los parámetros, así el servidor no vuelve a
+        analizar ni planificar el SQL. Si la sesión perdió la sentencia
+        (conexión reciclada por el servidor o un pooler) se prepara de nuevo.
+        """
+        if not self.usar_preparadas:
+            return self.execute_query(query, params, fetch)
+        
+        # %s -> $1, $2, ... (sintaxis de PREPARE)
+        partes = query.split('%s')
+        sql = partes[0] + ''.join(f"${i}{parte}" for i, parte in enumerate(partes[1:], start=1))
+        ejecutar = f"EXECUTE {nombre} ({', '.join(['%s'] * len(params))})" if params else f"EXECUTE {nombre}"
+        
+        with self.conexion() as conn:
+            preparadas = self.pool.sentencias_preparadas(conn)
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                for reintento in (False, True):
+                    try:
+                        if nombre not in preparadas:
+                            cursor.execute(f"PREPARE {nombre} AS {sql}")
+                            preparadas.add(nombre)
+                        cursor.execute(ejecutar, params or None)
+                        return cursor.fetchall() if fetch else cursor.rowcount
+                    except errors.InvalidSqlStatementName:
+                        # La sesión ya no la tiene: volver a prepararla
+                        if reintento:
+                            raise
+                        conn.rollback()
+                        preparadas.discard(nombre)
+                    except errors.FeatureNotSupported:
+                        # "cached plan must not change result type": la tabla cambió tras prepararla
+                        if reintento:
+                            raise
+                        conn.rollback()
+                        cursor.execute(f"DEALLOCATE {nombre}")
+                        preparadas.discard(nombre)
+                    except errors.DuplicatePreparedStatement:
+                        # La sesión ya la tenía aunque no figuraba en el registro
+                        if reintento:
+                            raise
+                        conn.rollback()
+                        preparadas.add(nombre)
+    
+    def iterar_consulta(self, query: str, params: tuple = None,
+                        itersize: int = ITERSIZE_LECTURAS) -> Iterator[Dict[str, Any]]:
+        """Ejecuta una consulta y entrega las filas de a una, sin cargarlas todas en memoria
+        
+        Usa un cursor con nombre (del lado del servidor) que trae `itersize`
+        filas por viaje. La conexión queda prestada hasta que se termina de
+        recorrer (o se cierra) el generador.
+        """
+        with self.conexion() as conn:
+            with conn.cursor(name=f"lectura_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                for fila in cursor:
+                    yield fila
     
     def execute_many(self, query: str, params_list: List[tuple]):
         """Ejecuta múltiples consultas SQL"""
-        conn = None
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.executemany(query, params_list)
-            conn.commit()
-            
-            result = cursor.rowcount
-            cursor.close()
-            return result
-            
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if conn:
-                self.return_connection(conn)
+        with self.conexion() as conn:
+            with conn.cursor() as cursor:
+                cursor.executemany(query, params_list)
+                return cursor.rowcount
     
     def close(self):
         """Cierra el pool de conexiones"""
         if self.pool:
-            self.pool.closeall()
+            self.pool.cerrar()
 
 class UsuarioPostgreSQL:
     """Clase para manejar usuarios en PostgreSQL"""
@@ -115,13 +339,13 @@ class UsuarioPostgreSQL:
     def obtener_usuario(self, usuario_id: int) -> Optional[Dict]:
         """Obtiene un usuario por ID"""
         query = "SELECT * FROM usuarios WHERE id = %s AND activo = TRUE"
-        result = self.db.execute_query(query, (usuario_id,))
+        result = self.db.ejecutar_preparada('usuario_por_id', query, (usuario_id,))
         return result[0] if result else None
     
     def obtener_usuario_por_username(self, username: str) -> Optional[Dict]:
         """Obtiene un usuario por username"""
         query = "SELECT * FROM usuarios WHERE username = %s AND activo = TRUE"
-        result = self.db.execute_query(query, (username,))
+        result = self.db.ejecutar_preparada('usuario_por_username', query, (username,))
         return result[0] if result else None
     
     def obtener_usuario_por_email(self, email: str) -> Optional[Dict]:
@@ -194,10 +418,10 @@ class ClientePostgreSQL:
         """Obtiene un cliente por ID"""
         if es_admin:
             query = "SELECT * FROM clientes WHERE id = %s AND activo = TRUE"
-            result = self.db.execute_query(query, (cliente_id,))
+            result = self.db.ejecutar_preparada('cliente_por_id', query, (cliente_id,))
         else:
             query = "SELECT * FROM clientes WHERE id = %s AND usuario_id = %s AND activo = TRUE"
-            result = self.db.execute_query(query, (cliente_id, usuario_id))
+            result = self.db.ejecutar_preparada('cliente_por_id_dueno', query, (cliente_id, usuario_id))
         
         return result[0] if result else None
     
@@ -212,6 +436,17 @@ class ClientePostgreSQL:
         
         return result[0] if result else None
     
+    def obtener_clientes_por_id(self, usuario_id: int, es_admin: bool = False) -> Dict[int, Dict]:
+        """Clientes activos visibles para el usuario indexados por ID, con una sola consulta"""
+        if es_admin:
+            query = "SELECT * FROM clientes WHERE activo = TRUE"
+            result = self.db.execute_query(query)
+        else:
+            query = "SELECT * FROM clientes WHERE usuario_id = %s AND activo = TRUE"
+            result = self.db.execute_query(query, (usuario_id,))
+        
+        return {cliente['id']: cliente for cliente in result}
+    
     def listar_clientes(self, usuario_id: int, es_admin: bool = False) -> List[Dict]:
         """Lista clientes según permisos"""
         if es_admin:
@@ -233,6 +468,26 @@ class ClientePostgreSQL:
             """
             return self.db.execute_query(query, (usuario_id,))
     
+    def iterar_clientes(self, usuario_id: int, es_admin: bool = False) -> Iterator[Dict]:
+        """Recorre los clientes activos en orden de id (para exportaciones completas)
+        
+        Incluye la cantidad de préstamos activos y su saldo (prestamos_activos,
+        saldo_pendiente), calculados en la misma consulta.
+        """
+        where = "c.activo = TRUE" if es_admin else "c.usuario_id = %s AND c.activo = TRUE"
+        query = f"""
+            SELECT c.*, COALESCE(a.prestamos_activos, 0) as prestamos_activos,
+                   COALESCE(a.saldo_pendiente, 0) as saldo_pendiente
+            FROM clientes c
+            LEFT JOIN (
+                SELECT cliente_id, COUNT(*) as prestamos_activos, SUM(monto_restante) as saldo_pendiente
+                FROM prestamos WHERE estado = 'activo' GROUP BY cliente_id
+            ) a ON a.cliente_id = c.id
+            WHERE {where}
+            ORDER BY c.id
+        """
+        return self.db.iterar_consulta(query, None if es_admin else (usuario_id,))
+    
     def actualizar_cliente(self, cliente_id: int, **kwargs) -> bool:
         """Actualiza un cliente"""
         allowed_fields = ['nombre', 'apellido', 'telefono', 'email', 'direccion']
@@ -328,7 +583,7 @@ class PrestamoPostgreSQL:
                 LEFT JOIN usuarios u ON p.usuario_creador_id = u.id
                 WHERE p.id = %s
             """
-            result = self.db.execute_query(query, (prestamo_id,))
+            result = self.db.ejecutar_preparada('prestamo_por_id', query, (prestamo_id,))
         else:
             query = """
                 SELECT p.*, c.nombre as cliente_nombre, c.apellido as cliente_apellido,
@@ -338,7 +593,7 @@ class PrestamoPostgreSQL:
                 LEFT JOIN usuarios u ON p.usuario_creador_id = u.id
                 WHERE p.id = %s AND p.usuario_id = %s
             """
-            result = self.db.execute_query(query, (prestamo_id, usuario_id))
+            result = self.db.ejecutar_preparada('prestamo_por_id_dueno', query, (prestamo_id, usuario_id))
         
         return result[0] if result else None
     
@@ -354,7 +609,7 @@ class PrestamoPostgreSQL:
                 WHERE p.estado = 'activo'
                 ORDER BY p.fecha_creacion DESC
             """
-            return self.db.execute_query(query)
+            return self.db.ejecutar_preparada('prestamos_activos', query)
         else:
             query = """
                 SELECT p.*, c.nombre as cliente_nombre, c.apellido as cliente_apellido,
@@ -365,7 +620,34 @@ class PrestamoPostgreSQL:
                 WHERE p.usuario_id = %s AND p.estado = 'activo'
                 ORDER BY p.fecha_creacion DESC
             """
-            return self.db.execute_query(query, (usuario_id,))
+            return self.db.ejecutar_preparada('prestamos_activos_dueno', query, (usuario_id,))
+    
+    def iterar_prestamos(self, usuario_id: int, es_admin: bool = False,
+                         estado: Optional[str] = None) -> Iterator[Dict]:
+        """Recorre los préstamos (opcionalmente de un estado) con los datos del cliente, en orden de id"""
+        condiciones = []
+        params = []
+        if not es_admin:
+            condiciones.append("p.usuario_id = %s")
+            params.append(usuario_id)
+        if estado:
+            condiciones.append("p.estado = %s")
+            params.append(estado)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        
+        query = f"""
+            SELECT p.*, c.nombre as cliente_nombre, c.apellido as cliente_apellido, c.dni as cliente_dni,
+                   COALESCE(t.total_pagado, 0) as total_pagado, COALESCE(t.cantidad_pagos, 0) as cantidad_pagos
+            FROM prestamos p
+            JOIN clientes c ON p.cliente_id = c.id
+            LEFT JOIN (
+                SELECT prestamo_id, SUM(monto) as total_pagado, COUNT(*) as cantidad_pagos
+                FROM pagos GROUP BY prestamo_id
+            ) t ON t.prestamo_id = p.id
+            {where}
+            ORDER BY p.id
+        """
+        return self.db.iterar_consulta(query, tuple(params))
     
     def actualizar_prestamo(self, prestamo_id: int, **kwargs) -> bool:
         """Actualiza un préstamo"""
@@ -388,32 +670,26 @@ class PrestamoPostgreSQL:
         return result > 0
     
     def obtener_estadisticas(self, usuario_id: int, es_admin: bool = False) -> Dict:
-        """Obtiene estadísticas de préstamos"""
+        """Obtiene estadísticas de préstamos
+        
+        Lee la tabla resumen_prestamos (una fila por dueño, mantenida por
+        triggers; ver migraciones_postgresql.py): el costo no depende de la
+        cantidad de préstamos.
+        """
+        query = """
+            SELECT 
+                COALESCE(SUM(total_prestamos), 0)::bigint as total_prestamos,
+                COALESCE(SUM(prestamos_activos), 0)::bigint as prestamos_activos,
+                COALESCE(SUM(prestamos_pagados), 0)::bigint as prestamos_pagados,
+                COALESCE(SUM(prestamos_vencidos), 0)::bigint as prestamos_vencidos,
+                SUM(monto_total_activo) as monto_total_activo,
+                SUM(suma_tasas) / NULLIF(SUM(total_prestamos), 0) as tasa_promedio
+            FROM resumen_prestamos
+        """
         if es_admin:
-            query = """
-                SELECT 
-                    COUNT(*) as total_prestamos,
-                    COUNT(CASE WHEN estado = 'activo' THEN 1 END) as prestamos_activos,
-                    COUNT(CASE WHEN estado = 'pagado' THEN 1 END) as prestamos_pagados,
-                    COUNT(CASE WHEN estado = 'vencido' THEN 1 END) as prestamos_vencidos,
-                    SUM(CASE WHEN estado = 'activo' THEN monto_restante ELSE 0 END) as monto_total_activo,
-                    AVG(tasa_interes) as tasa_promedio
-                FROM prestamos
-            """
             result = self.db.execute_query(query)
         else:
-            query = """
-                SELECT 
-                    COUNT(*) as total_prestamos,
-                    COUNT(CASE WHEN estado = 'activo' THEN 1 END) as prestamos_activos,
-                    COUNT(CASE WHEN estado = 'pagado' THEN 1 END) as prestamos_pagados,
-                    COUNT(CASE WHEN estado = 'vencido' THEN 1 END) as prestamos_vencidos,
-                    SUM(CASE WHEN estado = 'activo' THEN monto_restante ELSE 0 END) as monto_total_activo,
-                    AVG(tasa_interes) as tasa_promedio
-                FROM prestamos
-                WHERE usuario_id = %s
-            """
-            result = self.db.execute_query(query, (usuario_id,))
+            result = self.db.execute_query(query + " WHERE usuario_id = %s", (usuario_id,))
         
         return result[0] if result else {}
 
@@ -432,7 +708,7 @@ class PagoPostgreSQL:
             VALUES (%s, %s, %s, %s, %s, %s)
             RETURNING id
         """
-        result = self.db.execute_query(query, (
+        result = self.db.ejecutar_preparada('insertar_pago', query, (
             prestamo_id, monto, fecha_pago, tipo_pago, usuario_id, observaciones
         ))
         return result[0]['id']
@@ -446,34 +722,50 @@ class PagoPostgreSQL:
             WHERE p.prestamo_id = %s
             ORDER BY p.fecha_pago DESC
         """
-        return self.db.execute_query(query, (prestamo_id,))
+        return self.db.ejecutar_preparada('pagos_por_prestamo', query, (prestamo_id,))
+    
+    def iterar_pagos(self, usuario_id: int, es_admin: bool = False, desde: date = None,
+                     hasta: date = None) -> Iterator[Dict]:
+        """Recorre los pagos (opcionalmente entre dos fechas) con su préstamo y cliente, en orden de id"""
+        condiciones = []
+        params = []
+        if not es_admin:
+            condiciones.append("pr.usuario_id = %s")
+            params.append(usuario_id)
+        if desde:
+            condiciones.append("p.fecha_pago >= %s")
+            params.append(desde)
+        if hasta:
+            condiciones.append("p.fecha_pago <= %s")
+            params.append(hasta)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        
+        query = f"""
+            SELECT p.*, pr.cliente_id, pr.estado as estado_prestamo,
+                   c.nombre as cliente_nombre, c.apellido as cliente_apellido
+            FROM pagos p
+            JOIN prestamos pr ON p.prestamo_id = pr.id
+            JOIN clientes c ON pr.cliente_id = c.id
+            {where}
+            ORDER BY p.id
+        """
+        return self.db.iterar_consulta(query, tuple(params))
     
     def obtener_estadisticas_pagos(self, usuario_id: int, es_admin: bool = False) -> Dict:
-        """Obtiene estadísticas de pagos"""
+        """Obtiene estadísticas de pagos (desde la tabla resumen_pagos, mantenida por triggers)"""
+        query = """
+            SELECT 
+                COALESCE(SUM(total_pagos), 0)::bigint as total_pagos,
+                SUM(monto_total_pagado) as monto_total_pagado,
+                SUM(monto_total_pagado) / NULLIF(SUM(total_pagos), 0) as monto_promedio_pago,
+                COALESCE(SUM(pagos_cuota), 0)::bigint as pagos_cuota,
+                COALESCE(SUM(pagos_adelanto), 0)::bigint as pagos_adelanto
+            FROM resumen_pagos
+        """
         if es_admin:
-            query = """
-                SELECT 
-                    COUNT(*) as total_pagos,
-                    SUM(monto) as monto_total_pagado,
-                    AVG(monto) as monto_promedio_pago,
-                    COUNT(CASE WHEN tipo_pago = 'cuota' THEN 1 END) as pagos_cuota,
-                    COUNT(CASE WHEN tipo_pago = 'adelanto' THEN 1 END) as pagos_adelanto
-                FROM pagos
-            """
             result = self.db.execute_query(query)
         else:
-            query = """
-                SELECT 
-                    COUNT(*) as total_pagos,
-                    SUM(monto) as monto_total_pagado,
-                    AVG(monto) as monto_promedio_pago,
-                    COUNT(CASE WHEN tipo_pago = 'cuota' THEN 1 END) as pagos_cuota,
-                    COUNT(CASE WHEN tipo_pago = 'adelanto' THEN 1 END) as pagos_adelanto
-                FROM pagos p
-                JOIN prestamos pr ON p.prestamo_id = pr.id
-                WHERE pr.usuario_id = %s
-            """
-            result = self.db.execute_query(query, (usuario_id,))
+            result = self.db.execute_query(query + " WHERE usuario_id = %s", (usuario_id,))
         
         return result[0] if result else {}
 
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Exportación de Datos
+====================
+
+Exporta clientes, préstamos y pagos en CSV o JSON lines. La entidad
+exportada se lee del archivo de a un registro (Database.iterar_visibles) y
+las filas se escriben de a bloques, así que ni los datos ni el archivo de
+salida se arman completos en memoria. Lo único que crece con la cartera son
+los índices auxiliares de pocas columnas: nombre y DNI de cada cliente (en
+préstamos y pagos), cliente y estado de cada préstamo (en pagos) y préstamos
+activos y saldo por cliente (en clientes). Se respetan la visibilidad del
+usuario y los filtros:
+
+- estado: estado del préstamo (en pagos, el del préstamo al que pertenecen);
+  en clientes, "activo" o "inactivo".
+- desde / hasta: fecha de registro del cliente, de inicio del préstamo o del
+  pago (inclusive).
+- operador_id: usuario que registró el dato.
+
+Incluye columnas calculadas: saldo pendiente, total pagado, monto total y
+datos del cliente.
+
+Con --backend postgresql (ExportadorDatosPostgreSQL) las filas salen de los
+cursores del lado del servidor de database_postgresql.py (iterar_clientes,
+iterar_prestamos, iterar_pagos), que ya traen los datos del cliente y los
+totales calculados: no se arma ningún índice en memoria. El esquema de
+PostgreSQL no guarda el tipo de interés ni el saldo después de cada pago, así
+que esas columnas quedan vacías, y solo incluye los clientes activos.
+
+Uso: python exportacion_datos.py prestamos --usuario admin [--formato jsonl]
+     [--estado activo] [--desde 2025-01-01] [--hasta 2025-12-31]
+     [--operador 3] [--salida prestamos.csv] [--backend json|postgresql]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models import Cliente, Pago, Prestamo
+
+ENTIDADES = ('clientes', 'prestamos', 'pagos')
+FORMATOS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+COLUMNAS = {
+    'clientes': ['id', 'nombre', 'apellido', 'dni', 'telefono', 'email', 'activo', 'fecha_registro',
+                 'usuario_id', 'prestamos_activos', 'saldo_pendiente'],
+    'prestamos': ['id', 'cliente_id', 'cliente', 'cliente_dni', 'monto', 'tasa_interes', 'plazo_dias',
+                  'tipo_interes', 'fecha_inicio', 'estado', 'usuario_id', 'monto_total', 'total_pagado',
+                  'saldo_pendiente', 'cantidad_pagos'],
+    'pagos': ['id', 'prestamo_id', 'cliente_id', 'cliente', 'monto', 'fecha', 'concepto', 'saldo_despues',
+              'estado_prestamo', 'usuario_id'],
+}
+
+# Filas que se acumulan antes de entregar un bloque de la respuesta
+FILAS_POR_BLOQUE = 500
+
+def _monto(valor: Decimal) -> float:
+    return float(round(valor, 2))
+
+def _en_rango(fecha: date, desde: Optional[date], hasta: Optional[date]) -> bool:
+    return (desde is None or fecha >= desde) and (hasta is None or fecha <= hasta)
+
+class ExportadorDatos:
+    """Genera las filas de exportación de cada entidad"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def filas(self, entidad: str, usuario_id: int, es_admin: bool = False, estado: Optional[str] = None,
+              desde: Optional[date] = None, hasta: Optional[date] = None,
+              operador_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Filas visibles para el usuario que cumplen los filtros"""
+        if entidad not in ENTIDADES:
+            raise ValueError(f"Entidad desconocida: {entidad}")
+        generador = getattr(self, f"_filas_{entidad}")
+        for fila in generador(usuario_id, es_admin, estado, desde, hasta):
+            if operador_id is None or fila['usuario_id'] == operador_id:
+                yield fila
+
+    def _filas_clientes(self, usuario_id, es_admin, estado, desde, hasta):
+        # Préstamos activos y saldo de cada cliente
+        resumen = {}
+        for datos in self.db.iterar_visibles(self.db.prestamos_file, usuario_id, es_admin):
+            if datos.get('estado') == 'activo':
+                prestamo = Prestamo.from_dict(datos)
+                cantidad, saldo = resumen.get(prestamo.cliente_id, (0, Decimal('0')))
+                resumen[prestamo.cliente_id] = (cantidad + 1, saldo + prestamo.calcular_saldo_pendiente())
+
+        for datos in self.db.iterar_visibles(self.db.clientes_file, usuario_id, es_admin):
+            cliente = Cliente.from_dict(datos)
+            if estado and (cliente.activo != (estado == 'activo')):
+                continue
+            if not _en_rango(cliente.fecha_registro.date(), desde, hasta):
+                continue
+            cantidad, saldo = resumen.get(cliente.id, (0, Decimal('0')))
+            yield {
+                'id': cliente.id,
+                'nombre': cliente.nombre,
+                'apellido': cliente.apellido,
+                'dni': cliente.dni,
+                'telefono': cliente.telefono,
+                'email': cliente.email,
+                'activo': cliente.activo,
+                'fecha_registro': cliente.fecha_registro.isoformat(),
+                'usuario_id': cliente.usuario_id,
+                'prestamos_activos': cantidad,
+                'saldo_pendiente': _monto(saldo),
+            }
+
+    def _clientes_por_id(self) -> Dict[int, Dict[str, Any]]:
+        """Nombre y DNI de los clientes (sin filtro: se usan solo para datos ya visibles)"""
+        return {c['id']: {'nombre': f"{c['nombre']} {c['apellido']}", 'dni': c['dni']}
+                for c in self.db.iterar_visibles(self.db.clientes_file, None, True)}
+
+    def _filas_prestamos(self, usuario_id, es_admin, estado, desde, hasta):
+        clientes = self._clientes_por_id()
+        for datos in self.db.iterar_visibles(self.db.prestamos_file, usuario_id, es_admin):
+            if estado and datos.get('estado') != estado:
+                continue
+            prestamo = Prestamo.from_dict(datos)
+            if not _en_rango(prestamo.fecha_inicio, desde, hasta):
+                continue
+            cliente = clientes.get(prestamo.cliente_id, {})
+            yield {
+                'id': prestamo.id,
+                'cliente_id': prestamo.cliente_id,
+                'cliente': cliente.get('nombre', ''),
+                'cliente_dni': cliente.get('dni', ''),
+                'monto': _monto(prestamo.monto),
+                'tasa_interes': float(prestamo.tasa_interes),
+                'plazo_dias': prestamo.plazo_dias,
+                'tipo_interes': prestamo.tipo_interes,
+                'fecha_inicio': prestamo.fecha_inicio.isoformat(),
+                'estado': prestamo.estado,
+                'usuario_id': prestamo.usuario_id,
+                'monto_total': _monto(prestamo.calcular_monto_total()),
+                'total_pagado': _monto(sum((p.monto for p in prestamo.pagos), Decimal('0'))),
+                'saldo_pendiente': _monto(prestamo.calcular_saldo_pendiente()),
+                'cantidad_pagos': len(prestamo.pagos),
+            }
+
+    def _filas_pagos(self, usuario_id, es_admin, estado, desde, hasta):
+        clientes = self._clientes_por_id()
+        prestamos = {p['id']: (p['cliente_id'], p.get('estado'))
+                     for p in self.db.iterar_visibles(self.db.prestamos_file, None, True)}
+        for datos in self.db.iterar_visibles(self.db.pagos_file, usuario_id, es_admin):
+            cliente_id, estado_prestamo = prestamos.get(datos['prestamo_id'], (None, None))
+            if estado and estado_prestamo != estado:
+                continue
+            pago = Pago.from_dict(datos)
+            if not _en_rango(pago.fecha.date(), desde, hasta):
+                continue
+            yield {
+                'id': pago.id,
+                'prestamo_id': pago.prestamo_id,
+                'cliente_id': cliente_id,
+                'cliente': clientes.get(cliente_id, {}).get('nombre', ''),
+                'monto': _monto(pago.monto),
+                'fecha': pago.fecha.isoformat(),
+                'concepto': pago.concepto,
+                'saldo_despues': _monto(pago.saldo_despues),
+                'estado_prestamo': estado_prestamo,
+                'usuario_id': pago.usuario_id,
+            }
+
+class ExportadorDatosPostgreSQL(ExportadorDatos):
+    """Filas de exportación leídas con los cursores del servidor del adaptador de PostgreSQL"""
+
+    def __init__(self, db):
+        from database_postgresql import ClientePostgreSQL, PagoPostgreSQL, PrestamoPostgreSQL
+
+        super().__init__(db)
+        self.clientes = ClientePostgreSQL(db)
+        self.prestamos = PrestamoPostgreSQL(db)
+        self.pagos = PagoPostgreSQL(db)
+
+    @staticmethod
+    def _fecha(valor) -> date:
+        return valor.date() if isinstance(valor, datetime) else valor
+
+    def _filas_clientes(self, usuario_id, es_admin, estado, desde, hasta):
+        if estado == 'inactivo':
+            return
+        for datos in self.clientes.iterar_clientes(usuario_id, es_admin):
+            if datos['fecha_creacion'] and not _en_rango(self._fecha(datos['fecha_creacion']), desde, hasta):
+                continue
+            yield {
+                'id': datos['id'],
+                'nombre': datos['nombre'],
+                'apellido': datos['apellido'],
+                'dni': datos['dni'],
+                'telefono': datos['telefono'] or '',
+                'email': datos['email'] or '',
+                'activo': datos['activo'],
+                'fecha_registro': datos['fecha_creacion'].isoformat() if datos['fecha_creacion'] else '',
+                'usuario_id': datos['usuario_id'],
+                'prestamos_activos': datos['prestamos_activos'],
+                'saldo_pendiente': _monto(Decimal(datos['saldo_pendiente'])),
+            }
+
+    def _filas_prestamos(self, usuario_id, es_admin, estado, desde, hasta):
+        for datos in self.prestamos.iterar_prestamos(usuario_id, es_admin, estado):
+            if not _en_rango(datos['fecha_inicio'], desde, hasta):
+                continue
+            total_pagado = Decimal(datos['total_pagado'])
+            yield {
+                'id': datos['id'],
+                'cliente_id': datos['cliente_id'],
+                'cliente': f"{datos['cliente_nombre']} {datos['cliente_apellido']}",
+                'cliente_dni': datos['cliente_dni'],
+                'monto': _monto(datos['monto_original']),
+                'tasa_interes': float(datos['tasa_interes']),
+                'plazo_dias': datos['plazo_meses'],  # Igual que Prestamo.from_dict con datos antiguos
+                'tipo_interes': '',
+                'fecha_inicio': datos['fecha_inicio'].isoformat(),
+                'estado': datos['estado'],
+                'usuario_id': datos['usuario_id'],
+                'monto_total': _monto(total_pagado + datos['monto_restante']),
+                'total_pagado': _monto(total_pagado),
+                'saldo_pendiente': _monto(datos['monto_restante']),
+                'cantidad_pagos': datos['cantidad_pagos'],
+            }
+
+    def _filas_pagos(self, usuario_id, es_admin, estado, desde, hasta):
+        for datos in self.pagos.iterar_pagos(usuario_id, es_admin, desde, hasta):
+            if estado and datos['estado_prestamo'] != estado:
+                continue
+            yield {
+                'id': datos['id'],
+                'prestamo_id': datos['prestamo_id'],
+                'cliente_id': datos['cliente_id'],
+                'cliente': f"{datos['cliente_nombre']} {datos['cliente_apellido']}",
+                'monto': _monto(datos['monto']),
+                'fecha': datos['fecha_pago'].isoformat(),
+                'concepto': datos['observaciones'] or datos['tipo_pago'],
+                'saldo_despues': None,
+                'estado_prestamo': datos['estado_prestamo'],
+                'usuario_id': datos['usuario_id'],
+            }
+
+def serializar(filas: Iterable[Dict[str, Any]], entidad: str, formato: str) -> Iterator[str]:
+    """Convierte las filas en bloques de texto CSV o JSON lines"""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato}")
+
+    buffer = io.StringIO()
+    if formato == 'csv':
+        # BOM para que Excel reconozca el UTF-8 (acentos y eñes)
+        buffer.write('\ufeff')
+        escritor = csv.DictWriter(buffer, fieldnames=COLUMNAS[entidad], extrasaction='ignore')
+        escritor.writeheader()
+        escribir = escritor.writerow
+    else:
+        def escribir(fila):
+            buffer.write(json.dumps(fila, ensure_ascii=False) + '\n')
+
+    for numero, fila in enumerate(filas, start=1):
+        escribir(fila)
+        if numero % FILAS_POR_BLOQUE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def leer_fecha(valor: Optional[str]) -> Optional[date]:
+    """Fecha AAAA-MM-DD de un filtro (None si está vacía)"""
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor.strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Fecha inválida (use AAAA-MM-DD): {valor!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta clientes, préstamos o pagos en CSV o JSON lines")
+    parser.add_argument('entidad', choices=ENTIDADES)
+    parser.add_argument('--usuario', required=True, help="Usuario (username) cuya visibilidad se aplica")
+    parser.add_argument('--formato', choices=list(FORMATOS), default='csv')
+    parser.add_argument('--estado', help="Estado del préstamo (o activo/inactivo en clientes)")
+    parser.add_argument('--desde', help="Fecha inicial AAAA-MM-DD")
+    parser.add_argument('--hasta', help="Fecha final AAAA-MM-DD")
+    parser.add_argument('--operador', type=int, help="Solo los datos registrados por este usuario (ID)")
+    parser.add_argument('--salida', help="Archivo de salida (por defecto, la salida estándar)")
+    parser.add_argument('--data-dir', default='data', help="Directorio de datos (por defecto: data)")
+    parser.add_argument('--backend', choices=['json', 'postgresql'], default='json',
+                        help="Origen de los datos: archivos de --data-dir o la base de DATABASE_URL")
+    args = parser.parse_args()
+
+    if args.backend == 'postgresql':
+        from database_postgresql import PostgreSQLDatabase, UsuarioPostgreSQL
+
+        db = PostgreSQLDatabase()
+        usuario = UsuarioPostgreSQL(db).obtener_usuario_por_username(args.usuario)
+        usuario_id, rol = (usuario['id'], usuario['rol']) if usuario else (None, None)
+        exportador = ExportadorDatosPostgreSQL(db)
+    else:
+        from database import Database
+
+        db = Database(args.data_dir)
+        usuario = db.obtener_usuario_por_username(args.usuario)
+        usuario_id, rol = (usuario.id, usuario.rol) if usuario else (None, None)
+        exportador = ExportadorDatos(db)
+
+    if not usuario:
+        print(f"❌ Usuario '{args.usuario}' no encontrado", file=sys.stderr)
+        sys.exit(1)
+
+    filas = exportador.filas(args.entidad, usuario_id, rol == 'admin', args.estado,
+                             leer_fecha(args.desde), leer_fecha(args.hasta), args.operador)
+
+    salida = open(args.salida, 'w', encoding='utf-8', newline='') if args.salida else sys.stdout
+    try:
+        for bloque in serializar(filas, args.entidad, args.formato):
+            salida.write(bloque)
+    finally:
+        if args.salida:
+            salida.close()
+        if args.backend == 'postgresql':
+            db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Exportación Masiva de Pagarés
+=============================
+
+Genera en un solo ZIP los pagarés en PDF de todos los préstamos activos que
+ve un usuario (opcionalmente solo los de un operador), para auditorías o
+impresión. Se ejecuta como trabajo de la cola en segundo plano:
+
+- Los PDFs que ya están en la caché se agregan directamente.
+- Los demás se generan en paralelo en un grupo de procesos propio (uno por
+  núcleo), separado del pool que atiende las descargas interactivas, y se
+  guardan también en la caché.
+- El avance se informa con ColaTrabajos.reportar_progreso y se consulta en
+  /api/trabajos/<id>; el ZIP se descarga al terminar.
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Optional
+
+from cache_pdf import CachePDF, clave_pagare
+from pool_pdf import renderizar_pagare
+
+logger = logging.getLogger(__name__)
+
+TRABAJO_EXPORTAR_PAGARES = 'exportar_pagares'
+
+# Horas que se conservan los ZIP generados
+HORAS_RETENCION_EXPORTACIONES = 24
+
+class ExportadorPagares:
+    """Arma el ZIP con los pagarés de una cartera de préstamos"""
+
+    def __init__(self, db, cache: CachePDF, cola, directorio: str,
+                 buscar_firma: Callable[[Any], Optional[str]], procesos: Optional[int] = None):
+        self.db = db
+        self.cache = cache
+        self.cola = cola
+        self.directorio = os.path.abspath(directorio)
+        self.buscar_firma = buscar_firma
+        self.procesos = procesos or os.cpu_count() or 1
+        os.makedirs(self.directorio, exist_ok=True)
+
+        cola.registrar(TRABAJO_EXPORTAR_PAGARES, self._trabajo_exportar)
+
+    def solicitar(self, usuario_id: int, es_admin: bool, operador_id: Optional[int] = None) -> int:
+        """Encola la exportación y devuelve el ID del trabajo"""
+        datos = {'usuario_id': usuario_id, 'es_admin': es_admin, 'operador_id': operador_id}
+        # Sin reintentos: una exportación fallida se vuelve a pedir a mano
+        return self.cola.encolar(TRABAJO_EXPORTAR_PAGARES, datos, max_intentos=1)
+
+    def ruta_zip(self, trabajo_id: int) -> str:
+        return os.path.join(self.directorio, f"pagares_{trabajo_id}.zip")
+
+    def _trabajo_exportar(self, datos: Dict[str, Any]) -> Dict[str, Any]:
+        """Trabajo en segundo plano: genera el ZIP con los pagarés"""
+        self._limpiar_antiguos()
+
+        prestamos = self.db.obtener_prestamos_activos(datos['usuario_id'], datos['es_admin'])
+        if datos.get('operador_id') is not None:
+            prestamos = [p for p in prestamos if p.usuario_id == datos['operador_id']]
+
+        # Clientes leídos de una vez: obtener_cliente por préstamo relee
+        # clientes.json cada vez (cuadrático con la cartera completa)
+        clientes = self.db.obtener_clientes_por_id(datos['usuario_id'], datos['es_admin'])
+
+        # Préstamo, cliente, firma y clave de caché de cada pagaré
+        pagares = []
+        for prestamo in prestamos:
+            cliente = clientes.get(prestamo.cliente_id)
+            if not cliente:
+                continue
+            firma = self.buscar_firma(prestamo)
+            pagares.append((prestamo, cliente, firma, clave_pagare(prestamo, cliente, firma)))
+
+        total = len(pagares)
+        hechos = desde_cache = 0
+        errores = []
+        ruta = self.ruta_zip(self.cola.trabajo_actual)
+        temporal = f"{ruta}.tmp"
+        self.cola.reportar_progreso(0, total)
+
+        try:
+            with zipfile.ZipFile(temporal, 'w', zipfile.ZIP_DEFLATED) as archivo_zip:
+                pendientes = []
+                for prestamo, cliente, firma, clave in pagares:
+                    ruta_pdf = self.cache.obtener(clave)
+                    if ruta_pdf:
+                        archivo_zip.write(ruta_pdf, self._nombre_pdf(prestamo))
+                        hechos += 1
+                        desde_cache += 1
+                    else:
+                        pendientes.append((prestamo, cliente, firma, clave))
+                self.cola.reportar_progreso(hechos, total, desde_cache=desde_cache)
+
+                if pendientes:
+                    hechos += self._generar_pendientes(pendientes, archivo_zip, errores, hechos, total, desde_cache)
+        except Exception:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        os.replace(temporal, ruta)
+
+        logger.info("📦 Exportación de %s pagarés lista (%s desde caché, %s errores)",
+                    hechos, desde_cache, len(errores))
+        return {
+            'archivo': os.path.basename(ruta),
+            'total': total,
+            'exportados': hechos,
+            'desde_cache': desde_cache,
+            'errores': errores
+        }
+
+    def _generar_pendientes(self, pendientes, archivo_zip: zipfile.ZipFile, errores: list,
+                            hechos: int, total: int, desde_cache: int) -> int:
+        """Genera en paralelo los PDFs que no estaban en caché y los agrega al ZIP"""
+        generados = 0
+        ultimo_reporte = time.monotonic()
+        with ProcessPoolExecutor(max_workers=min(self.procesos, len(pendientes)),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futuros = {executor.submit(renderizar_pagare, prestamo, cliente, firma): (prestamo, clave)
+                       for prestamo, cliente, firma, clave in pendientes}
+            for futuro in as_completed(futuros):
+                prestamo, clave = futuros[futuro]
+                try:
+                    contenido = futuro.result()
+                except Exception as e:
+                    errores.append({'prestamo_id': prestamo.id, 'error': str(e)})
+                    continue
+
+                self.cache.guardar(clave, contenido)
+                archivo_zip.writestr(self._nombre_pdf(prestamo), contenido)
+                generados += 1
+
+                # Informar el avance como mucho una vez por segundo
+                if time.monotonic() - ultimo_reporte >= 1:
+                    self.cola.reportar_progreso(hechos + generados, total, desde_cache=desde_cache,
+                                               errores=len(errores))
+                    ultimo_reporte = time.monotonic()
+
+        self.cola.reportar_progreso(hechos + generados, total, desde_cache=desde_cache, errores=len(errores))
+        return generados
+
+    @staticmethod
+    def _nombre_pdf(prestamo) -> str:
+        return f"pagare_prestamo_{prestamo.id}.pdf"
+
+    def _limpiar_antiguos(self):
+        """Borra los ZIP de exportaciones anteriores al período de retención"""
+        limite = time.time() - HORAS_RETENCION_EXPORTACIONES * 3600
+        for entrada in os.scandir(self.directorio):
+            try:
+                if entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+            except FileNotFoundError:
+                pass
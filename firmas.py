@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Firmas Digitales
+================
+
+Guarda las firmas que el cliente dibuja en el navegador. La imagen se
+normaliza una sola vez al subirla (fondo blanco, escala de grises, recorte
+del espacio vacío y reducción al tamaño con que se imprime en el pagaré),
+así los PDFs no vuelven a procesar una captura de pantalla completa.
+
+La ruta y el hash de la firma vigente quedan registrados en el préstamo; las
+firmas reemplazadas se conservan hasta `conservar_anteriores` por préstamo
+y las más antiguas se borran.
+"""
+
+import hashlib
+import io
+import logging
+import os
+from datetime import datetime
+from typing import Iterable, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo de la firma guardada (en el PDF ocupa 3 x 1,5 pulgadas)
+FIRMA_ANCHO_MAXIMO = 600
+FIRMA_ALTO_MAXIMO = 300
+# Píxeles de margen que se dejan alrededor del trazo al recortar
+FIRMA_MARGEN = 10
+
+def normalizar_firma(datos: bytes) -> bytes:
+    """Convierte la imagen de una firma en un PNG liviano en escala de grises.
+
+    Lanza ValueError si los datos no son una imagen válida.
+    """
+    try:
+        with Image.open(io.BytesIO(datos)) as original:
+            original.load()
+            imagen = original.convert('RGBA')
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"La firma no es una imagen válida: {e}")
+
+    # El canvas del navegador tiene fondo transparente: aplanar sobre blanco
+    fondo = Image.new('RGBA', imagen.size, (255, 255, 255, 255))
+    imagen = Image.alpha_composite(fondo, imagen).convert('L')
+
+    # Recortar el espacio vacío alrededor del trazo
+    caja = ImageOps.invert(imagen).getbbox()
+    if caja:
+        izquierda, arriba, derecha, abajo = caja
+        imagen = imagen.crop((max(izquierda - FIRMA_MARGEN, 0), max(arriba - FIRMA_MARGEN, 0),
+                              min(derecha + FIRMA_MARGEN, imagen.width), min(abajo + FIRMA_MARGEN, imagen.height)))
+
+    imagen.thumbnail((FIRMA_ANCHO_MAXIMO, FIRMA_ALTO_MAXIMO), Image.Resampling.LANCZOS)
+
+    salida = io.BytesIO()
+    imagen.save(salida, 'PNG', optimize=True)
+    return salida.getvalue()
+
+class GestorFirmas:
+    """Archivos de firmas digitales con retención de las firmas reemplazadas"""
+
+    def __init__(self, directorio: str = os.path.join('static', 'firmas'), conservar_anteriores: int = 2):
+        self.directorio = directorio
+        self.conservar_anteriores = conservar_anteriores
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def guardar(self, prestamo_id: int, datos: bytes) -> Tuple[str, str]:
+        """Normaliza y guarda la firma de un préstamo; devuelve (ruta, hash)"""
+        contenido = normalizar_firma(datos)
+
+        # Microsegundos en el nombre: dos firmas seguidas no se pisan y el orden es cronológico
+        marca = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        ruta = os.path.join(self.directorio, f"firma_prestamo_{prestamo_id}_{marca}.png")
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+        logger.debug("✍️ Firma del préstamo %s guardada: %s (%s bytes, original %s)",
+                     prestamo_id, ruta, len(contenido), len(datos))
+        return ruta, hashlib.sha256(contenido).hexdigest()
+
+    def eliminar(self, rutas: Iterable[str]):
+        """Borra firmas que salieron del período de retención"""
+        for ruta in rutas:
+            try:
+                os.remove(ruta)
+                logger.debug("🗑️ Firma anterior eliminada: %s", ruta)
+            except FileNotFoundError:
+                pass
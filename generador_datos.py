@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Generador de Datos Sintéticos
+=============================
+
+Crea una cartera de prueba reproducible (misma semilla, mismos datos) con
+distribuciones parecidas a las de un negocio real:
+
+- Usuarios: un administrador, supervisores (~10%) y operadores.
+- Clientes repartidos entre los operadores de forma desigual (pocos
+  operadores concentran la mayor parte de la cartera).
+- Préstamos con montos log-normales redondeados, mezcla de tipos
+  gota_a_gota / simple / compuesto, plazos habituales y fechas de inicio
+  durante el último año.
+- Pagos calculados con los modelos (saldo_despues, estado pagado): cuotas
+  diarias en gota a gota y semanales en simple/compuesto, con atrasos.
+
+Se usa desde el benchmark (benchmark_rendimiento.py) y la prueba de carga,
+o por línea de comandos para preparar un directorio de datos de prueba.
+Todos los usuarios generados tienen la misma contraseña (--password).
+
+Uso: python generador_datos.py /tmp/datos_prueba --prestamos 5000
+     [--clientes 2000] [--operadores 20] [--semilla 42] [--sobrescribir]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+from decimal import ROUND_UP, Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models import Cliente, Pago, Prestamo, Usuario
+
+PASSWORD_PRUEBA = 'prueba123'
+
+# Tipo de interés -> (peso, rango de tasa anual %)
+TIPOS_INTERES = {
+    'gota_a_gota': (0.60, (120, 240)),
+    'simple': (0.25, (20, 60)),
+    'compuesto': (0.15, (15, 45)),
+}
+PLAZOS_DIAS = (15, 20, 24, 30, 45, 60, 90)
+NOMBRES = ('Ana', 'Luis', 'María', 'José', 'Carmen', 'Jorge', 'Rosa', 'Carlos', 'Lucía', 'Pedro',
+           'Elena', 'Miguel', 'Sofía', 'Juan', 'Patricia', 'Raúl', 'Julia', 'Andrés', 'Teresa', 'Diego')
+APELLIDOS = ('García', 'Rodríguez', 'Quispe', 'Mamani', 'Flores', 'Sánchez', 'Torres', 'Ramírez',
+             'Huamán', 'Díaz', 'Castillo', 'Vargas', 'Mendoza', 'Rojas', 'Chávez', 'Gutiérrez')
+
+class DatosSinteticos(NamedTuple):
+    usuarios: List[Usuario]
+    clientes: List[Cliente]
+    prestamos: List[Prestamo]
+    pagos: List[Pago]
+
+    def resumen(self) -> Dict[str, int]:
+        return {'usuarios': len(self.usuarios), 'clientes': len(self.clientes),
+                'prestamos': len(self.prestamos), 'pagos': len(self.pagos)}
+
+class GeneradorDatos:
+    """Genera usuarios, clientes, préstamos y pagos a partir de una semilla"""
+
+    def __init__(self, semilla: int = 42, hoy: Optional[date] = None, password: str = PASSWORD_PRUEBA):
+        self.azar = random.Random(semilla)
+        self.hoy = hoy or date.today()
+        self.password_hash = Usuario.hash_password(password)
+
+    def generar(self, prestamos: int, clientes: Optional[int] = None,
+                operadores: Optional[int] = None) -> DatosSinteticos:
+        """Genera una cartera con `prestamos` préstamos (clientes y operadores proporcionales si no se indican)"""
+        clientes = clientes or max(1, prestamos * 2 // 5)
+        operadores = operadores or max(1, min(200, clientes // 100))
+
+        usuarios = self._generar_usuarios(operadores)
+        cobradores = [u for u in usuarios if u.rol == 'operador']
+        # Peso de cada operador: Pareto, unos pocos tienen la mayor parte de la cartera
+        pesos = [self.azar.paretovariate(1.2) for _ in cobradores]
+
+        lista_clientes = []
+        for cliente_id in range(1, clientes + 1):
+            dueno = self.azar.choices(cobradores, pesos)[0]
+            cliente = Cliente(cliente_id, self.azar.choice(NOMBRES), self.azar.choice(APELLIDOS),
+                              f"{10000000 + cliente_id * 7919 % 89999999:08d}",
+                              f"9{self.azar.randrange(10**8):08d}", "", dueno.id)
+            cliente.fecha_registro = self._momento(self.hoy - timedelta(days=self.azar.randint(30, 730)))
+            lista_clientes.append(cliente)
+
+        lista_prestamos, lista_pagos = [], []
+        for prestamo_id in range(1, prestamos + 1):
+            # Los clientes frecuentes piden más préstamos
+            cliente = lista_clientes[min(int(self.azar.expovariate(1.0) * clientes / 3), clientes - 1)]
+            prestamo = self._generar_prestamo(prestamo_id, cliente)
+            self._generar_pagos(prestamo, lista_pagos)
+            lista_prestamos.append(prestamo)
+
+        return DatosSinteticos(usuarios, lista_clientes, lista_prestamos, lista_pagos)
+
+    def _momento(self, dia: date) -> datetime:
+        return datetime.combine(dia, datetime.min.time()) + timedelta(seconds=self.azar.randint(8 * 3600, 19 * 3600))
+
+    def _generar_usuarios(self, operadores: int) -> List[Usuario]:
+        admin = Usuario(1, 'admin', self.password_hash, 'Administrador', 'admin@prueba.local', 'admin')
+        usuarios = [admin]
+        supervisores = max(1, operadores // 10)
+        for i in range(1, supervisores + 1):
+            usuarios.append(Usuario(len(usuarios) + 1, f'supervisor{i}', self.password_hash, f'Supervisor {i}',
+                                    f'supervisor{i}@prueba.local', 'supervisor', usuario_creador_id=admin.id))
+        for i in range(1, operadores + 1):
+            usuarios.append(Usuario(len(usuarios) + 1, f'operador{i}', self.password_hash, f'Operador {i}',
+                                    f'operador{i}@prueba.local', 'operador', usuario_creador_id=admin.id))
+        for usuario in usuarios:
+            usuario.fecha_registro = self._momento(self.hoy - timedelta(days=800))
+        return usuarios
+
+    def _generar_prestamo(self, prestamo_id: int, cliente: Cliente) -> Prestamo:
+        tipos = list(TIPOS_INTERES)
+        tipo = self.azar.choices(tipos, [TIPOS_INTERES[t][0] for t in tipos])[0]
+        tasa_min, tasa_max = TIPOS_INTERES[tipo][1]
+        # Montos log-normales (mediana ~800) redondeados a 50
+        monto = min(20000, max(100, round(self.azar.lognormvariate(math.log(800), 0.8) / 50) * 50))
+        inicio = self.hoy - timedelta(days=self.azar.randint(0, 365))
+
+        prestamo = Prestamo(prestamo_id, cliente.id, Decimal(monto), Decimal(self.azar.randint(tasa_min, tasa_max)),
+                            self.azar.choice(PLAZOS_DIAS), tipo, inicio, "", cliente.usuario_id)
+        prestamo.fecha_creacion = self._momento(inicio)
+        return prestamo
+
+    def _generar_pagos(self, prestamo: Prestamo, pagos: List[Pago]):
+        """Pagos del préstamo hasta hoy: puntuales, atrasados o abandonados"""
+        cumplimiento = self.azar.choices(('puntual', 'atrasado', 'moroso'), (0.6, 0.3, 0.1))[0]
+        intervalo = 1 if prestamo.tipo_interes == 'gota_a_gota' else 7
+        cuota = prestamo.calcular_cuota_diaria() * intervalo
+        fin = prestamo.fecha_inicio + timedelta(days=prestamo.plazo_dias)
+        corte = min(self.hoy, fin + timedelta(days=30))
+        if cumplimiento == 'moroso':
+            corte = min(corte, prestamo.fecha_inicio + timedelta(days=prestamo.plazo_dias // 3))
+
+        dia = prestamo.fecha_inicio + timedelta(days=intervalo)
+        while dia <= corte and prestamo.estado == 'activo':
+            if cumplimiento == 'puntual' or self.azar.random() < 0.7:
+                saldo = prestamo.calcular_saldo_pendiente()
+                # Redondeo hacia arriba: la última cuota no deja fracciones de céntimo pendientes
+                monto = min(cuota, saldo).quantize(Decimal('0.01'), rounding=ROUND_UP)
+                if monto <= 0:
+                    break
+                pago = Pago(len(pagos) + 1, prestamo.id, monto, self._momento(dia), "Pago de cuota",
+                            prestamo.usuario_id)
+                pago.fecha_registro = pago.fecha
+                prestamo.agregar_pago(pago)
+                pagos.append(pago)
+            dia += timedelta(days=intervalo)
+
+        if prestamo.estado == 'activo' and fin < self.hoy:
+            if prestamo.tipo_interes == 'gota_a_gota' and cumplimiento == 'puntual':
+                # En gota a gota el capital se devuelve al final, fuera de las cuotas
+                prestamo.estado = 'pagado'
+            elif cumplimiento == 'moroso':
+                prestamo.estado = 'vencido'
+
+def guardar_json(datos: DatosSinteticos, data_dir: str):
+    """Escribe la cartera en los archivos JSON de la aplicación"""
+    from database import Database
+
+    db = Database(data_dir)
+    db._save_json(db.usuarios_file, [u.to_dict() for u in datos.usuarios])
+    db._save_json(db.clientes_file, [c.to_dict() for c in datos.clientes])
+    db._save_json(db.prestamos_file, [p.to_dict() for p in datos.prestamos])
+    db._save_json(db.pagos_file, [p.to_dict() for p in datos.pagos])
+    return db
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera una cartera sintética de prueba en archivos JSON")
+    parser.add_argument('directorio', help="Directorio de datos a crear")
+    parser.add_argument('--prestamos', type=int, default=1000)
+    parser.add_argument('--clientes', type=int, help="Por defecto, 2 clientes cada 5 préstamos")
+    parser.add_argument('--operadores', type=int, help="Por defecto, 1 cada 100 clientes")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--password', default=PASSWORD_PRUEBA, help="Contraseña de todos los usuarios generados")
+    parser.add_argument('--sobrescribir', action='store_true', help="Permitir reemplazar datos existentes")
+    args = parser.parse_args()
+
+    if os.path.exists(os.path.join(args.directorio, 'usuarios.json')) and not args.sobrescribir:
+        print(f"❌ {args.directorio} ya tiene datos; use --sobrescribir para reemplazarlos")
+        sys.exit(1)
+
+    print(f"🎲 Generando cartera (semilla {args.semilla})...")
+    datos = GeneradorDatos(args.semilla, password=args.password).generar(args.prestamos, args.clientes,
+                                                                         args.operadores)
+    guardar_json(datos, args.directorio)
+    resumen = ', '.join(f"{cantidad} {nombre}" for nombre, cantidad in datos.resumen().items())
+    print(f"✅ Datos guardados en {args.directorio}: {resumen}")
+
+if __name__ == "__main__":
+    main()
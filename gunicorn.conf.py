@@ -4,7 +4,13 @@ import os
 # Configuración del servidor
 bind = "0.0.0.0:10000"
 workers = 2
-worker_class = "sync"
+# gthread atiende cada conexión en un hilo, así los streams SSE (/api/eventos)
+# no bloquean el worker completo como ocurre con "sync". Cada stream ocupa un
+# hilo hasta 5 minutos: la app acepta como máximo SSE_MAXIMO_STREAMS (8 por
+# defecto) por worker y responde 503 al resto, para que queden hilos libres.
+# Si se cambian los hilos, mantener SSE_MAXIMO_STREAMS por debajo de threads.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 16))
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50
@@ -42,3 +48,21 @@ def on_reload(server):
 
 def on_exit(server):
     server.log.info("Cerrando Sistema de Préstamos...")
+
+def post_worker_init(worker):
+    # Con preload_app la aplicación se importa en el maestro, que no arranca hilos:
+    # cada worker arranca los suyos (cola de trabajos, etc.) sin esperar a la primera petición.
+    #
+    # Solo aplica a la app que registra app.extensions['hilos_segundo_plano']
+    # (app-BACKUP.py, la que tiene cola de trabajos y bandejas de salida). La
+    # app del Procfile (wsgi:app -> app_render.py) no tiene hilos en segundo
+    # plano y este hook no hace nada. Si la app se sirve envuelta en un
+    # middleware WSGI, worker.wsgi no es la app de Flask: los hilos arrancan
+    # igual en la primera petición (before_request), que sigue siendo el
+    # camino soportado para cualquier otro servidor.
+    iniciar = getattr(worker.wsgi, 'extensions', {}).get('hilos_segundo_plano')
+    if iniciar:
+        iniciar()
+        worker.log.info("Hilos en segundo plano iniciados en el worker %s", worker.pid)
+    else:
+        worker.log.debug("La aplicación no registra hilos en segundo plano")
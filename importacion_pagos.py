@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Importación Masiva de Pagos
+===========================
+
+Lectura de archivos de pagos (CSV o JSON) para PagoService.importar_pagos y
+línea de comandos para importarlos sin pasar por la web.
+
+Columnas: prestamo_id, monto y, opcionales, concepto y fecha (AAAA-MM-DD o
+AAAA-MM-DDTHH:MM). El JSON puede ser una lista de filas, un objeto con la
+clave "pagos" o una fila por línea (JSON lines).
+
+Uso: python importacion_pagos.py pagos.csv --usuario cobrador1 [--parcial]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from typing import Any, Dict, List, Union
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+def leer_pagos_csv(texto: str) -> List[Dict[str, Any]]:
+    """Filas de un CSV con encabezado (separado por coma o punto y coma)"""
+    try:
+        dialecto = csv.Sniffer().sniff(texto[:4096], delimiters=',;')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(io.StringIO(texto), dialect=dialecto)
+    lector.fieldnames = [(campo or '').strip().lower() for campo in lector.fieldnames or []]
+    return [fila for fila in lector if any((valor or '').strip() for valor in fila.values() if isinstance(valor, str))]
+
+def leer_pagos_json(texto: str) -> List[Dict[str, Any]]:
+    """Filas de un JSON (lista, objeto con "pagos" o JSON lines)"""
+    try:
+        datos = json.loads(texto)
+    except json.JSONDecodeError:
+        # JSON lines: un objeto por línea
+        datos = [json.loads(linea) for linea in texto.splitlines() if linea.strip()]
+    return filas_pagos(datos)
+
+def filas_pagos(datos: Any) -> List[Dict[str, Any]]:
+    """Filas de pagos de un JSON ya decodificado (lista u objeto con "pagos")"""
+    if isinstance(datos, dict):
+        datos = datos.get('pagos', [])
+    if not isinstance(datos, list) or not all(isinstance(fila, dict) for fila in datos):
+        raise ValueError("El JSON debe ser una lista de pagos")
+    return datos
+
+def leer_pagos(contenido: Union[bytes, str], nombre: str = '') -> List[Dict[str, Any]]:
+    """Filas de pagos de un archivo CSV o JSON (según la extensión o el contenido)"""
+    texto = contenido.decode('utf-8-sig') if isinstance(contenido, bytes) else contenido.lstrip('\ufeff')
+    extension = os.path.splitext(nombre.lower())[1]
+    if extension in ('.json', '.jsonl') or (not extension and texto.lstrip()[:1] in ('[', '{')):
+        return leer_pagos_json(texto)
+    return leer_pagos_csv(texto)
+
+def es_verdadero(valor: Any) -> bool:
+    """Opción booleana de un formulario o JSON ("false", "0" y "" son falsos)"""
+    if isinstance(valor, str):
+        return valor.strip().lower() in ('1', 'true', 'si', 'sí')
+    return bool(valor)
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa pagos desde un archivo CSV o JSON")
+    parser.add_argument('archivo', help="Archivo CSV o JSON con los pagos")
+    parser.add_argument('--usuario', required=True, help="Usuario (username) que registra los pagos")
+    parser.add_argument('--parcial', action='store_true',
+                        help="Guardar las filas válidas aunque otras tengan errores")
+    parser.add_argument('--data-dir', default='data', help="Directorio de datos (por defecto: data)")
+    args = parser.parse_args()
+
+    from database import Database
+    from services import PagoService
+
+    db = Database(args.data_dir)
+    usuario = db.obtener_usuario_por_username(args.usuario)
+    if not usuario:
+        print(f"❌ Usuario '{args.usuario}' no encontrado")
+        sys.exit(1)
+
+    with open(args.archivo, 'rb') as f:
+        filas = leer_pagos(f.read(), args.archivo)
+
+    print(f"💰 Importando {len(filas)} pagos como {usuario.username}...")
+    resultado = PagoService(db).importar_pagos(filas, usuario.id, usuario.rol == 'admin', args.parcial)
+
+    for fila in resultado['resultados']:
+        if not fila['ok']:
+            print(f"   ❌ Fila {fila['fila']}: {fila['error']}")
+
+    if resultado['aplicado']:
+        print(f"✅ {resultado['aplicados']} pagos registrados ({resultado['errores']} filas con errores)")
+    else:
+        print(f"⚠️ No se registró ningún pago: {resultado['errores']} filas con errores")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
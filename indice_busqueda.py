@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Índice de Búsqueda de Clientes
+==============================
+
+Índice en memoria para la búsqueda tipo "typeahead" de clientes. Evita
+recorrer y normalizar todos los clientes en cada tecla:
+
+- Tokens de nombre y apellido normalizados (minúsculas, sin acentos) en una
+  lista ordenada, para resolver prefijos con búsqueda binaria.
+- Trigramas de nombre, apellido y DNI, para encontrar coincidencias parciales
+  o con errores de tipeo cuando no hay coincidencias por prefijo.
+- DNI y teléfono (solo dígitos) ordenados, para búsqueda por prefijo numérico.
+
+A diferencia de la búsqueda anterior (subcadena en nombre, apellido o DNI),
+cada término se compara por prefijo de palabra: "ez" ya no encuentra a
+"Martinez". Si no hay coincidencias por prefijo, los términos de 3 letras o
+más se resuelven por trigramas (que cubren la mayoría de las subcadenas) y
+los más cortos con el recorrido por subcadena de antes.
+
+El índice no conoce reglas de visibilidad: quien consulta pasa un filtro, que
+se aplica antes de evaluar cada cliente.
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Puntajes por calidad de coincidencia de cada término
+PUNTAJE_EXACTO = 3.0
+PUNTAJE_PREFIJO = 2.0
+PUNTAJE_NUMERICO = 2.5
+PUNTAJE_SUBCADENA = 1.0
+
+# Máximo de candidatos verificados por consulta; acota la latencia en prefijos muy cortos
+LIMITE_CANDIDATOS = 500
+
+# Proporción mínima de trigramas compartidos para aceptar una coincidencia aproximada
+UMBRAL_TRIGRAMAS = 0.5
+
+# Dígitos de un celular sin código de país; se indexan aparte para buscar sin el +51
+DIGITOS_TELEFONO_NACIONAL = 9
+
+def normalizar(texto: str) -> str:
+    """Pasa a minúsculas, quita acentos y reemplaza signos por espacios"""
+    texto = texto or ''
+    if not texto.isascii():
+        texto = unicodedata.normalize('NFKD', texto)
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r'[^a-z0-9]+', ' ', texto.lower()).strip()
+
+def solo_digitos(texto: str) -> str:
+    """Extrae los dígitos de un texto (DNI, teléfono)"""
+    return re.sub(r'\D', '', texto or '')
+
+def claves_telefono(telefono: str) -> Set[str]:
+    """Dígitos del teléfono, con y sin código de país"""
+    digitos = solo_digitos(telefono)
+    if not digitos:
+        return set()
+    return {digitos, digitos[-DIGITOS_TELEFONO_NACIONAL:]}
+
+def trigramas(texto: str) -> Set[str]:
+    """Obtiene los trigramas de un texto normalizado"""
+    texto = f" {texto} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+class IndiceBusquedaClientes:
+    """Índice de prefijos y trigramas sobre nombre, apellido, DNI y teléfono de los clientes"""
+
+    def __init__(self):
+        self.limpiar()
+
+    def limpiar(self):
+        """Vacía el índice"""
+        self._clientes: Dict[int, Dict[str, Any]] = {}
+        self._tokens_cliente: Dict[int, Tuple[str, ...]] = {}
+        self._orden_cliente: Dict[int, Tuple[str, str]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._tokens_ordenados: List[str] = []
+        self._trigramas: Dict[str, Set[int]] = {}
+        self._dnis: List[Tuple[str, int]] = []
+        self._telefonos: List[Tuple[str, int]] = []
+
+    def __len__(self):
+        return len(self._clientes)
+
+    def construir(self, clientes: Iterable[Dict[str, Any]]):
+        """Reconstruye el índice completo a partir de los datos de clientes"""
+        self.limpiar()
+        for cliente_data in clientes:
+            self._indexar(cliente_data, ordenar=False)
+
+        self._tokens_ordenados = sorted(self._postings)
+        self._dnis.sort()
+        self._telefonos.sort()
+
+    def agregar(self, cliente_data: Dict[str, Any]):
+        """Agrega o reemplaza un cliente en el índice"""
+        self.eliminar(cliente_data['id'])
+        self._indexar(cliente_data, ordenar=True)
+
+    def eliminar(self, cliente_id: int):
+        """Quita un cliente del índice"""
+        cliente_data = self._clientes.pop(cliente_id, None)
+        if cliente_data is None:
+            return
+
+        tokens = self._tokens_cliente.pop(cliente_id)
+        del self._orden_cliente[cliente_id]
+        for token in tokens:
+            ids = self._postings[token]
+            ids.discard(cliente_id)
+            if not ids:
+                del self._postings[token]
+                posicion = bisect_left(self._tokens_ordenados, token)
+                del self._tokens_ordenados[posicion]
+
+        for trigrama in self._trigramas_cliente(tokens, cliente_data):
+            ids = self._trigramas.get(trigrama)
+            if ids is not None:
+                ids.discard(cliente_id)
+                if not ids:
+                    del self._trigramas[trigrama]
+
+        self._quitar_clave(self._dnis, solo_digitos(cliente_data.get('dni')), cliente_id)
+        for digitos in claves_telefono(cliente_data.get('telefono')):
+            self._quitar_clave(self._telefonos, digitos, cliente_id)
+
+    def buscar(self, termino: str, filtro: Optional[Callable[[Dict[str, Any]], bool]] = None,
+               limite: int = 20) -> List[Dict[str, Any]]:
+        """Busca clientes y devuelve los datos de los mejores `limite` resultados.
+
+        Cada término de la consulta debe coincidir con algún token (por prefijo)
+        o, si es numérico, con el DNI o el teléfono. Si ningún cliente coincide
+        por prefijo y algún término tiene menos de 3 caracteres (sin trigramas
+        propios) se busca como subcadena, como la búsqueda original; si no, o
+        si tampoco hay resultados, se recurre a la similitud por trigramas.
+        """
+        terminos = normalizar(termino).split()
+        if not terminos or limite <= 0:
+            return []
+
+        puntajes = self._buscar_por_prefijo(terminos, filtro)
+        if not puntajes and any(len(t) < 3 for t in terminos):
+            puntajes = self._buscar_por_subcadena(terminos, filtro)
+        if not puntajes:
+            puntajes = self._buscar_por_trigramas(' '.join(terminos), filtro)
+
+        def orden(cliente_id):
+            return (-puntajes[cliente_id], self._orden_cliente[cliente_id], cliente_id)
+
+        mejores = sorted(puntajes, key=orden)[:limite]
+        return [self._clientes[cliente_id] for cliente_id in mejores]
+
+    # Construcción
+    def _indexar(self, cliente_data: Dict[str, Any], ordenar: bool):
+        cliente_id = cliente_data['id']
+        self._clientes[cliente_id] = cliente_data
+
+        nombre = normalizar(cliente_data.get('nombre'))
+        apellido = normalizar(cliente_data.get('apellido'))
+        tokens = tuple(dict.fromkeys(f"{nombre} {apellido}".split()))
+        self._tokens_cliente[cliente_id] = tokens
+        self._orden_cliente[cliente_id] = (apellido, nombre)
+        for token in tokens:
+            if token not in self._postings:
+                self._postings[token] = set()
+                if ordenar:
+                    insort(self._tokens_ordenados, token)
+            self._postings[token].add(cliente_id)
+
+        for trigrama in self._trigramas_cliente(tokens, cliente_data):
+            self._trigramas.setdefault(trigrama, set()).add(cliente_id)
+
+        claves = [(self._dnis, solo_digitos(cliente_data.get('dni')))]
+        claves += [(self._telefonos, digitos) for digitos in claves_telefono(cliente_data.get('telefono'))]
+        for lista, digitos in claves:
+            if digitos:
+                if ordenar:
+                    insort(lista, (digitos, cliente_id))
+                else:
+                    lista.append((digitos, cliente_id))
+
+    @staticmethod
+    def _trigramas_cliente(tokens: Tuple[str, ...], cliente_data: Dict[str, Any]) -> Set[str]:
+        resultado = set()
+        for token in tokens:
+            resultado |= trigramas(token)
+        dni = solo_digitos(cliente_data.get('dni'))
+        if dni:
+            resultado |= trigramas(dni)
+        return resultado
+
+    @staticmethod
+    def _quitar_clave(lista: List[Tuple[str, int]], digitos: str, cliente_id: int):
+        if not digitos:
+            return
+        posicion = bisect_left(lista, (digitos, cliente_id))
+        if posicion < len(lista) and lista[posicion] == (digitos, cliente_id):
+            del lista[posicion]
+
+    # Consulta
+    def _ids_por_prefijo(self, termino: str) -> Iterator[int]:
+        """Recorre los clientes cuyo token empieza con el término, en orden alfabético del token"""
+        posicion = bisect_left(self._tokens_ordenados, termino)
+        while posicion < len(self._tokens_ordenados):
+            token = self._tokens_ordenados[posicion]
+            if not token.startswith(termino):
+                break
+            yield from self._postings[token]
+            posicion += 1
+
+    @staticmethod
+    def _ids_por_prefijo_numerico(lista: List[Tuple[str, int]], termino: str) -> Iterator[int]:
+        posicion = bisect_left(lista, (termino, -1))
+        while posicion < len(lista) and lista[posicion][0].startswith(termino):
+            yield lista[posicion][1]
+            posicion += 1
+
+    def _candidatos(self, termino: str) -> Iterator[int]:
+        if termino.isdigit():
+            yield from self._ids_por_prefijo_numerico(self._dnis, termino)
+            yield from self._ids_por_prefijo_numerico(self._telefonos, termino)
+        yield from self._ids_por_prefijo(termino)
+
+    def _puntaje_termino(self, cliente_id: int, termino: str) -> float:
+        """Puntaje de un término para un cliente (0 si no coincide)"""
+        cliente_data = self._clientes[cliente_id]
+        if termino.isdigit():
+            dni = solo_digitos(cliente_data.get('dni'))
+            if dni == termino:
+                return PUNTAJE_EXACTO
+            if dni.startswith(termino) or any(clave.startswith(termino)
+                                              for clave in claves_telefono(cliente_data.get('telefono'))):
+                return PUNTAJE_NUMERICO
+
+        puntaje = 0.0
+        for token in self._tokens_cliente[cliente_id]:
+            if token == termino:
+                return PUNTAJE_EXACTO
+            if token.startswith(termino):
+                puntaje = PUNTAJE_PREFIJO
+        return puntaje
+
+    def _buscar_por_prefijo(self, terminos: List[str], filtro) -> Dict[int, float]:
+        # Los candidatos salen del término más largo (normalmente el más selectivo)
+        # y se verifican contra el resto de los términos
+        principal = max(terminos, key=len)
+        puntajes: Dict[int, float] = {}
+        vistos: Set[int] = set()
+
+        for cliente_id in self._candidatos(principal):
+            if cliente_id in vistos:
+                continue
+            vistos.add(cliente_id)
+            if filtro is not None and not filtro(self._clientes[cliente_id]):
+                continue
+
+            total = 0.0
+            for termino in terminos:
+                puntaje = self._puntaje_termino(cliente_id, termino)
+                if not puntaje:
+                    break
+                total += puntaje
+            else:
+                puntajes[cliente_id] = total
+                if len(puntajes) >= LIMITE_CANDIDATOS:
+                    break
+
+        return puntajes
+
+    def _buscar_por_subcadena(self, terminos: List[str], filtro) -> Dict[int, float]:
+        # Recorre los clientes visibles: solo se usa con términos cortos sin
+        # coincidencias por prefijo, que no tienen trigramas con qué buscar
+        puntajes: Dict[int, float] = {}
+        for cliente_id, cliente_data in self._clientes.items():
+            if filtro is not None and not filtro(cliente_data):
+                continue
+            textos = [' '.join(self._tokens_cliente[cliente_id]), solo_digitos(cliente_data.get('dni'))]
+            textos += claves_telefono(cliente_data.get('telefono'))
+            if all(any(termino in texto for texto in textos) for termino in terminos):
+                puntajes[cliente_id] = PUNTAJE_SUBCADENA * len(terminos)
+                if len(puntajes) >= LIMITE_CANDIDATOS:
+                    break
+        return puntajes
+
+    def _buscar_por_trigramas(self, consulta: str, filtro) -> Dict[int, float]:
+        consulta_trigramas = set()
+        for termino in consulta.split():
+            if len(termino) >= 3:
+                consulta_trigramas |= trigramas(termino)
+        if not consulta_trigramas:
+            return {}
+
+        # El filtro se evalúa una vez por cliente, la primera vez que aparece
+        coincidencias: Dict[int, int] = {}
+        descartados: Set[int] = set()
+        for trigrama in consulta_trigramas:
+            for cliente_id in self._trigramas.get(trigrama, ()):
+                if cliente_id in descartados:
+                    continue
+                if cliente_id not in coincidencias:
+                    if filtro is not None and not filtro(self._clientes[cliente_id]):
+                        descartados.add(cliente_id)
+                        continue
+                    coincidencias[cliente_id] = 0
+                coincidencias[cliente_id] += 1
+
+        puntajes = {}
+        for cliente_id, cantidad in coincidencias.items():
+            similitud = cantidad / len(consulta_trigramas)
+            if similitud >= UMBRAL_TRIGRAMAS:
+                puntajes[cliente_id] = similitud
+        return puntajes
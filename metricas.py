@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Métricas de la Aplicación
+=========================
+
+Registro en memoria de métricas por ruta, expuesto en formato de texto de
+Prometheus:
+
+- Latencia de cada petición (histograma) y cantidad de peticiones por estado.
+- Lecturas y escrituras de archivos JSON (_load_json/_save_json) y bytes.
+- Aciertos y fallos de cachés (ETag, índice de búsqueda, etc.).
+- Pool de conexiones a PostgreSQL: préstamos de conexiones, tiempo de espera,
+  veces que el pool estuvo agotado y conexiones en uso / libres.
+
+Las operaciones de E/S y de caché se atribuyen a la ruta de la petición en
+curso (o a "sin_peticion" fuera de una petición, p. ej. scripts o hilos).
+Las métricas son por proceso: con varios workers de gunicorn cada uno expone
+las suyas y Prometheus las suma por la etiqueta `pid`.
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, Tuple
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SIN_PETICION = 'sin_peticion'
+
+# Contadores del pool de conexiones y su descripción
+CONTADORES_POOL = (
+    ('checkouts', 'Conexiones pedidas al pool'),
+    ('espera_segundos', 'Segundos esperando una conexión libre'),
+    ('agotado', 'Pedidos que encontraron el pool sin conexiones libres'),
+    ('sin_conexion', 'Pedidos que fallaron por vencer la espera'),
+)
+
+class Metricas:
+    """Contadores e histogramas de la aplicación, seguros entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contexto = threading.local()
+        self._latencias: Dict[Tuple[str, str], list] = {}
+        self._peticiones: Dict[Tuple[str, str, str], int] = {}
+        self._operaciones_json: Dict[Tuple[str, str], int] = {}
+        self._bytes_json: Dict[Tuple[str, str], int] = {}
+        self._cache: Dict[Tuple[str, str, str], int] = {}
+        self._pool_contadores: Dict[Tuple[str, str], float] = {}
+        self._pool_conexiones: Dict[Tuple[str, str], int] = {}
+
+    # Contexto de la petición en curso
+    def iniciar_peticion(self, ruta: str):
+        """Marca la ruta a la que se atribuyen las operaciones de este hilo"""
+        self._contexto.ruta = ruta
+
+    def finalizar_peticion(self):
+        self._contexto.ruta = None
+
+    @property
+    def ruta_actual(self) -> str:
+        return getattr(self._contexto, 'ruta', None) or SIN_PETICION
+
+    # Registro
+    def registrar_peticion(self, ruta: str, metodo: str, estado: int, duracion: float):
+        """Registra la latencia y el estado de una petición"""
+        with self._lock:
+            histograma = self._latencias.get((ruta, metodo))
+            if histograma is None:
+                # Conteo por bucket + suma + cantidad
+                histograma = self._latencias[(ruta, metodo)] = [[0] * len(BUCKETS_LATENCIA), 0.0, 0]
+            indice = bisect_left(BUCKETS_LATENCIA, duracion)
+            if indice < len(BUCKETS_LATENCIA):
+                histograma[0][indice] += 1
+            histograma[1] += duracion
+            histograma[2] += 1
+
+            clave = (ruta, metodo, str(estado))
+            self._peticiones[clave] = self._peticiones.get(clave, 0) + 1
+
+    def registrar_json(self, operacion: str, cantidad_bytes: int):
+        """Registra una lectura ('lectura') o escritura ('escritura') de archivo JSON"""
+        clave = (self.ruta_actual, operacion)
+        with self._lock:
+            self._operaciones_json[clave] = self._operaciones_json.get(clave, 0) + 1
+            self._bytes_json[clave] = self._bytes_json.get(clave, 0) + cantidad_bytes
+
+    def registrar_cache(self, cache: str, acierto: bool):
+        """Registra un acierto o fallo de la caché indicada"""
+        clave = (self.ruta_actual, cache, 'acierto' if acierto else 'fallo')
+        with self._lock:
+            self._cache[clave] = self._cache.get(clave, 0) + 1
+
+    def registrar_checkout_pool(self, pool: str, espera: float, agotado: bool, expirado: bool = False):
+        """Registra un pedido de conexión: segundos de espera, si el pool estaba lleno y si venció la espera"""
+        with self._lock:
+            for contador, valor in (('checkouts', 1), ('espera_segundos', espera), ('agotado', int(agotado)),
+                                    ('sin_conexion', int(expirado))):
+                clave = (pool, contador)
+                self._pool_contadores[clave] = self._pool_contadores.get(clave, 0) + valor
+
+    def registrar_conexiones_pool(self, pool: str, en_uso: int, libres: int):
+        """Actualiza la cantidad de conexiones en uso y libres del pool"""
+        with self._lock:
+            self._pool_conexiones[(pool, 'en_uso')] = en_uso
+            self._pool_conexiones[(pool, 'libres')] = libres
+
+    # Exposición
+    def exportar_prometheus(self) -> str:
+        """Genera el texto de exposición de Prometheus"""
+        pid = str(os.getpid())
+        lineas = []
+
+        def etiquetas(**valores):
+            pares = [f'{k}="{_escapar(v)}"' for k, v in valores.items()]
+            return '{' + ','.join(pares) + '}'
+
+        with self._lock:
+            lineas.append('# HELP prestamos_http_request_duration_seconds Latencia de las peticiones HTTP por ruta')
+            lineas.append('# TYPE prestamos_http_request_duration_seconds histogram')
+            for (ruta, metodo), (buckets, suma, cantidad) in sorted(self._latencias.items()):
+                acumulado = 0
+                for limite, conteo in zip(BUCKETS_LATENCIA, buckets):
+                    acumulado += conteo
+                    lineas.append('prestamos_http_request_duration_seconds_bucket'
+                                  f'{etiquetas(pid=pid, ruta=ruta, metodo=metodo, le=repr(limite))} {acumulado}')
+                lineas.append('prestamos_http_request_duration_seconds_bucket'
+                              f'{etiquetas(pid=pid, ruta=ruta, metodo=metodo, le="+Inf")} {cantidad}')
+                lineas.append('prestamos_http_request_duration_seconds_sum'
+                              f'{etiquetas(pid=pid, ruta=ruta, metodo=metodo)} {suma:.6f}')
+                lineas.append('prestamos_http_request_duration_seconds_count'
+                              f'{etiquetas(pid=pid, ruta=ruta, metodo=metodo)} {cantidad}')
+
+            lineas.append('# HELP prestamos_http_requests_total Peticiones HTTP por ruta y estado')
+            lineas.append('# TYPE prestamos_http_requests_total counter')
+            for (ruta, metodo, estado), valor in sorted(self._peticiones.items()):
+                lineas.append('prestamos_http_requests_total'
+                              f'{etiquetas(pid=pid, ruta=ruta, metodo=metodo, estado=estado)} {valor}')
+
+            lineas.append('# HELP prestamos_json_operaciones_total Lecturas y escrituras de archivos JSON')
+            lineas.append('# TYPE prestamos_json_operaciones_total counter')
+            for (ruta, operacion), valor in sorted(self._operaciones_json.items()):
+                lineas.append('prestamos_json_operaciones_total'
+                              f'{etiquetas(pid=pid, ruta=ruta, operacion=operacion)} {valor}')
+
+            lineas.append('# HELP prestamos_json_bytes_total Bytes leídos y escritos en archivos JSON')
+            lineas.append('# TYPE prestamos_json_bytes_total counter')
+            for (ruta, operacion), valor in sorted(self._bytes_json.items()):
+                lineas.append('prestamos_json_bytes_total'
+                              f'{etiquetas(pid=pid, ruta=ruta, operacion=operacion)} {valor}')
+
+            lineas.append('# HELP prestamos_cache_total Aciertos y fallos de caché')
+            lineas.append('# TYPE prestamos_cache_total counter')
+            for (ruta, cache, resultado), valor in sorted(self._cache.items()):
+                lineas.append('prestamos_cache_total'
+                              f'{etiquetas(pid=pid, ruta=ruta, cache=cache, resultado=resultado)} {valor}')
+
+            for contador, descripcion in CONTADORES_POOL:
+                nombre = f'prestamos_db_pool_{contador}_total'
+                lineas.append(f'# HELP {nombre} {descripcion}')
+                lineas.append(f'# TYPE {nombre} counter')
+                for (pool, clave), valor in sorted(self._pool_contadores.items()):
+                    if clave == contador:
+                        valor = f'{valor:.6f}' if contador == 'espera_segundos' else int(valor)
+                        lineas.append(f'{nombre}{etiquetas(pid=pid, pool=pool)} {valor}')
+
+            lineas.append('# HELP prestamos_db_pool_conexiones Conexiones del pool en uso y libres')
+            lineas.append('# TYPE prestamos_db_pool_conexiones gauge')
+            for (pool, estado), valor in sorted(self._pool_conexiones.items()):
+                lineas.append(f'prestamos_db_pool_conexiones{etiquetas(pid=pid, pool=pool, estado=estado)} {valor}')
+
+        return '\n'.join(lineas) + '\n'
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Instancia compartida por la capa de datos y la aplicación web
+metricas = Metricas()
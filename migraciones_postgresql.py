@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Migraciones del Esquema PostgreSQL
+==================================
+
+Cambios de esquema versionados (índices, tablas auxiliares, etc.) que se
+aplican en orden sobre las tablas creadas por migrate_to_postgresql.py:
+
+- Cada migración tiene un número de versión y se aplica una sola vez; las
+  versiones aplicadas quedan registradas en la tabla schema_migraciones.
+- Cada migración corre en su propia transacción junto con su registro: si
+  falla no queda a medias ni marcada como aplicada.
+- Un advisory lock evita que dos procesos (p. ej. dos workers arrancando a
+  la vez) apliquen las migraciones al mismo tiempo.
+
+Para agregar una migración basta con sumar una entrada al final de
+MIGRACIONES con la versión siguiente; nunca se modifica una ya publicada.
+
+Uso: python migraciones_postgresql.py [--estado]
+"""
+
+import argparse
+import os
+import sys
+from typing import List, NamedTuple, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Clave del advisory lock que serializa las migraciones
+CLAVE_LOCK_MIGRACIONES = 72841001
+
+class Migracion(NamedTuple):
+    version: int
+    descripcion: str
+    sentencias: Tuple[str, ...]
+
+MIGRACIONES: List[Migracion] = [
+    Migracion(1, "Índices base por columna", (
+        "CREATE INDEX IF NOT EXISTS idx_usuarios_rol ON usuarios(rol)",
+        "CREATE INDEX IF NOT EXISTS idx_clientes_usuario_id ON clientes(usuario_id)",
+        "CREATE INDEX IF NOT EXISTS idx_clientes_nombre_apellido ON clientes(nombre, apellido)",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_cliente_id ON prestamos(cliente_id)",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_fecha_vencimiento ON prestamos(fecha_vencimiento)",
+        "CREATE INDEX IF NOT EXISTS idx_pagos_fecha_pago ON pagos(fecha_pago)",
+    )),
+    Migracion(2, "Índices compuestos y parciales para las consultas por dueño y estado", (
+        # Préstamos de un dueño por estado, ordenados por fecha (listados y estadísticas)
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_usuario_estado_fecha "
+        "ON prestamos(usuario_id, estado, fecha_creacion DESC)",
+        # Préstamos activos: la mayoría de las pantallas solo lee estos
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_activos_usuario_fecha "
+        "ON prestamos(usuario_id, fecha_creacion DESC) WHERE estado = 'activo'",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_activos_fecha "
+        "ON prestamos(fecha_creacion DESC) WHERE estado = 'activo'",
+        # Historial de pagos de un préstamo (también sirve a los JOIN por prestamo_id)
+        "CREATE INDEX IF NOT EXISTS idx_pagos_prestamo_fecha ON pagos(prestamo_id, fecha_pago DESC)",
+        # Clientes activos de un dueño en orden alfabético
+        "CREATE INDEX IF NOT EXISTS idx_clientes_activos_usuario_nombre "
+        "ON clientes(usuario_id, nombre, apellido) WHERE activo",
+        # Reemplazados por los compuestos o por las restricciones UNIQUE
+        "DROP INDEX IF EXISTS idx_pagos_prestamo_id",
+        "DROP INDEX IF EXISTS idx_prestamos_estado",
+        "DROP INDEX IF EXISTS idx_usuarios_username",
+        "DROP INDEX IF EXISTS idx_usuarios_email",
+        "DROP INDEX IF EXISTS idx_clientes_dni",
+    )),
+    Migracion(3, "Tablas de resumen por dueño mantenidas con triggers", (
+        # Préstamos por dueño (usuario_id NULL se acumula en 0)
+        """
+        CREATE TABLE IF NOT EXISTS resumen_prestamos (
+            usuario_id INTEGER PRIMARY KEY,
+            total_prestamos BIGINT NOT NULL DEFAULT 0,
+            prestamos_activos BIGINT NOT NULL DEFAULT 0,
+            prestamos_pagados BIGINT NOT NULL DEFAULT 0,
+            prestamos_vencidos BIGINT NOT NULL DEFAULT 0,
+            monto_total_activo NUMERIC NOT NULL DEFAULT 0,
+            suma_tasas NUMERIC NOT NULL DEFAULT 0
+        )
+        """,
+        # Pagos por dueño del préstamo
+        """
+        CREATE TABLE IF NOT EXISTS resumen_pagos (
+            usuario_id INTEGER PRIMARY KEY,
+            total_pagos BIGINT NOT NULL DEFAULT 0,
+            monto_total_pagado NUMERIC NOT NULL DEFAULT 0,
+            pagos_cuota BIGINT NOT NULL DEFAULT 0,
+            pagos_adelanto BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        # Suma (signo 1) o resta (signo -1) el aporte de un préstamo
+        """
+        CREATE OR REPLACE FUNCTION resumen_prestamos_aplicar(p_usuario INTEGER, p_signo INTEGER,
+                                                             p_estado VARCHAR, p_restante NUMERIC,
+                                                             p_tasa NUMERIC) RETURNS VOID AS $$
+        BEGIN
+            INSERT INTO resumen_prestamos AS r (usuario_id, total_prestamos, prestamos_activos,
+                                                prestamos_pagados, prestamos_vencidos,
+                                                monto_total_activo, suma_tasas)
+            VALUES (COALESCE(p_usuario, 0), p_signo,
+                    CASE WHEN p_estado = 'activo' THEN p_signo ELSE 0 END,
+                    CASE WHEN p_estado = 'pagado' THEN p_signo ELSE 0 END,
+                    CASE WHEN p_estado = 'vencido' THEN p_signo ELSE 0 END,
+                    CASE WHEN p_estado = 'activo' THEN p_signo * p_restante ELSE 0 END,
+                    p_signo * p_tasa)
+            ON CONFLICT (usuario_id) DO UPDATE SET
+                total_prestamos = r.total_prestamos + EXCLUDED.total_prestamos,
+                prestamos_activos = r.prestamos_activos + EXCLUDED.prestamos_activos,
+                prestamos_pagados = r.prestamos_pagados + EXCLUDED.prestamos_pagados,
+                prestamos_vencidos = r.prestamos_vencidos + EXCLUDED.prestamos_vencidos,
+                monto_total_activo = r.monto_total_activo + EXCLUDED.monto_total_activo,
+                suma_tasas = r.suma_tasas + EXCLUDED.suma_tasas;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Suma o resta el aporte de uno o varios pagos
+        """
+        CREATE OR REPLACE FUNCTION resumen_pagos_aplicar(p_usuario INTEGER, p_cantidad BIGINT, p_monto NUMERIC,
+                                                         p_cuota BIGINT, p_adelanto BIGINT) RETURNS VOID AS $$
+        BEGIN
+            INSERT INTO resumen_pagos AS r (usuario_id, total_pagos, monto_total_pagado, pagos_cuota, pagos_adelanto)
+            VALUES (COALESCE(p_usuario, 0), p_cantidad, p_monto, p_cuota, p_adelanto)
+            ON CONFLICT (usuario_id) DO UPDATE SET
+                total_pagos = r.total_pagos + EXCLUDED.total_pagos,
+                monto_total_pagado = r.monto_total_pagado + EXCLUDED.monto_total_pagado,
+                pagos_cuota = r.pagos_cuota + EXCLUDED.pagos_cuota,
+                pagos_adelanto = r.pagos_adelanto + EXCLUDED.pagos_adelanto;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION resumen_prestamos_trigger() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM resumen_prestamos_aplicar(OLD.usuario_id, -1, OLD.estado, OLD.monto_restante,
+                                                  OLD.tasa_interes);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM resumen_prestamos_aplicar(NEW.usuario_id, 1, NEW.estado, NEW.monto_restante,
+                                                  NEW.tasa_interes);
+            END IF;
+            -- Si el préstamo cambia de dueño, sus pagos pasan al resumen del nuevo dueño
+            IF TG_OP = 'UPDATE' AND OLD.usuario_id IS DISTINCT FROM NEW.usuario_id THEN
+                PERFORM resumen_pagos_aplicar(OLD.usuario_id, -t.cantidad, -t.monto, -t.cuota, -t.adelanto),
+                        resumen_pagos_aplicar(NEW.usuario_id, t.cantidad, t.monto, t.cuota, t.adelanto)
+                FROM (SELECT COUNT(*) AS cantidad, COALESCE(SUM(monto), 0) AS monto,
+                             COUNT(*) FILTER (WHERE tipo_pago = 'cuota') AS cuota,
+                             COUNT(*) FILTER (WHERE tipo_pago = 'adelanto') AS adelanto
+                      FROM pagos WHERE prestamo_id = NEW.id) t
+                WHERE t.cantidad > 0;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION resumen_pagos_trigger() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM resumen_pagos_aplicar((SELECT usuario_id FROM prestamos WHERE id = OLD.prestamo_id),
+                                              -1, -OLD.monto,
+                                              CASE WHEN OLD.tipo_pago = 'cuota' THEN -1 ELSE 0 END,
+                                              CASE WHEN OLD.tipo_pago = 'adelanto' THEN -1 ELSE 0 END);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM resumen_pagos_aplicar((SELECT usuario_id FROM prestamos WHERE id = NEW.prestamo_id),
+                                              1, NEW.monto,
+                                              CASE WHEN NEW.tipo_pago = 'cuota' THEN 1 ELSE 0 END,
+                                              CASE WHEN NEW.tipo_pago = 'adelanto' THEN 1 ELSE 0 END);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_resumen_prestamos ON prestamos",
+        "CREATE TRIGGER trg_resumen_prestamos AFTER INSERT OR UPDATE OR DELETE ON prestamos "
+        "FOR EACH ROW EXECUTE FUNCTION resumen_prestamos_trigger()",
+        "DROP TRIGGER IF EXISTS trg_resumen_pagos ON pagos",
+        "CREATE TRIGGER trg_resumen_pagos AFTER INSERT OR UPDATE OR DELETE ON pagos "
+        "FOR EACH ROW EXECUTE FUNCTION resumen_pagos_trigger()",
+        # Carga inicial: los triggers ya bloquean las escrituras hasta el commit, así que no se cuenta nada dos veces
+        "TRUNCATE resumen_prestamos, resumen_pagos",
+        """
+        INSERT INTO resumen_prestamos (usuario_id, total_prestamos, prestamos_activos, prestamos_pagados,
+                                       prestamos_vencidos, monto_total_activo, suma_tasas)
+        SELECT COALESCE(usuario_id, 0), COUNT(*),
+               COUNT(*) FILTER (WHERE estado = 'activo'),
+               COUNT(*) FILTER (WHERE estado = 'pagado'),
+               COUNT(*) FILTER (WHERE estado = 'vencido'),
+               COALESCE(SUM(monto_restante) FILTER (WHERE estado = 'activo'), 0),
+               SUM(tasa_interes)
+        FROM prestamos GROUP BY COALESCE(usuario_id, 0)
+        """,
+        """
+        INSERT INTO resumen_pagos (usuario_id, total_pagos, monto_total_pagado, pagos_cuota, pagos_adelanto)
+        SELECT COALESCE(pr.usuario_id, 0), COUNT(*), SUM(p.monto),
+               COUNT(*) FILTER (WHERE p.tipo_pago = 'cuota'),
+               COUNT(*) FILTER (WHERE p.tipo_pago = 'adelanto')
+        FROM pagos p LEFT JOIN prestamos pr ON p.prestamo_id = pr.id
+        GROUP BY COALESCE(pr.usuario_id, 0)
+        """,
+    )),
+]
+
+def _crear_tabla_versiones(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migraciones (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT NOT NULL,
+            fecha_aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def versiones_aplicadas(conexion) -> List[int]:
+    """Versiones ya registradas en schema_migraciones"""
+    with conexion.cursor() as cursor:
+        _crear_tabla_versiones(cursor)
+        cursor.execute("SELECT version FROM schema_migraciones ORDER BY version")
+        versiones = [fila[0] for fila in cursor.fetchall()]
+    conexion.commit()
+    return versiones
+
+def aplicar_migraciones(conexion, hasta: int = None) -> List[int]:
+    """Aplica en orden las migraciones pendientes; devuelve las versiones aplicadas"""
+    aplicadas = []
+    with conexion.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (CLAVE_LOCK_MIGRACIONES,))
+    conexion.commit()
+    try:
+        # Leer las versiones con el lock tomado: otro proceso pudo aplicar alguna mientras esperábamos
+        registradas = set(versiones_aplicadas(conexion))
+        for migracion in MIGRACIONES:
+            if migracion.version in registradas or (hasta is not None and migracion.version > hasta):
+                continue
+            print(f"🔄 Migración {migracion.version}: {migracion.descripcion}")
+            try:
+                with conexion.cursor() as cursor:
+                    for sentencia in migracion.sentencias:
+                        cursor.execute(sentencia)
+                    cursor.execute("INSERT INTO schema_migraciones (version, descripcion) VALUES (%s, %s)",
+                                   (migracion.version, migracion.descripcion))
+                conexion.commit()
+            except Exception:
+                conexion.rollback()
+                print(f"❌ Error en la migración {migracion.version}")
+                raise
+            aplicadas.append(migracion.version)
+    finally:
+        with conexion.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (CLAVE_LOCK_MIGRACIONES,))
+        conexion.commit()
+
+    if aplicadas:
+        print(f"✅ Migraciones aplicadas: {', '.join(map(str, aplicadas))}")
+    else:
+        print("✅ El esquema ya está actualizado")
+    return aplicadas
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica las migraciones pendientes del esquema PostgreSQL")
+    parser.add_argument('--estado', action='store_true', help="Solo mostrar las migraciones aplicadas y pendientes")
+    parser.add_argument('--hasta', type=int, help="Aplicar solo hasta esta versión")
+    args = parser.parse_args()
+
+    import psycopg2
+    from config_database import DatabaseConfig
+
+    if not DatabaseConfig.is_postgresql():
+        print("❌ DATABASE_URL no apunta a PostgreSQL")
+        sys.exit(1)
+
+    conexion = psycopg2.connect(DatabaseConfig.get_database_url())
+    try:
+        if args.estado:
+            registradas = set(versiones_aplicadas(conexion))
+            for migracion in MIGRACIONES:
+                marca = '✅' if migracion.version in registradas else '⏳'
+                print(f"{marca} {migracion.version}: {migracion.descripcion}")
+        else:
+            aplicar_migraciones(conexion, args.hasta)
+    finally:
+        conexion.close()
+
+if __name__ == "__main__":
+    main()
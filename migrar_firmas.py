@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Script para registrar en los préstamos las firmas digitales existentes
+=====================================================================
+
+Antes las firmas solo se guardaban como archivos static/firmas/
+firma_prestamo_<id>_<fecha>.png y se buscaban recorriendo la carpeta. Este
+script recorre la carpeta una única vez y registra en cada préstamo su firma
+más reciente (ruta y hash); las anteriores pasan a la lista de firmas
+reemplazadas y se aplica la política de retención.
+
+Uso: python migrar_firmas.py [conservar_anteriores]
+"""
+
+import os
+import re
+import sys
+
+from cache_pdf import hash_archivo
+from database import Database
+from firmas import GestorFirmas
+
+PATRON_FIRMA = re.compile(r'^firma_prestamo_(\d+)_(.+)\.png$')
+
+def migrar_firmas(conservar_anteriores: int = 2):
+    """Registra en los préstamos las firmas que solo existían como archivo"""
+    print("🔄 Registrando firmas digitales en los préstamos...")
+
+    db = Database()
+    gestor = GestorFirmas(conservar_anteriores=conservar_anteriores)
+
+    # Agrupar los archivos por préstamo
+    firmas_por_prestamo = {}
+    for archivo in os.listdir(gestor.directorio):
+        coincidencia = PATRON_FIRMA.match(archivo)
+        if coincidencia:
+            prestamo_id = int(coincidencia.group(1))
+            firmas_por_prestamo.setdefault(prestamo_id, []).append(os.path.join(gestor.directorio, archivo))
+
+    print(f"📊 Préstamos con firmas en la carpeta: {len(firmas_por_prestamo)}")
+
+    prestamos = {p['id']: p for p in db._load_json(db.prestamos_file)}
+    registradas = eliminadas = 0
+
+    for prestamo_id, rutas in sorted(firmas_por_prestamo.items()):
+        prestamo = prestamos.get(prestamo_id)
+        if not prestamo:
+            print(f"   ⚠️  Préstamo #{prestamo_id} no existe, se omiten {len(rutas)} firmas")
+            continue
+        if prestamo.get('firma_path'):
+            continue
+
+        # El nombre incluye la fecha: el orden alfabético es el cronológico
+        for ruta in sorted(rutas):
+            descartadas = db.registrar_firma_prestamo(prestamo_id, ruta, hash_archivo(ruta), conservar_anteriores)
+            gestor.eliminar(descartadas or [])
+            eliminadas += len(descartadas or [])
+
+        registradas += 1
+        print(f"   📝 Préstamo #{prestamo_id}: firma vigente {os.path.basename(sorted(rutas)[-1])}")
+
+    print(f"✅ Migración completada: {registradas} préstamos con firma registrada, "
+          f"{eliminadas} firmas antiguas eliminadas")
+
+if __name__ == "__main__":
+    migrar_firmas(int(sys.argv[1]) if len(sys.argv) > 1 else 2)
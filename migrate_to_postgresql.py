@@ -2,22 +2,72 @@
 """
 Script de migración de SQLite a PostgreSQL
 Este script migra todos los datos de los archivos JSON a PostgreSQL
+
+Cada tabla se copia con COPY en lotes (--lote); el avance queda en la tabla
+migracion_progreso, así una migración interrumpida sigue donde quedó al
+volver a ejecutarla (--reiniciar copia todo de nuevo).
+
+Uso: python migrate_to_postgresql.py [--lote 5000] [--reiniciar] [--data-dir data]
 """
 
+import argparse
+import io
 import os
 import json
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 import sys
 
+from migraciones_postgresql import aplicar_migraciones
+
 # Cargar variables de entorno
 load_dotenv()
 
+# Registros por lote de COPY (cada lote se confirma por separado)
+TAMANO_LOTE = 5000
+
+def _valor_copy(valor) -> str:
+    """Valor en el formato de texto de COPY (\\N es NULL)"""
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, bool):
+        return 't' if valor else 'f'
+    return (str(valor).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+# Tabla -> (archivo JSON, columnas, valores de un registro en el orden de las columnas)
+TABLAS = {
+    'usuarios': ('usuarios.json',
+                 ('id', 'username', 'password_hash', 'nombre', 'email', 'rol', 'activo', 'fecha_creacion'),
+                 lambda u: (u['id'], u['username'], u['password_hash'], u['nombre'], u.get('email'),
+                            u['rol'], u['activo'], u.get('fecha_creacion'))),
+    'clientes': ('clientes.json',
+                 ('id', 'dni', 'nombre', 'apellido', 'telefono', 'email', 'direccion', 'usuario_id',
+                  'usuario_creador_id', 'fecha_creacion', 'activo'),
+                 lambda c: (c['id'], c['dni'], c['nombre'], c['apellido'], c.get('telefono'), c.get('email'),
+                            c.get('direccion'), c.get('usuario_id'), c.get('usuario_creador_id'),
+                            c.get('fecha_creacion'), c.get('activo', True))),
+    'prestamos': ('prestamos.json',
+                  ('id', 'cliente_id', 'monto_original', 'monto_restante', 'tasa_interes', 'plazo_meses',
+                   'fecha_inicio', 'fecha_vencimiento', 'estado', 'usuario_id', 'usuario_creador_id',
+                   'fecha_creacion', 'observaciones'),
+                  lambda p: (p['id'], p['cliente_id'], p['monto_original'], p['monto_restante'],
+                             p['tasa_interes'], p['plazo_meses'], p['fecha_inicio'], p['fecha_vencimiento'],
+                             p.get('estado', 'activo'), p.get('usuario_id'), p.get('usuario_creador_id'),
+                             p.get('fecha_creacion'), p.get('observaciones'))),
+    'pagos': ('pagos.json',
+              ('id', 'prestamo_id', 'monto', 'fecha_pago', 'tipo_pago', 'usuario_id', 'fecha_creacion',
+               'observaciones'),
+              lambda p: (p['id'], p['prestamo_id'], p['monto'], p['fecha_pago'], p.get('tipo_pago', 'cuota'),
+                         p.get('usuario_id'), p.get('fecha_creacion'), p.get('observaciones'))),
+}
+
 class PostgreSQLMigrator:
     """Clase para migrar datos de SQLite/JSON a PostgreSQL"""
     
-    def __init__(self):
+    def __init__(self, data_dir: str = 'data', tamano_lote: int = TAMANO_LOTE, reiniciar: bool = False):
         self.database_url = os.getenv('DATABASE_URL')
         if not self.database_url:
             print("❌ Error: DATABASE_URL no está configurada")
@@ -27,6 +77,10 @@ class PostgreSQLMigrator:
         if self.database_url.startswith('postgres://'):
             self.database_url = self.database_url.replace('postgres://', 'postgresql://', 1)
         
+        self.data_dir = data_dir
+        self.tamano_lote = tamano_lote
+        self.reiniciar = reiniciar
+        
         self.connection = None
         self.cursor = None
     
@@ -135,205 +189,127 @@ class PostgreSQLMigrator:
             self.connection.rollback()
             raise
     
-    def migrate_usuarios(self):
-        """Migra usuarios desde JSON a PostgreSQL"""
+    def _preparar_progreso(self):
+        """Tabla con el avance de cada tabla migrada (para poder reanudar)"""
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS migracion_progreso (
+                tabla VARCHAR(50) PRIMARY KEY,
+                ultimo_id INTEGER NOT NULL DEFAULT 0,
+                filas INTEGER NOT NULL DEFAULT 0,
+                completada BOOLEAN NOT NULL DEFAULT FALSE,
+                fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        if self.reiniciar:
+            self.cursor.execute("DELETE FROM migracion_progreso")
+        self.connection.commit()
+    
+    def _leer_progreso(self, tabla: str):
+        self.cursor.execute("SELECT ultimo_id, filas, completada FROM migracion_progreso WHERE tabla = %s", (tabla,))
+        fila = self.cursor.fetchone()
+        return (fila['ultimo_id'], fila['filas'], fila['completada']) if fila else (0, 0, False)
+    
+    def _migrar_tabla(self, tabla: str):
+        """Copia una tabla desde su JSON con COPY, de a lotes y reanudable
+        
+        Cada lote se copia a una tabla temporal y de ahí se inserta con
+        ON CONFLICT (id) DO UPDATE, así la migración sigue siendo idempotente.
+        El lote y el avance se confirman juntos: si se corta, la próxima
+        ejecución sigue desde el último id confirmado.
+        """
+        archivo, columnas, extraer = TABLAS[tabla]
+        ruta = os.path.join(self.data_dir, archivo)
         try:
-            if not os.path.exists('data/usuarios.json'):
-                print("⚠️ Archivo usuarios.json no encontrado, saltando...")
+            if not os.path.exists(ruta):
+                print(f"⚠️ Archivo {archivo} no encontrado, saltando...")
                 return
             
-            with open('data/usuarios.json', 'r', encoding='utf-8') as f:
-                usuarios = json.load(f)
+            ultimo_id, copiadas, completada = self._leer_progreso(tabla)
+            if completada:
+                print(f"⏭️ {tabla}: ya migrada ({copiadas} registros)")
+                return
+            
+            with open(ruta, 'r', encoding='utf-8') as f:
+                registros = sorted(json.load(f), key=lambda r: r['id'])
+            total = len(registros)
+            pendientes = [r for r in registros if r['id'] > ultimo_id]
+            if ultimo_id:
+                print(f"↩️ {tabla}: reanudando después del id {ultimo_id}")
+            
+            lista = ', '.join(columnas)
+            actualizar = ', '.join(f"{c} = EXCLUDED.{c}" for c in columnas if c not in ('id', 'fecha_creacion'))
+            temporal = f"copia_{tabla}"
+            self.cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {temporal} "
+                                f"(LIKE {tabla} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
             
-            for usuario in usuarios:
+            inicio = time.time()
+            for desde in range(0, len(pendientes), self.tamano_lote):
+                lote = pendientes[desde:desde + self.tamano_lote]
+                
+                buffer = io.StringIO()
+                for registro in lote:
+                    buffer.write('\t'.join(_valor_copy(v) for v in extraer(registro)) + '\n')
+                buffer.seek(0)
+                
+                self.cursor.copy_expert(f"COPY {temporal} ({lista}) FROM STDIN", buffer)
+                # DISTINCT ON: un id repetido en el JSON no puede actualizar dos veces la misma fila
+                self.cursor.execute(f"""
+                    INSERT INTO {tabla} ({lista})
+                    SELECT DISTINCT ON (id) {lista} FROM {temporal} ORDER BY id
+                    ON CONFLICT (id) DO UPDATE SET {actualizar}
+                """)
+                copiadas += len(lote)
                 self.cursor.execute("""
-                    INSERT INTO usuarios (id, username, password_hash, nombre, email, rol, activo, fecha_creacion)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO UPDATE SET
-                        username = EXCLUDED.username,
-                        password_hash = EXCLUDED.password_hash,
-                        nombre = EXCLUDED.nombre,
-                        email = EXCLUDED.email,
-                        rol = EXCLUDED.rol,
-                        activo = EXCLUDED.activo
-                """, (
-                    usuario['id'],
-                    usuario['username'],
-                    usuario['password_hash'],
-                    usuario['nombre'],
-                    usuario.get('email'),
-                    usuario['rol'],
-                    usuario['activo'],
-                    usuario.get('fecha_creacion')
-                ))
+                    INSERT INTO migracion_progreso (tabla, ultimo_id, filas) VALUES (%s, %s, %s)
+                    ON CONFLICT (tabla) DO UPDATE SET ultimo_id = EXCLUDED.ultimo_id, filas = EXCLUDED.filas,
+                                                      fecha_actualizacion = CURRENT_TIMESTAMP
+                """, (tabla, lote[-1]['id'], copiadas))
+                self.connection.commit()
+                
+                hechos = total - len(pendientes) + desde + len(lote)
+                print(f"   📦 {tabla}: {hechos}/{total} ({hechos * 100 // max(total, 1)}%) "
+                      f"- {time.time() - inicio:.1f}s")
             
+            self._sincronizar_secuencia(tabla)
+            self.cursor.execute("""
+                INSERT INTO migracion_progreso (tabla, ultimo_id, filas, completada) VALUES (%s, %s, %s, TRUE)
+                ON CONFLICT (tabla) DO UPDATE SET completada = TRUE, fecha_actualizacion = CURRENT_TIMESTAMP
+            """, (tabla, registros[-1]['id'] if registros else 0, copiadas))
             self.connection.commit()
-            print(f"✅ {len(usuarios)} usuarios migrados")
+            print(f"✅ {total} {tabla} migrados")
             
         except Exception as e:
-            print(f"❌ Error migrando usuarios: {e}")
+            print(f"❌ Error migrando {tabla}: {e}")
             self.connection.rollback()
             raise
     
+    def _sincronizar_secuencia(self, tabla: str):
+        """Ajusta la secuencia del id al máximo copiado (los ids se insertaron a mano)"""
+        self.cursor.execute(f"""
+            SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL)
+            FROM {tabla}
+        """)
+    
+    def migrate_usuarios(self):
+        """Migra usuarios desde JSON a PostgreSQL"""
+        self._migrar_tabla('usuarios')
+    
     def migrate_clientes(self):
         """Migra clientes desde JSON a PostgreSQL"""
-        try:
-            if not os.path.exists('data/clientes.json'):
-                print("⚠️ Archivo clientes.json no encontrado, saltando...")
-                return
-            
-            with open('data/clientes.json', 'r', encoding='utf-8') as f:
-                clientes = json.load(f)
-            
-            for cliente in clientes:
-                self.cursor.execute("""
-                    INSERT INTO clientes (id, dni, nombre, apellido, telefono, email, direccion, usuario_id, usuario_creador_id, fecha_creacion, activo)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO UPDATE SET
-                        dni = EXCLUDED.dni,
-                        nombre = EXCLUDED.nombre,
-                        apellido = EXCLUDED.apellido,
-                        telefono = EXCLUDED.telefono,
-                        email = EXCLUDED.email,
-                        direccion = EXCLUDED.direccion,
-                        usuario_id = EXCLUDED.usuario_id,
-                        usuario_creador_id = EXCLUDED.usuario_creador_id,
-                        activo = EXCLUDED.activo
-                """, (
-                    cliente['id'],
-                    cliente['dni'],
-                    cliente['nombre'],
-                    cliente['apellido'],
-                    cliente.get('telefono'),
-                    cliente.get('email'),
-                    cliente.get('direccion'),
-                    cliente.get('usuario_id'),
-                    cliente.get('usuario_creador_id'),
-                    cliente.get('fecha_creacion'),
-                    cliente.get('activo', True)
-                ))
-            
-            self.connection.commit()
-            print(f"✅ {len(clientes)} clientes migrados")
-            
-        except Exception as e:
-            print(f"❌ Error migrando clientes: {e}")
-            self.connection.rollback()
-            raise
+        self._migrar_tabla('clientes')
     
     def migrate_prestamos(self):
         """Migra préstamos desde JSON a PostgreSQL"""
-        try:
-            if not os.path.exists('data/prestamos.json'):
-                print("⚠️ Archivo prestamos.json no encontrado, saltando...")
-                return
-            
-            with open('data/prestamos.json', 'r', encoding='utf-8') as f:
-                prestamos = json.load(f)
-            
-            for prestamo in prestamos:
-                self.cursor.execute("""
-                    INSERT INTO prestamos (id, cliente_id, monto_original, monto_restante, tasa_interes, plazo_meses, fecha_inicio, fecha_vencimiento, estado, usuario_id, usuario_creador_id, fecha_creacion, observaciones)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO UPDATE SET
-                        cliente_id = EXCLUDED.cliente_id,
-                        monto_original = EXCLUDED.monto_original,
-                        monto_restante = EXCLUDED.monto_restante,
-                        tasa_interes = EXCLUDED.tasa_interes,
-                        plazo_meses = EXCLUDED.plazo_meses,
-                        fecha_inicio = EXCLUDED.fecha_inicio,
-                        fecha_vencimiento = EXCLUDED.fecha_vencimiento,
-                        estado = EXCLUDED.estado,
-                        usuario_id = EXCLUDED.usuario_id,
-                        usuario_creador_id = EXCLUDED.usuario_creador_id,
-                        observaciones = EXCLUDED.observaciones
-                """, (
-                    prestamo['id'],
-                    prestamo['cliente_id'],
-                    prestamo['monto_original'],
-                    prestamo['monto_restante'],
-                    prestamo['tasa_interes'],
-                    prestamo['plazo_meses'],
-                    prestamo['fecha_inicio'],
-                    prestamo['fecha_vencimiento'],
-                    prestamo.get('estado', 'activo'),
-                    prestamo.get('usuario_id'),
-                    prestamo.get('usuario_creador_id'),
-                    prestamo.get('fecha_creacion'),
-                    prestamo.get('observaciones')
-                ))
-            
-            self.connection.commit()
-            print(f"✅ {len(prestamos)} préstamos migrados")
-            
-        except Exception as e:
-            print(f"❌ Error migrando préstamos: {e}")
-            self.connection.rollback()
-            raise
+        self._migrar_tabla('prestamos')
     
     def migrate_pagos(self):
         """Migra pagos desde JSON a PostgreSQL"""
-        try:
-            if not os.path.exists('data/pagos.json'):
-                print("⚠️ Archivo pagos.json no encontrado, saltando...")
-                return
-            
-            with open('data/pagos.json', 'r', encoding='utf-8') as f:
-                pagos = json.load(f)
-            
-            for pago in pagos:
-                self.cursor.execute("""
-                    INSERT INTO pagos (id, prestamo_id, monto, fecha_pago, tipo_pago, usuario_id, fecha_creacion, observaciones)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO UPDATE SET
-                        prestamo_id = EXCLUDED.prestamo_id,
-                        monto = EXCLUDED.monto,
-                        fecha_pago = EXCLUDED.fecha_pago,
-                        tipo_pago = EXCLUDED.tipo_pago,
-                        usuario_id = EXCLUDED.usuario_id,
-                        observaciones = EXCLUDED.observaciones
-                """, (
-                    pago['id'],
-                    pago['prestamo_id'],
-                    pago['monto'],
-                    pago['fecha_pago'],
-                    pago.get('tipo_pago', 'cuota'),
-                    pago.get('usuario_id'),
-                    pago.get('fecha_creacion'),
-                    pago.get('observaciones')
-                ))
-            
-            self.connection.commit()
-            print(f"✅ {len(pagos)} pagos migrados")
-            
-        except Exception as e:
-            print(f"❌ Error migrando pagos: {e}")
-            self.connection.rollback()
-            raise
+        self._migrar_tabla('pagos')
     
     def create_indexes(self):
-        """Crea índices para mejorar el rendimiento"""
+        """Crea los índices aplicando las migraciones versionadas del esquema"""
         try:
-            # Índices para usuarios
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_username ON usuarios(username)")
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_email ON usuarios(email)")
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_rol ON usuarios(rol)")
-            
-            # Índices para clientes
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_dni ON clientes(dni)")
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_usuario_id ON clientes(usuario_id)")
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nombre_apellido ON clientes(nombre, apellido)")
-            
-            # Índices para préstamos
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_prestamos_cliente_id ON prestamos(cliente_id)")
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_prestamos_estado ON prestamos(estado)")
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_prestamos_fecha_vencimiento ON prestamos(fecha_vencimiento)")
-            
-            # Índices para pagos
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_pagos_prestamo_id ON pagos(prestamo_id)")
-            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_pagos_fecha_pago ON pagos(fecha_pago)")
-            
-            self.connection.commit()
+            aplicar_migraciones(self.connection)
             print("✅ Índices creados exitosamente")
             
         except Exception as e:
@@ -348,6 +324,7 @@ class PostgreSQLMigrator:
             
             self.connect()
             self.create_tables()
+            self._preparar_progreso()
             self.migrate_usuarios()
             self.migrate_clientes()
             self.migrate_prestamos()
@@ -364,8 +341,15 @@ class PostgreSQLMigrator:
 
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description="Migra los datos JSON a PostgreSQL")
+    parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help=f"Registros por lote (por defecto: {TAMANO_LOTE})")
+    parser.add_argument('--reiniciar', action='store_true',
+                        help="Ignorar el avance guardado y volver a copiar todas las tablas")
+    parser.add_argument('--data-dir', default='data', help="Directorio de datos (por defecto: data)")
+    args = parser.parse_args()
+    
     try:
-        migrator = PostgreSQLMigrator()
+        migrator = PostgreSQLMigrator(args.data_dir, args.lote, args.reiniciar)
         migrator.run_migration()
     except Exception as e:
         print(f"❌ Error fatal: {e}")
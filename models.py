@@ -71,6 +71,9 @@ class Prestamo:
         self.usuario_id = usuario_id  # ID del usuario que creó el préstamo
         self.usuario_creador_id = usuario_id  # Alias para compatibilidad
         self.pagos: List[Pago] = []
+        self.firma_path: Optional[str] = None  # Firma digital vigente
+        self.firma_hash: Optional[str] = None  # SHA-256 de la firma vigente
+        self.firmas_anteriores: List[str] = []  # Firmas reemplazadas aún conservadas
     
     def calcular_interes_total(self) -> Decimal:
         """Calcula el interés total del préstamo"""
@@ -198,7 +201,10 @@ class Prestamo:
             'descripcion': self.descripcion,
             'usuario_id': self.usuario_id,
             'usuario_creador_id': self.usuario_creador_id,
-            'pagos': [pago.to_dict() for pago in self.pagos]
+            'pagos': [pago.to_dict() for pago in self.pagos],
+            'firma_path': self.firma_path,
+            'firma_hash': self.firma_hash,
+            'firmas_anteriores': self.firmas_anteriores
         }
     
     @classmethod
@@ -217,6 +223,9 @@ class Prestamo:
         prestamo.fecha_creacion = datetime.fromisoformat(data['fecha_creacion'])
         prestamo.estado = data['estado']
         prestamo.pagos = [Pago.from_dict(pago_data) for pago_data in data.get('pagos', [])]
+        prestamo.firma_path = data.get('firma_path')
+        prestamo.firma_hash = data.get('firma_hash')
+        prestamo.firmas_anteriores = data.get('firmas_anteriores', [])
         
         # Agregar información del usuario creador si está disponible
         if 'usuario_creador' in data:
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Notificador de Cambios en Proceso
+=================================
+
+Permite que las conexiones de eventos (SSE) esperen cambios en los datos
+sin consultar el almacenamiento en un bucle. La capa de datos publica la
+nueva versión de cada ámbito afectado y los suscriptores se despiertan.
+
+Solo notifica escrituras hechas en el mismo proceso; los cambios hechos en
+otros workers se detectan al vencer el tiempo de espera consultando la
+versión de datos compartida.
+"""
+
+import threading
+from typing import Dict, Iterable
+
+class NotificadorCambios:
+    """Publica versiones de datos por ámbito y despierta a quienes esperan"""
+
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._versiones: Dict[str, int] = {}
+
+    def publicar(self, ambitos: Iterable[str], secuencia: int):
+        """Registra la nueva secuencia de los ámbitos modificados y despierta a los suscriptores"""
+        with self._condicion:
+            for ambito in ambitos:
+                self._versiones[ambito] = max(self._versiones.get(ambito, 0), secuencia)
+            self._condicion.notify_all()
+
+    def esperar(self, ambitos: Iterable[str], secuencia: int, timeout: float) -> bool:
+        """Espera hasta que alguno de los ámbitos supere la secuencia dada.
+
+        Devuelve True si hubo un cambio y False si venció el tiempo de espera.
+        """
+        ambitos = list(ambitos)
+
+        def hay_cambio():
+            return any(self._versiones.get(ambito, 0) > secuencia for ambito in ambitos)
+
+        with self._condicion:
+            return self._condicion.wait_for(hay_cambio, timeout)
+
+# Instancia compartida por la capa de datos y las rutas de eventos
+notificador = NotificadorCambios()
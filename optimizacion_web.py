@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Optimización de Respuestas Web
+==============================
+
+- CompresionGzip: middleware WSGI que comprime con gzip las respuestas de los
+  tipos configurados en COMPRESS_MIMETYPES cuando superan COMPRESS_MIN_SIZE.
+- Archivos estáticos versionados: url_for('static', ...) agrega un hash del
+  contenido (?v=...) a los archivos de css/ y js/, y esas URLs se sirven con
+  caché de larga duración. Al cambiar el archivo cambia la URL.
+"""
+
+import gzip
+import hashlib
+import os
+from typing import Dict, Iterable, Tuple
+
+from flask import request
+
+# Carpetas de static/ cuyas URLs se versionan por contenido
+CARPETAS_VERSIONADAS = ('css/', 'js/')
+
+# Un año: el contenido de una URL versionada nunca cambia
+CACHE_ESTATICOS_SEGUNDOS = 365 * 24 * 3600
+
+class CompresionGzip:
+    """Middleware WSGI de compresión gzip"""
+
+    def __init__(self, wsgi_app, mimetypes: Iterable[str], nivel: int = 6, tamano_minimo: int = 500):
+        self.wsgi_app = wsgi_app
+        self.mimetypes = set(mimetypes)
+        self.nivel = nivel
+        self.tamano_minimo = tamano_minimo
+
+    def __call__(self, environ, start_response):
+        if 'gzip' not in environ.get('HTTP_ACCEPT_ENCODING', '').lower() or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+
+        capturado = {}
+
+        def capturar_start_response(status, headers, exc_info=None):
+            capturado['status'] = status
+            capturado['headers'] = headers
+            capturado['exc_info'] = exc_info
+            return capturado.setdefault('escritos', []).append
+
+        respuesta = self.wsgi_app(environ, capturar_start_response)
+
+        # El start_response puede llamarse recién al empezar a iterar la respuesta
+        iterador = iter(respuesta)
+        try:
+            primero = next(iterador)
+        except StopIteration:
+            primero = b''
+            iterador = iter(())
+
+        status, headers = capturado['status'], capturado['headers']
+        if not self._es_comprimible(status, headers):
+            start_response(status, headers, capturado['exc_info'])
+            return self._continuar(respuesta, capturado.get('escritos', []) + [primero], iterador)
+
+        try:
+            cuerpo = b''.join(capturado.get('escritos', []) + [primero] + list(iterador))
+        finally:
+            if hasattr(respuesta, 'close'):
+                respuesta.close()
+
+        headers = [(k, v) for k, v in headers if k.lower() not in ('content-length', 'vary')]
+        vary = [v for k, v in capturado['headers'] if k.lower() == 'vary']
+        headers.append(('Vary', ', '.join(vary + ['Accept-Encoding'])))
+
+        if len(cuerpo) >= self.tamano_minimo:
+            cuerpo = gzip.compress(cuerpo, compresslevel=self.nivel)
+            headers.append(('Content-Encoding', 'gzip'))
+        headers.append(('Content-Length', str(len(cuerpo))))
+
+        start_response(status, headers, capturado['exc_info'])
+        return [cuerpo]
+
+    def _es_comprimible(self, status: str, headers) -> bool:
+        """Decide si la respuesta se comprime según estado, tipo y cabeceras"""
+        if not status.startswith('200'):
+            return False
+
+        cabeceras = {k.lower(): v for k, v in headers}
+        if 'content-encoding' in cabeceras or 'no-transform' in cabeceras.get('cache-control', ''):
+            return False
+
+        mimetype = cabeceras.get('content-type', '').split(';')[0].strip()
+        if mimetype not in self.mimetypes:
+            return False
+
+        longitud = cabeceras.get('content-length')
+        return longitud is None or int(longitud) >= self.tamano_minimo
+
+    @staticmethod
+    def _continuar(respuesta, iniciales, iterador):
+        """Entrega la respuesta sin comprimir, cerrándola al terminar"""
+        try:
+            for bloque in iniciales:
+                if bloque:
+                    yield bloque
+            yield from iterador
+        finally:
+            if hasattr(respuesta, 'close'):
+                respuesta.close()
+
+class VersionadorEstaticos:
+    """Calcula y cachea el hash de contenido de los archivos estáticos"""
+
+    def __init__(self, static_folder: str):
+        self.static_folder = static_folder
+        self._hashes: Dict[str, Tuple[int, str]] = {}
+
+    def version(self, filename: str):
+        """Hash corto del contenido del archivo, o None si no se versiona"""
+        if not filename.startswith(CARPETAS_VERSIONADAS):
+            return None
+
+        ruta = os.path.join(self.static_folder, filename)
+        try:
+            mtime = os.stat(ruta).st_mtime_ns
+        except OSError:
+            return None
+
+        cacheado = self._hashes.get(filename)
+        if cacheado and cacheado[0] == mtime:
+            return cacheado[1]
+
+        with open(ruta, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:12]
+        self._hashes[filename] = (mtime, digest)
+        return digest
+
+def configurar_optimizacion_web(app, config):
+    """Aplica compresión y versionado de estáticos a una aplicación Flask.
+
+    `config` es una clase de config_production (ProductionConfig o DevelopmentConfig).
+    """
+    versionador = VersionadorEstaticos(app.static_folder)
+
+    @app.url_defaults
+    def agregar_version_estatico(endpoint, values):
+        if endpoint == 'static' and 'v' not in values:
+            version = versionador.version(values.get('filename', ''))
+            if version:
+                values['v'] = version
+
+    @app.after_request
+    def cache_estaticos(response):
+        if request.endpoint != 'static' or response.status_code not in (200, 304):
+            return response
+
+        filename = (request.view_args or {}).get('filename', '')
+        version = request.args.get('v')
+        if version and version == versionador.version(filename):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = CACHE_ESTATICOS_SEGUNDOS
+            response.cache_control.immutable = True
+            response.expires = None
+        return response
+
+    app.wsgi_app = CompresionGzip(
+        app.wsgi_app,
+        mimetypes=config.COMPRESS_MIMETYPES,
+        nivel=config.COMPRESS_LEVEL,
+        tamano_minimo=config.COMPRESS_MIN_SIZE,
+    )
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Perfilado de Peticiones a Pedido
+================================
+
+Permite a un administrador ver en qué se va el tiempo de una petición lenta
+en producción: agregando ?perfilar=1 a la URL (o el encabezado
+X-Perfilar: 1) la petición se ejecuta bajo cProfile y se guardan:
+
+- <id>.pstats: estadísticas de cProfile (python -m pstats, snakeviz...).
+- <id>.collapsed: pilas muestreadas en formato "collapsed" (una línea
+  "marco;marco;marco cantidad" por pila), listo para flamegraph.pl o
+  speedscope. Las muestras las toma un hilo aparte cada INTERVALO_MUESTREO
+  segundos leyendo el marco actual del hilo de la petición.
+- <id>.json: datos de la petición y las funciones con más tiempo acumulado,
+  para la página de administración.
+
+El directorio conserva solo los últimos `maximo` perfiles. Se perfila una
+petición a la vez para acotar el costo en el worker; si ya hay una en curso
+la nueva se atiende sin perfilar. Sin el parámetro ni el encabezado el único
+costo es buscarlos en el environ de WSGI.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PARAMETRO = 'perfilar'
+ENCABEZADO_WSGI = 'HTTP_X_PERFILAR'
+INTERVALO_MUESTREO = 0.001
+# Funciones con más tiempo acumulado que se guardan en el resumen
+FUNCIONES_RESUMEN = 25
+TIPOS_ARCHIVO = ('pstats', 'collapsed')
+_PATRON_ID = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{6}$')
+
+def perfilado_solicitado(environ: Dict[str, Any]) -> bool:
+    """Si la petición pide perfilado (encabezado X-Perfilar o parámetro ?perfilar=)"""
+    if environ.get(ENCABEZADO_WSGI, '') not in ('', '0'):
+        return True
+    consulta = environ.get('QUERY_STRING', '')
+    if PARAMETRO not in consulta:
+        return False
+    return any(parte.split('=', 1)[0] == PARAMETRO and parte not in (PARAMETRO + '=0', PARAMETRO + '=')
+               for parte in consulta.split('&'))
+
+class MuestreadorPilas(threading.Thread):
+    """Toma muestras periódicas de la pila de otro hilo y las cuenta por pila"""
+
+    def __init__(self, hilo_id: int, intervalo: float = INTERVALO_MUESTREO):
+        super().__init__(name='muestreador-perfil', daemon=True)
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.pilas: Counter = Counter()
+        self._detener = threading.Event()
+
+    @staticmethod
+    def _nombre_marco(marco) -> str:
+        codigo = marco.f_code
+        return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            marco = sys._current_frames().get(self.hilo_id)
+            if marco is None:
+                continue
+            marcos = []
+            while marco is not None:
+                marcos.append(self._nombre_marco(marco))
+                marco = marco.f_back
+            # Formato collapsed: de la raíz a la hoja, separados por ';' (la cantidad va tras el último espacio)
+            self.pilas[';'.join(reversed(marcos))] += 1
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+class PerfilEnCurso:
+    """Profiler y muestreador de una petición"""
+
+    def __init__(self, intervalo: float):
+        self.inicio = time.perf_counter()
+        self.fecha = datetime.now()
+        self.muestreador = MuestreadorPilas(threading.get_ident(), intervalo)
+        self.profiler = cProfile.Profile()
+        self.muestreador.start()
+        self.profiler.enable()
+
+    def detener(self) -> float:
+        """Detiene la medición; devuelve la duración en segundos"""
+        self.profiler.disable()
+        self.muestreador.detener()
+        return time.perf_counter() - self.inicio
+
+class PerfiladorPeticiones:
+    """Perfila peticiones a pedido y guarda los resultados en un directorio acotado"""
+
+    def __init__(self, directorio: str, maximo: int = 50, intervalo: float = INTERVALO_MUESTREO):
+        # Absoluto: send_file resuelve las rutas relativas desde la carpeta de la aplicación
+        self.directorio = os.path.abspath(directorio)
+        self.maximo = maximo
+        self.intervalo = intervalo
+        self._ocupado = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+
+    def iniciar(self) -> Optional[PerfilEnCurso]:
+        """Empieza a perfilar el hilo actual, o None si ya hay otra petición perfilándose"""
+        if not self._ocupado.acquire(blocking=False):
+            logger.info("⏳ Perfilado omitido: ya hay una petición perfilándose")
+            return None
+        try:
+            return PerfilEnCurso(self.intervalo)
+        except Exception:
+            self._ocupado.release()
+            raise
+
+    def descartar(self, perfil: PerfilEnCurso):
+        """Detiene un perfil sin guardarlo (la petición falló antes de responder)"""
+        try:
+            perfil.detener()
+        finally:
+            self._ocupado.release()
+
+    def finalizar(self, perfil: PerfilEnCurso, metodo: str, ruta: str, estado: int,
+                  usuario: Optional[str] = None) -> str:
+        """Detiene el perfil, guarda sus archivos y devuelve su ID"""
+        try:
+            duracion = perfil.detener()
+        finally:
+            self._ocupado.release()
+
+        perfil_id = f"{perfil.fecha:%Y%m%d-%H%M%S}-{secrets.token_hex(3)}"
+        base = os.path.join(self.directorio, perfil_id)
+
+        estadisticas = pstats.Stats(perfil.profiler)
+        estadisticas.dump_stats(base + '.pstats')
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            for pila, cantidad in perfil.muestreador.pilas.most_common():
+                f.write(f"{pila} {cantidad}\n")
+
+        resumen = {
+            'id': perfil_id,
+            'fecha': perfil.fecha.isoformat(timespec='seconds'),
+            'metodo': metodo,
+            'ruta': ruta,
+            'estado': estado,
+            'usuario': usuario,
+            'duracion_ms': round(duracion * 1000, 1),
+            'muestras': sum(perfil.muestreador.pilas.values()),
+            'funciones': self._funciones_principales(estadisticas),
+        }
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(resumen, f, ensure_ascii=False)
+
+        self._limpiar()
+        logger.info("🔬 Perfil %s guardado: %s %s (%s ms)", perfil_id, metodo, ruta, resumen['duracion_ms'])
+        return perfil_id
+
+    @staticmethod
+    def _funciones_principales(estadisticas: pstats.Stats) -> List[Dict[str, Any]]:
+        """Funciones con más tiempo acumulado (llamadas, tiempo propio y acumulado en ms)"""
+        filas = []
+        for (archivo, linea, nombre), (_, llamadas, propio, acumulado, _) in estadisticas.stats.items():
+            filas.append({
+                'funcion': f"{nombre} ({os.path.basename(archivo)}:{linea})" if linea else nombre,
+                'llamadas': llamadas,
+                'propio_ms': round(propio * 1000, 2),
+                'acumulado_ms': round(acumulado * 1000, 2),
+            })
+        filas.sort(key=lambda fila: fila['acumulado_ms'], reverse=True)
+        return filas[:FUNCIONES_RESUMEN]
+
+    def _limpiar(self):
+        """Elimina los perfiles más antiguos por encima del máximo"""
+        ids = sorted(nombre[:-5] for nombre in os.listdir(self.directorio) if nombre.endswith('.json'))
+        for perfil_id in ids[:-self.maximo] if self.maximo > 0 else ids:
+            for extension in ('json',) + TIPOS_ARCHIVO:
+                try:
+                    os.remove(os.path.join(self.directorio, f"{perfil_id}.{extension}"))
+                except FileNotFoundError:
+                    pass
+
+    def listar(self) -> List[Dict[str, Any]]:
+        """Resúmenes de los perfiles guardados, del más reciente al más antiguo"""
+        perfiles = []
+        for nombre in sorted(os.listdir(self.directorio), reverse=True):
+            if not nombre.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre), encoding='utf-8') as f:
+                    perfiles.append(json.load(f))
+            except (OSError, ValueError):
+                # Eliminado por _limpiar mientras se listaba
+                continue
+        return perfiles
+
+    def ruta_archivo(self, perfil_id: str, tipo: str) -> Optional[str]:
+        """Ruta del archivo de un perfil, o None si el ID o el tipo no son válidos o no existe"""
+        if tipo not in TIPOS_ARCHIVO or not _PATRON_ID.match(perfil_id):
+            return None
+        ruta = os.path.join(self.directorio, f"{perfil_id}.{tipo}")
+        return ruta if os.path.exists(ruta) else None
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Pool de Renderizado de PDFs
+===========================
+
+ReportLab consume CPU y, con el GIL, un pagaré que se genera dentro de un
+hilo de gunicorn frena al resto de las peticiones de ese worker. Este módulo
+genera los PDFs en un grupo aparte de procesos:
+
+- La concurrencia está acotada: `procesos` renders en paralelo y como mucho
+  `max_pendientes` en curso; por encima se rechaza con PoolOcupado para que
+  la ruta responda 503 en lugar de acumular trabajo.
+- Peticiones simultáneas del mismo pagaré (misma clave) comparten un único
+  render.
+- La ruta espera el resultado `tiempo_espera` segundos. Si el render tarda
+  más se lanza RenderPendiente; el render sigue, se guarda en la caché de
+  PDFs al terminar y el cliente consulta el estado hasta que esté listo.
+- Un render que lleva más de `tiempo_maximo` segundos se da por colgado: se
+  descarta con un error para su clave y se reinicia el pool de procesos
+  (los demás renders de ese pool también terminan con error), para que los
+  renders colgados no dejen el pool en PoolOcupado para siempre.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as TiempoAgotado
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# Estados de un render
+ESTADO_LISTO = 'listo'
+ESTADO_EN_PROCESO = 'en_proceso'
+ESTADO_ERROR = 'error'
+
+# Errores recientes que se conservan para informarlos al consultar el estado
+MAX_ERRORES_RECORDADOS = 200
+
+class PoolOcupado(Exception):
+    """Hay demasiados PDFs generándose; conviene reintentar en unos segundos"""
+
+class RenderPendiente(Exception):
+    """El PDF sigue generándose después del tiempo de espera"""
+
+    def __init__(self, clave: str):
+        super().__init__(f"El PDF {clave} todavía se está generando")
+        self.clave = clave
+
+def renderizar_pagare(prestamo, cliente, firma_path: Optional[str] = None) -> bytes:
+    """Genera el PDF del pagaré (se ejecuta en un proceso del pool)"""
+    # Import diferido: solo los procesos del pool cargan ReportLab y los estilos
+    from pdf_generator import PagarePDFGenerator
+    return PagarePDFGenerator().generar_pagare_bytes(prestamo, cliente, firma_path)
+
+class PoolRenderPDF:
+    """Genera pagarés en procesos aparte y guarda el resultado en la caché de PDFs"""
+
+    def __init__(self, cache, procesos: int = 2, max_pendientes: int = 8, tiempo_espera: float = 10.0,
+                 tiempo_maximo: float = 120.0):
+        self.cache = cache
+        self.procesos = procesos
+        self.max_pendientes = max_pendientes
+        self.tiempo_espera = tiempo_espera
+        self.tiempo_maximo = tiempo_maximo
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._en_curso: Dict[str, Future] = {}
+        self._inicios: Dict[str, float] = {}
+        self._errores: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls, cache) -> 'PoolRenderPDF':
+        """Crea el pool con PDF_PROCESOS, PDF_MAX_PENDIENTES, PDF_TIEMPO_ESPERA y PDF_TIEMPO_MAXIMO"""
+        return cls(cache,
+                   procesos=int(os.getenv('PDF_PROCESOS', min(2, os.cpu_count() or 1))),
+                   max_pendientes=int(os.getenv('PDF_MAX_PENDIENTES', 8)),
+                   tiempo_espera=float(os.getenv('PDF_TIEMPO_ESPERA', 10)),
+                   tiempo_maximo=float(os.getenv('PDF_TIEMPO_MAXIMO', 120)))
+
+    def _obtener_executor(self) -> ProcessPoolExecutor:
+        # Se crea al primer uso, ya dentro del worker de gunicorn. "spawn" evita
+        # copiar con fork un proceso que tiene hilos (y sus locks) en uso.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.procesos,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            logger.info("🖨️ Pool de PDFs iniciado con %s procesos", self.procesos)
+        return self._executor
+
+    def _registrar_error(self, clave: str, error: str):
+        # Se llama con self._lock tomado
+        if len(self._errores) >= MAX_ERRORES_RECORDADOS:
+            self._errores.pop(next(iter(self._errores)))
+        self._errores[clave] = error
+
+    def _descartar_vencidos(self) -> List[ProcessPoolExecutor]:
+        """Quita los renders que superaron tiempo_maximo (con self._lock tomado).
+
+        Devuelve el executor a reciclar, si hubo renders colgados, para
+        detenerlo fuera del lock.
+        """
+        limite = time.monotonic() - self.tiempo_maximo
+        vencidos = [clave for clave, inicio in self._inicios.items() if inicio < limite]
+        if not vencidos:
+            return []
+        for clave in vencidos:
+            logger.error("❌ El PDF %s superó %s s generándose, se descarta", clave, self.tiempo_maximo)
+            self._en_curso.pop(clave, None)
+            self._inicios.pop(clave, None)
+            self._registrar_error(clave, f"El PDF tardó más de {self.tiempo_maximo:g} s en generarse")
+        executor, self._executor = self._executor, None
+        return [executor] if executor is not None else []
+
+    @staticmethod
+    def _reciclar(executors: List[ProcessPoolExecutor]):
+        """Termina los procesos de un pool con renders colgados"""
+        for executor in executors:
+            logger.warning("⚠️ Reiniciando el pool de PDFs por renders colgados")
+            # ProcessPoolExecutor no permite interrumpir una tarea en curso:
+            # la única forma de liberar el proceso es terminarlo
+            for proceso in list((executor._processes or {}).values()):
+                proceso.terminate()
+            executor.shutdown(wait=False)
+
+    def enviar(self, clave: str, prestamo, cliente, firma_path: Optional[str] = None) -> Future:
+        """Programa el render del pagaré (o devuelve el que ya está en curso)"""
+        with self._lock:
+            reciclar = self._descartar_vencidos()
+        self._reciclar(reciclar)
+
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            if futuro is not None:
+                return futuro
+            if len(self._en_curso) >= self.max_pendientes:
+                raise PoolOcupado(f"Hay {len(self._en_curso)} PDFs generándose")
+
+            try:
+                futuro = self._obtener_executor().submit(renderizar_pagare, prestamo, cliente, firma_path)
+            except BrokenProcessPool:
+                # Un proceso del pool murió: se descarta el pool y se crea otro
+                logger.warning("⚠️ Pool de PDFs roto, se reinicia")
+                self._executor = None
+                futuro = self._obtener_executor().submit(renderizar_pagare, prestamo, cliente, firma_path)
+
+            self._en_curso[clave] = futuro
+            self._inicios[clave] = time.monotonic()
+            self._errores.pop(clave, None)
+
+        futuro.add_done_callback(lambda f: self._terminado(clave, f))
+        return futuro
+
+    def _terminado(self, clave: str, futuro: Future):
+        """Guarda el PDF en la caché (o el error) al terminar el render"""
+        with self._lock:
+            # Un render descartado por tiempo (y quizás reemplazado por otro
+            # de la misma clave) ya no está registrado: no se toca su estado
+            vigente = self._en_curso.get(clave) is futuro
+        if not vigente or futuro.cancelled():
+            return
+        try:
+            self.cache.guardar(clave, futuro.result())
+        except Exception as e:
+            logger.error("❌ Error generando el PDF %s: %s", clave, e)
+            with self._lock:
+                self._registrar_error(clave, str(e))
+        finally:
+            with self._lock:
+                if self._en_curso.get(clave) is futuro:
+                    del self._en_curso[clave]
+                    self._inicios.pop(clave, None)
+
+    def obtener(self, clave: str, prestamo, cliente, firma_path: Optional[str] = None,
+                tiempo_espera: Optional[float] = None) -> Tuple[Optional[str], Optional[bytes]]:
+        """Devuelve (ruta, None) si el PDF está en caché o (None, contenido) al generarlo.
+
+        Lanza RenderPendiente si no terminó dentro del tiempo de espera y
+        PoolOcupado si no hay lugar para otro render.
+        """
+        ruta = self.cache.obtener(clave)
+        metricas.registrar_cache('pdf_pagare', ruta is not None)
+        if ruta:
+            return ruta, None
+
+        futuro = self.enviar(clave, prestamo, cliente, firma_path)
+        try:
+            return None, futuro.result(self.tiempo_espera if tiempo_espera is None else tiempo_espera)
+        except TiempoAgotado:
+            raise RenderPendiente(clave)
+
+    def estado(self, clave: str) -> Tuple[Optional[str], Optional[str]]:
+        """(estado, error) del render de la clave; (None, None) si este proceso no lo conoce"""
+        if self.cache.obtener(clave):
+            return ESTADO_LISTO, None
+        with self._lock:
+            reciclar = self._descartar_vencidos()
+        self._reciclar(reciclar)
+        with self._lock:
+            if clave in self._en_curso:
+                return ESTADO_EN_PROCESO, None
+            if clave in self._errores:
+                return ESTADO_ERROR, self._errores[clave]
+        return None, None
+
+    def cerrar(self):
+        """Detiene los procesos del pool"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            pendientes = list(self._en_curso.values())
+            self._inicios.clear()
+        # shutdown(cancel_futures=True) no existe en Python 3.8 (runtime.txt):
+        # se cancelan a mano los renders que todavía no empezaron
+        for futuro in pendientes:
+            futuro.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Prueba de Carga HTTP
+====================
+
+Simula muchos usuarios concurrentes sobre las rutas web y mide la latencia
+(p50/p95/p99) y el rendimiento de cada ruta, con datos sintéticos
+(generador_datos.py) y sin servicios externos:
+
+- Cada usuario virtual es un hilo que inicia sesión con un rol (admin,
+  supervisor u operador, en la proporción de CICLO_ROLES) y repite una
+  mezcla de lecturas (/prestamos, /pagos, /reportes, /api/prestamos-activos)
+  y escrituras (POST /pagos/nuevo, que llama a PagoService.registrar_pago
+  sobre los préstamos activos del operador).
+- Modo "proceso": la aplicación corre dentro de este proceso con el cliente
+  de pruebas de Flask (sin red; mide el costo de la aplicación).
+- Modo "http": peticiones reales contra un servidor local, ya sea uno que se
+  arranca aquí con gunicorn (--gunicorn, usa gunicorn.conf.py) o uno
+  existente (--url) que sirva el mismo directorio de datos. Con --procesos
+  los usuarios virtuales se reparten en varios procesos para que el
+  generador de carga no quede limitado por el GIL.
+
+El directorio de trabajo (--directorio, temporal por defecto) contiene
+data/ con la cartera generada; la aplicación se ejecuta con ese directorio
+como directorio actual. La protección CSRF se desactiva en la aplicación de
+prueba (crear_app): la plantilla de login no incluye el token.
+
+Uso: python prueba_carga.py [--modo proceso|http] [--prestamos 2000]
+     [--usuarios-virtuales 32] [--duracion 30] [--escrituras 0.1]
+     [--gunicorn | --url http://127.0.0.1:5000] [--procesos 4] [--json salida.json]
+"""
+
+import argparse
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+from typing import Any, Dict, List, NamedTuple, Optional
+
+DIRECTORIO_APP = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(DIRECTORIO_APP)
+
+from generador_datos import PASSWORD_PRUEBA
+
+# Rol de cada usuario virtual, en rotación (con 3 o más hay de todos los roles)
+CICLO_ROLES = ('admin', 'supervisor') + ('operador',) * 8
+# Peso de cada ruta de lectura en la mezcla
+LECTURAS = {
+    '/prestamos': 0.30,
+    '/pagos': 0.25,
+    '/api/prestamos-activos': 0.30,
+    '/reportes': 0.15,
+}
+ESCRITURA = 'POST /pagos/nuevo'
+PROPORCION_ESCRITURAS = 0.10
+# Pausa entre peticiones de un mismo usuario virtual (segundos, aleatoria hasta este valor)
+PAUSA_MAXIMA = 0.05
+# Solo se paga sobre préstamos con saldo holgado: los pagos de 1.00 no los cancelan
+SALDO_MINIMO_PAGO = 50
+
+class UsuarioPrueba(NamedTuple):
+    username: str
+    rol: str
+    prestamos_activos: List[int]
+
+def crear_app():
+    """Carga la aplicación web (app-BACKUP.py) para la prueba de carga.
+
+    Usa data/ del directorio actual; también sirve como fábrica para gunicorn
+    ("prueba_carga:crear_app()").
+    """
+    spec = importlib.util.spec_from_file_location('app_backup', os.path.join(DIRECTORIO_APP, 'app-BACKUP.py'))
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules['app_backup'] = modulo
+    spec.loader.exec_module(modulo)
+    modulo.app.config['WTF_CSRF_ENABLED'] = False
+    return modulo.app
+
+def preparar_datos(directorio: str, prestamos: int, semilla: int) -> str:
+    """Genera la cartera en directorio/data si todavía no existe"""
+    from generador_datos import GeneradorDatos, guardar_json
+
+    data_dir = os.path.join(directorio, 'data')
+    if os.path.exists(os.path.join(data_dir, 'usuarios.json')):
+        print(f"📂 Usando los datos existentes de {data_dir}")
+    else:
+        print(f"🎲 Generando cartera de {prestamos} préstamos (semilla {semilla})...")
+        datos = GeneradorDatos(semilla).generar(prestamos)
+        guardar_json(datos, data_dir)
+        print(f"✅ {', '.join(f'{cantidad} {nombre}' for nombre, cantidad in datos.resumen().items())}")
+    return data_dir
+
+def cargar_usuarios(data_dir: str) -> Dict[str, List[UsuarioPrueba]]:
+    """Usuarios activos por rol, con los préstamos a los que cada uno puede registrar pagos"""
+    from database import Database
+
+    db = Database(data_dir)
+    activos: Dict[int, List[int]] = {}
+    for prestamo in db.obtener_prestamos_activos(None, True):
+        if prestamo.calcular_saldo_pendiente() > SALDO_MINIMO_PAGO:
+            activos.setdefault(prestamo.usuario_id, []).append(prestamo.id)
+
+    por_rol: Dict[str, List[UsuarioPrueba]] = {}
+    for usuario in db.listar_usuarios(None, True):
+        if usuario.activo:
+            por_rol.setdefault(usuario.rol, []).append(
+                UsuarioPrueba(usuario.username, usuario.rol, activos.get(usuario.id, [])))
+    # Los operadores con más préstamos primero: la carga recae sobre los más ocupados
+    por_rol.get('operador', []).sort(key=lambda u: len(u.prestamos_activos), reverse=True)
+    return por_rol
+
+def asignar_usuarios(por_rol: Dict[str, List[UsuarioPrueba]], cantidad: int) -> List[UsuarioPrueba]:
+    """Un usuario por usuario virtual, rotando los roles de CICLO_ROLES"""
+    asignados = []
+    siguiente = {rol: 0 for rol in por_rol}
+    for i in range(cantidad):
+        rol = CICLO_ROLES[i % len(CICLO_ROLES)]
+        if not por_rol.get(rol):
+            rol = 'operador'
+        usuarios = por_rol[rol]
+        asignados.append(usuarios[siguiente[rol] % len(usuarios)])
+        siguiente[rol] += 1
+    return asignados
+
+# Clientes
+class ClienteProceso:
+    """Peticiones con el cliente de pruebas de Flask (aplicación en este proceso)"""
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def get(self, ruta: str) -> int:
+        respuesta = self.cliente.get(ruta)
+        respuesta.close()
+        return respuesta.status_code
+
+    def post(self, ruta: str, datos: Dict[str, Any]) -> int:
+        respuesta = self.cliente.post(ruta, data=datos)
+        respuesta.close()
+        return respuesta.status_code
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class ClienteHTTP:
+    """Peticiones HTTP reales con cookies de sesión y sin seguir redirecciones"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()),
+                                                   _SinRedirecciones())
+
+    def _enviar(self, peticion: urllib.request.Request) -> int:
+        try:
+            with self.abridor.open(peticion, timeout=60) as respuesta:
+                respuesta.read()
+                return respuesta.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def get(self, ruta: str) -> int:
+        return self._enviar(urllib.request.Request(self.url + ruta))
+
+    def post(self, ruta: str, datos: Dict[str, Any]) -> int:
+        return self._enviar(urllib.request.Request(self.url + ruta, data=urllib.parse.urlencode(datos).encode()))
+
+# Usuarios virtuales
+class ResultadosHilo:
+    """Latencias (s) y errores por ruta de un usuario virtual"""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = {}
+        self.errores: Dict[str, int] = {}
+        # Duración real de la prueba: las peticiones en curso al vencer --duracion terminan igual
+        self.segundos = 0.0
+
+    def registrar(self, ruta: str, segundos: float, correcto: bool):
+        self.latencias.setdefault(ruta, []).append(segundos)
+        if not correcto:
+            self.errores[ruta] = self.errores.get(ruta, 0) + 1
+
+def usuario_virtual(cliente, usuario: UsuarioPrueba, password: str, fin: float, escrituras: float,
+                    resultados: ResultadosHilo, semilla: int):
+    """Inicia sesión y repite la mezcla de peticiones hasta `fin`"""
+    azar = random.Random(semilla)
+    inicio = time.perf_counter()
+    estado = cliente.post('/login', {'username': usuario.username, 'password': password})
+    # Un login correcto redirige al inicio; uno fallido vuelve a mostrar el formulario
+    resultados.registrar('POST /login', time.perf_counter() - inicio, estado == 302)
+    if estado != 302:
+        return
+
+    rutas = list(LECTURAS)
+    pesos = [LECTURAS[ruta] for ruta in rutas]
+    while time.monotonic() < fin:
+        if usuario.prestamos_activos and azar.random() < escrituras:
+            datos = {'prestamo_id': azar.choice(usuario.prestamos_activos), 'monto': '1.00',
+                     'concepto': 'Prueba de carga'}
+            inicio = time.perf_counter()
+            estado = cliente.post('/pagos/nuevo', datos)
+            # Con el pago registrado redirige a /pagos; con error vuelve a mostrar el formulario
+            resultados.registrar(ESCRITURA, time.perf_counter() - inicio, estado == 302)
+        else:
+            ruta = azar.choices(rutas, pesos)[0]
+            inicio = time.perf_counter()
+            estado = cliente.get(ruta)
+            resultados.registrar(f'GET {ruta}', time.perf_counter() - inicio, estado in (200, 304))
+        time.sleep(azar.random() * PAUSA_MAXIMA)
+
+def ejecutar_usuarios(crear_cliente, usuarios: List[UsuarioPrueba], password: str, duracion: float,
+                      escrituras: float, semilla: int) -> ResultadosHilo:
+    """Corre un hilo por usuario virtual y junta sus resultados"""
+    inicio = time.monotonic()
+    fin = inicio + duracion
+    por_hilo = [ResultadosHilo() for _ in usuarios]
+    hilos = [threading.Thread(target=usuario_virtual,
+                              args=(crear_cliente(), usuario, password, fin, escrituras, resultados, semilla + i),
+                              daemon=True)
+             for i, (usuario, resultados) in enumerate(zip(usuarios, por_hilo))]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    total = ResultadosHilo()
+    total.segundos = time.monotonic() - inicio
+    for resultados in por_hilo:
+        for ruta, latencias in resultados.latencias.items():
+            total.latencias.setdefault(ruta, []).extend(latencias)
+        for ruta, errores in resultados.errores.items():
+            total.errores[ruta] = total.errores.get(ruta, 0) + errores
+    return total
+
+def _proceso_http(url: str, usuarios: List[UsuarioPrueba], password: str, duracion: float,
+                  escrituras: float, semilla: int):
+    resultados = ejecutar_usuarios(lambda: ClienteHTTP(url), usuarios, password, duracion, escrituras, semilla)
+    return resultados.latencias, resultados.errores, resultados.segundos
+
+def ejecutar_http(url: str, usuarios: List[UsuarioPrueba], password: str, duracion: float,
+                  escrituras: float, semilla: int, procesos: int) -> ResultadosHilo:
+    """Reparte los usuarios virtuales en `procesos` procesos contra el servidor en `url`"""
+    if procesos <= 1:
+        return ejecutar_usuarios(lambda: ClienteHTTP(url), usuarios, password, duracion, escrituras, semilla)
+
+    grupos = [usuarios[i::procesos] for i in range(procesos)]
+    with multiprocessing.get_context('spawn').Pool(procesos) as pool:
+        parciales = pool.starmap(_proceso_http, [(url, grupo, password, duracion, escrituras, semilla + i * 1000)
+                                                 for i, grupo in enumerate(grupos) if grupo])
+    total = ResultadosHilo()
+    for latencias, errores, segundos in parciales:
+        total.segundos = max(total.segundos, segundos)
+        for ruta, valores in latencias.items():
+            total.latencias.setdefault(ruta, []).extend(valores)
+        for ruta, cantidad in errores.items():
+            total.errores[ruta] = total.errores.get(ruta, 0) + cantidad
+    return total
+
+# Servidor
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def iniciar_gunicorn(directorio: str, workers: Optional[int], hilos: Optional[int]):
+    """Arranca gunicorn (gunicorn.conf.py) sobre el directorio de prueba; devuelve (proceso, url)"""
+    puerto = _puerto_libre()
+    comando = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(DIRECTORIO_APP, 'gunicorn.conf.py'),
+               '--bind', f'127.0.0.1:{puerto}', '--chdir', directorio, '--pythonpath', DIRECTORIO_APP,
+               '--pid', os.path.join(directorio, 'gunicorn.pid'), '--access-logfile', '/dev/null',
+               # Una prueba larga no debe reciclar workers a mitad de la medición
+               '--max-requests', '0']
+    if workers:
+        comando += ['--workers', str(workers)]
+    if hilos:
+        comando += ['--threads', str(hilos)]
+    comando.append('prueba_carga:crear_app()')
+
+    entorno = dict(os.environ, LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING'))
+    proceso = subprocess.Popen(comando, env=entorno)
+    url = f'http://127.0.0.1:{puerto}'
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise SystemExit(f"❌ gunicorn terminó con código {proceso.returncode}")
+        try:
+            urllib.request.urlopen(url + '/login', timeout=2).close()
+            print(f"🚀 gunicorn escuchando en {url}")
+            return proceso, url
+        except OSError:
+            time.sleep(0.5)
+    proceso.terminate()
+    raise SystemExit("❌ gunicorn no respondió en 60 segundos")
+
+# Informe
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano de una lista ordenada"""
+    return valores[max(0, math.ceil(len(valores) * p / 100) - 1)]
+
+def resumir(resultados: ResultadosHilo) -> Dict[str, Dict[str, float]]:
+    """Peticiones, errores, peticiones/s y percentiles (ms) por ruta"""
+    resumen = {}
+    for ruta in sorted(resultados.latencias):
+        latencias = sorted(resultados.latencias[ruta])
+        resumen[ruta] = {
+            'peticiones': len(latencias),
+            'errores': resultados.errores.get(ruta, 0),
+            'por_segundo': round(len(latencias) / resultados.segundos, 2),
+            'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+            'p95_ms': round(percentil(latencias, 95) * 1000, 2),
+            'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+            'max_ms': round(latencias[-1] * 1000, 2),
+        }
+    return resumen
+
+def imprimir_resumen(resumen: Dict[str, Dict[str, float]], titulo: str):
+    ancho = max(len(ruta) for ruta in resumen) + 2
+    columnas = ('peticiones', 'errores', 'por_segundo', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+    print()
+    print(f"📊 {titulo}")
+    print('Ruta'.ljust(ancho) + ''.join(c.rjust(12) for c in columnas))
+    for ruta, fila in resumen.items():
+        print(ruta.ljust(ancho) + ''.join(str(fila[c]).rjust(12) for c in columnas))
+    total = sum(fila['peticiones'] for fila in resumen.values())
+    errores = sum(fila['errores'] for fila in resumen.values())
+    print(f"Total: {total} peticiones, {errores} errores, "
+          f"{sum(fila['por_segundo'] for fila in resumen.values()):.1f} peticiones/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de las rutas web con datos sintéticos")
+    parser.add_argument('--modo', choices=('proceso', 'http'), default='proceso')
+    parser.add_argument('--directorio', help="Directorio de trabajo (data/ se genera si no existe)")
+    parser.add_argument('--prestamos', type=int, default=2000, help="Tamaño de la cartera a generar")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--password', default=PASSWORD_PRUEBA, help="Contraseña de los usuarios de la cartera")
+    parser.add_argument('--usuarios-virtuales', type=int, default=32)
+    parser.add_argument('--duracion', type=float, default=30, help="Segundos de carga")
+    parser.add_argument('--escrituras', type=float, default=PROPORCION_ESCRITURAS,
+                        help="Proporción de peticiones que registran pagos (solo operadores)")
+    parser.add_argument('--url', help="Servidor existente (modo http) que use el mismo directorio de datos")
+    parser.add_argument('--gunicorn', action='store_true', help="Arrancar gunicorn local (modo http)")
+    parser.add_argument('--workers', type=int, help="Workers de gunicorn (por defecto, gunicorn.conf.py)")
+    parser.add_argument('--hilos', type=int, help="Hilos por worker de gunicorn (por defecto, gunicorn.conf.py)")
+    parser.add_argument('--procesos', type=int, default=1, help="Procesos generadores de carga (modo http)")
+    parser.add_argument('--json', help="Guardar el resumen en este archivo JSON")
+    args = parser.parse_args()
+
+    if args.modo == 'http' and not (args.url or args.gunicorn):
+        parser.error("el modo http requiere --url o --gunicorn")
+
+    temporal = args.directorio is None
+    directorio = os.path.abspath(args.directorio or tempfile.mkdtemp(prefix='prueba_carga_'))
+    data_dir = preparar_datos(directorio, args.prestamos, args.semilla)
+    usuarios = asignar_usuarios(cargar_usuarios(data_dir), args.usuarios_virtuales)
+    roles = {rol: sum(1 for u in usuarios if u.rol == rol) for rol in dict.fromkeys(u.rol for u in usuarios)}
+    print(f"👥 {len(usuarios)} usuarios virtuales: {', '.join(f'{n} {rol}' for rol, n in roles.items())}")
+
+    servidor = None
+    modulo_app = None
+    try:
+        print(f"⏱️ Carga durante {args.duracion:.0f} s (modo {args.modo})...")
+        if args.modo == 'proceso':
+            os.chdir(directorio)
+            app = crear_app()
+            modulo_app = sys.modules['app_backup']
+            resultados = ejecutar_usuarios(lambda: ClienteProceso(app), usuarios,
+                                           args.password, args.duracion, args.escrituras, args.semilla)
+        else:
+            url = args.url
+            if args.gunicorn:
+                servidor, url = iniciar_gunicorn(directorio, args.workers, args.hilos)
+            resultados = ejecutar_http(url, usuarios, args.password, args.duracion, args.escrituras,
+                                       args.semilla, args.procesos)
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait(30)
+        if modulo_app:
+            modulo_app.pool_pdf.cerrar()
+            modulo_app.cola_trabajos.detener()
+
+    resumen = resumir(resultados)
+    imprimir_resumen(resumen, f"Resultados ({args.modo}, {len(usuarios)} usuarios virtuales, "
+                              f"{resultados.segundos:.1f} s)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'modo': args.modo, 'usuarios_virtuales': len(usuarios), 'duracion': resultados.segundos,
+                       'escrituras': args.escrituras, 'roles': roles, 'rutas': resumen},
+                      f, ensure_ascii=False, indent=2)
+        print(f"💾 Resumen guardado en {args.json}")
+
+    if temporal:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
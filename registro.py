@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Configuración de Logging
+========================
+
+Los mensajes de diagnóstico usan `logging` con niveles en lugar de print():
+con el nivel en INFO (producción) los logger.debug(...) no formatean nada.
+Con el nivel en DEBUG, LOG_MUESTREO_DEBUG (0 a 1) define qué fracción de los
+mensajes DEBUG se emite, para no inundar los logs en rutas muy usadas.
+"""
+
+import logging
+import os
+import random
+
+FORMATO_LOG = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar solo una fracción de los registros de nivel DEBUG"""
+
+    def __init__(self, tasa: float):
+        super().__init__()
+        self.tasa = tasa
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.tasa >= 1:
+            return True
+        return random.random() < self.tasa
+
+def configurar_registro(nivel: str = None, tasa_muestreo: float = None):
+    """Configura el logging de la aplicación según LOG_LEVEL y LOG_MUESTREO_DEBUG"""
+    nivel = (nivel or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    if tasa_muestreo is None:
+        tasa_muestreo = float(os.getenv('LOG_MUESTREO_DEBUG', '1'))
+
+    logging.basicConfig(level=nivel, format=FORMATO_LOG)
+    filtro = FiltroMuestreo(tasa_muestreo)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(filtro)
@@ -1,3 +1,4 @@
+import logging
 from typing import List, Optional, Dict, Any
 from decimal import Decimal
 from datetime import date, datetime
@@ -6,6 +7,12 @@ from database import Database
 from pagare_generator import PagareGenerator
 import json
 
+logger = logging.getLogger(__name__)
+
+# Tipos de trabajo en segundo plano de los pagarés
+TRABAJO_GUARDAR_PAGARE = 'guardar_pagare'
+TRABAJO_ENVIAR_PAGARE_WHATSAPP = 'enviar_pagare_whatsapp'
+
 class ClienteService:
     def __init__(self, db: Database):
         self.db = db
@@ -28,9 +35,9 @@ class ClienteService:
         
         return self.db.agregar_cliente(cliente, usuario_id)
     
-    def buscar_cliente(self, termino: str, usuario_id: int, es_admin: bool = False) -> List[Cliente]:
-        """Busca clientes por nombre, apellido o DNI, respetando el aislamiento de datos"""
-        return self.db.buscar_clientes(termino, usuario_id, es_admin)
+    def buscar_cliente(self, termino: str, usuario_id: int, es_admin: bool = False, limite: int = 20) -> List[Cliente]:
+        """Busca clientes por nombre, apellido, DNI o teléfono, respetando el aislamiento de datos"""
+        return self.db.buscar_clientes(termino, usuario_id, es_admin, limite)
     
     def obtener_cliente(self, cliente_id: int, usuario_id: int, es_admin: bool = False) -> Optional[Cliente]:
         """Obtiene un cliente por ID, respetando el aislamiento de datos"""
@@ -79,9 +86,14 @@ class ClienteService:
 class PrestamoService:
     """Servicio para manejar la lógica de negocio de préstamos"""
     
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, cola=None):
+        """`cola` es una ColaTrabajos opcional; sin ella el pagaré se genera en el momento"""
         self.db = db
         self.pagare_generator = PagareGenerator()
+        self.cola = cola
+        if cola is not None:
+            cola.registrar(TRABAJO_GUARDAR_PAGARE, self._trabajo_guardar_pagare)
+            cola.registrar(TRABAJO_ENVIAR_PAGARE_WHATSAPP, self._trabajo_enviar_pagare_whatsapp)
     
     def crear_prestamo(self, cliente_id: int, monto: Decimal, plazo_dias: int, 
                        tasa_interes: Decimal, tipo_interes: str = "simple", descripcion: str = "", 
@@ -111,43 +123,83 @@ class PrestamoService:
             
             if prestamo_creado:
                 # Generar y enviar pagaré automáticamente
-                self._generar_y_enviar_pagare(cliente, prestamo)
+                if self.cola is not None:
+                    self._encolar_pagare(cliente, prestamo)
+                else:
+                    self._generar_y_enviar_pagare(cliente, prestamo)
                 
                 return prestamo
             else:
                 raise ValueError("Error al crear el préstamo")
                 
         except Exception as e:
-            print(f"❌ Error al crear préstamo: {e}")
+            logger.error("❌ Error al crear préstamo: %s", e)
             raise
     
     def _generar_y_enviar_pagare(self, cliente: Cliente, prestamo: Prestamo):
         """Genera y envía el pagaré automáticamente"""
         try:
-            print(f"📋 Generando pagaré para préstamo #{prestamo.id}...")
+            logger.info("📋 Generando pagaré para préstamo #%s...", prestamo.id)
             
             # 1. Guardar pagaré como archivo HTML
             archivo_pagare = self.pagare_generator.guardar_pagare_archivo(cliente, prestamo)
             
             if archivo_pagare:
-                print(f"✅ Pagaré guardado en: {archivo_pagare}")
+                logger.info("✅ Pagaré guardado en: %s", archivo_pagare)
             
             # 2. Enviar por WhatsApp
             if cliente.telefono:
-                print(f"📱 Enviando pagaré por WhatsApp a {cliente.telefono}...")
+                logger.info("📱 Enviando pagaré por WhatsApp a %s...", cliente.telefono)
                 enviado = self.pagare_generator.enviar_pagare_whatsapp(cliente, prestamo)
                 
                 if enviado:
-                    print(f"✅ Pagaré enviado exitosamente por WhatsApp")
+                    logger.info("✅ Pagaré del préstamo #%s enviado por WhatsApp", prestamo.id)
                 else:
-                    print(f"⚠️  No se pudo enviar el pagaré por WhatsApp")
+                    logger.warning("⚠️ No se pudo enviar el pagaré del préstamo #%s por WhatsApp", prestamo.id)
             else:
-                print(f"⚠️  Cliente sin teléfono, no se puede enviar por WhatsApp")
+                logger.warning("⚠️ Cliente %s sin teléfono, no se puede enviar el pagaré por WhatsApp", cliente.id)
                 
         except Exception as e:
-            print(f"❌ Error al generar/enviar pagaré: {e}")
+            logger.exception("❌ Error al generar/enviar el pagaré del préstamo #%s: %s", prestamo.id, e)
             # No fallar la creación del préstamo por errores en el pagaré
     
+    def _encolar_pagare(self, cliente: Cliente, prestamo: Prestamo):
+        """Deja la generación y el envío del pagaré en la cola de trabajos"""
+        datos = {'prestamo_id': prestamo.id, 'usuario_id': prestamo.usuario_id}
+        self.cola.encolar(TRABAJO_GUARDAR_PAGARE, datos)
+        if cliente.telefono:
+            # Un solo intento: el envío abre WhatsApp en el navegador y no hay
+            # forma de saber si el mensaje salió, reintentarlo lo duplicaría
+            self.cola.encolar(TRABAJO_ENVIAR_PAGARE_WHATSAPP, datos, max_intentos=1)
+        else:
+            logger.warning("⚠️ Cliente %s sin teléfono, no se puede enviar el pagaré por WhatsApp", cliente.id)
+    
+    def _cargar_pagare(self, datos: Dict[str, Any]):
+        """Obtiene el préstamo y el cliente de un trabajo de pagaré (sin filtro de usuario)"""
+        prestamo = self.db.obtener_prestamo(datos['prestamo_id'], None, es_admin=True)
+        if not prestamo:
+            raise ValueError(f"Préstamo #{datos['prestamo_id']} no encontrado")
+        
+        cliente = self.db.obtener_cliente(prestamo.cliente_id, prestamo.usuario_id, es_admin=True)
+        if not cliente:
+            raise ValueError(f"Cliente #{prestamo.cliente_id} no encontrado")
+        return cliente, prestamo
+    
+    def _trabajo_guardar_pagare(self, datos: Dict[str, Any]) -> Dict[str, Any]:
+        """Trabajo en segundo plano: guarda el pagaré como archivo HTML"""
+        cliente, prestamo = self._cargar_pagare(datos)
+        archivo_pagare = self.pagare_generator.guardar_pagare_archivo(cliente, prestamo)
+        if not archivo_pagare:
+            raise RuntimeError(f"No se pudo guardar el pagaré del préstamo #{prestamo.id}")
+        return {'archivo': archivo_pagare}
+    
+    def _trabajo_enviar_pagare_whatsapp(self, datos: Dict[str, Any]) -> Dict[str, Any]:
+        """Trabajo en segundo plano: envía el pagaré por WhatsApp"""
+        cliente, prestamo = self._cargar_pagare(datos)
+        if not self.pagare_generator.enviar_pagare_whatsapp(cliente, prestamo):
+            raise RuntimeError(f"No se pudo enviar el pagaré del préstamo #{prestamo.id} por WhatsApp")
+        return {'telefono': cliente.telefono}
+    
     def listar_prestamos(self, usuario_id: int, es_admin: bool = False) -> list:
         """Lista todos los préstamos del usuario"""
         return self.db.listar_prestamos(usuario_id, es_admin)
@@ -166,36 +218,36 @@ class PrestamoService:
     
     def listar_prestamos_activos(self, usuario_id: int, es_admin: bool = False) -> list:
         """Lista solo los préstamos activos"""
-        print(f"🔍 listar_prestamos_activos - usuario_id: {usuario_id}, es_admin: {es_admin}")
+        logger.debug("🔍 listar_prestamos_activos - usuario_id: %s, es_admin: %s", usuario_id, es_admin)
         
         # Si usuario_id es None, significa que es un supervisor que quiere ver todos los usuarios no-admin
         if usuario_id is None:
-            print(f"👁️ Supervisor - usuario_id es None, listando préstamos de usuarios no-admin")
+            logger.debug("👁️ Supervisor - usuario_id es None, listando préstamos de usuarios no-admin")
             prestamos = self.db.listar_prestamos(None, False)
             prestamos_activos = [p for p in prestamos if p.estado == "activo"]
-            print(f"📊 Préstamos totales: {len(prestamos)}, Activos: {len(prestamos_activos)}")
+            logger.debug("📊 Préstamos totales: %s, Activos: %s", len(prestamos), len(prestamos_activos))
             return prestamos_activos
         
         # Obtener el usuario actual para verificar su rol
         usuario_actual = self.db.obtener_usuario(usuario_id, usuario_id, False)
-        print(f"👤 Usuario actual: {usuario_actual.username if usuario_actual else 'None'}, Rol: {usuario_actual.rol if usuario_actual else 'None'}")
+        logger.debug("👤 Usuario actual: %s, Rol: %s", usuario_actual.username if usuario_actual else 'None', usuario_actual.rol if usuario_actual else 'None')
         
         # Para supervisores, usar filtrado especial
         if usuario_actual and usuario_actual.rol in ['supervisor', 'consultor']:
-            print(f"👁️ Usuario es supervisor/consultor - usando filtrado especial")
+            logger.debug("👁️ Usuario es supervisor/consultor - usando filtrado especial")
             es_admin = False  # Usar filtrado de supervisor en lugar de admin
             # Para supervisores, pasar None como usuario_id para que vea todos los usuarios no-admin
             prestamos = self.db.listar_prestamos(None, es_admin)
         elif usuario_actual and usuario_actual.rol == 'admin':
-            print(f"👑 Usuario es admin - usando filtrado de admin")
+            logger.debug("👑 Usuario es admin - usando filtrado de admin")
             es_admin = True
             prestamos = self.db.listar_prestamos(usuario_id, es_admin)
         else:
-            print(f"👤 Usuario normal - usando filtrado estándar")
+            logger.debug("👤 Usuario normal - usando filtrado estándar")
             prestamos = self.db.listar_prestamos(usuario_id, es_admin)
         
         prestamos_activos = [p for p in prestamos if p.estado == "activo"]
-        print(f"📊 Préstamos encontrados: {len(prestamos)}, Activos: {len(prestamos_activos)}")
+        logger.debug("📊 Préstamos encontrados: %s, Activos: %s", len(prestamos), len(prestamos_activos))
         return prestamos_activos
     
     def calcular_estadisticas_prestamos(self, usuario_id: int, es_admin: bool = False) -> dict:
@@ -310,6 +362,97 @@ class PagoService:
         else:
             raise ValueError("Error al guardar el pago")
     
+    def importar_pagos(self, filas: List[Dict[str, Any]], usuario_id: int, es_admin: bool = False,
+                       parcial: bool = False) -> Dict[str, Any]:
+        """Registra un lote de pagos (p. ej. la rendición diaria de un cobrador).
+        
+        Todas las filas se validan en una pasada contra los saldos actuales (los
+        pagos anteriores del mismo lote ya cuentan) y se guardan con una sola
+        escritura. Si alguna fila tiene errores no se aplica nada, salvo con
+        `parcial`, que guarda las filas válidas. Devuelve el resultado por fila.
+        """
+        prestamos = self.db.obtener_prestamos_por_id(usuario_id, es_admin)
+        resultados = []
+        pagos = []
+        modificados = {}
+        
+        for numero, fila in enumerate(filas, start=1):
+            try:
+                prestamo_id, monto, concepto, fecha = self._leer_fila_pago(fila)
+                
+                prestamo = prestamos.get(prestamo_id)
+                if not prestamo:
+                    raise ValueError(f"No existe un préstamo con ID {prestamo_id} o no tienes permisos para acceder a él")
+                if prestamo.estado != "activo":
+                    raise ValueError("No se puede registrar un pago en un préstamo no activo")
+                if monto <= 0:
+                    raise ValueError("El monto del pago debe ser mayor a 0")
+                
+                saldo_pendiente = prestamo.calcular_saldo_pendiente()
+                if monto > saldo_pendiente:
+                    raise ValueError(f"El monto del pago ({monto}) excede el saldo pendiente ({saldo_pendiente})")
+            except ValueError as e:
+                resultados.append({'fila': numero, 'ok': False, 'error': str(e)})
+                continue
+            
+            pago = Pago(id=0, prestamo_id=prestamo_id, monto=monto, fecha=fecha, concepto=concepto,
+                        usuario_id=usuario_id)
+            prestamo.agregar_pago(pago)  # Calcula saldo_despues y marca el préstamo pagado
+            pagos.append(pago)
+            modificados[prestamo_id] = prestamo
+            resultados.append({'fila': numero, 'ok': True, 'prestamo_id': prestamo_id, 'monto': float(monto),
+                               'saldo_despues': float(pago.saldo_despues), 'pago': pago})
+        
+        errores = sum(1 for r in resultados if not r['ok'])
+        aplicado = bool(pagos) and (parcial or errores == 0)
+        if aplicado:
+            self.db.agregar_pagos_lote(pagos, list(modificados.values()), usuario_id)
+        
+        for resultado in resultados:
+            pago = resultado.pop('pago', None)
+            if pago is not None and aplicado:
+                resultado['pago_id'] = pago.id
+        
+        logger.info("💰 Importación de pagos: %s filas, %s válidas, %s con errores, aplicada=%s",
+                    len(resultados), len(pagos), errores, aplicado)
+        return {
+            'aplicado': aplicado,
+            'total': len(resultados),
+            'aplicados': len(pagos) if aplicado else 0,
+            'errores': errores,
+            'resultados': resultados
+        }
+    
+    @staticmethod
+    def _leer_fila_pago(fila: Dict[str, Any]):
+        """Convierte una fila de importación en (prestamo_id, monto, concepto, fecha)"""
+        try:
+            prestamo_id = int(str(fila['prestamo_id']).strip())
+        except KeyError:
+            raise ValueError("Falta la columna prestamo_id")
+        except (TypeError, ValueError):
+            raise ValueError(f"prestamo_id inválido: {fila.get('prestamo_id')!r}")
+        
+        try:
+            monto = Decimal(str(fila['monto']).strip())
+        except KeyError:
+            raise ValueError("Falta la columna monto")
+        except (ArithmeticError, TypeError, ValueError):
+            raise ValueError(f"Monto inválido: {fila.get('monto')!r}")
+        if not monto.is_finite():
+            raise ValueError(f"Monto inválido: {fila.get('monto')!r}")
+        
+        concepto = str(fila.get('concepto') or '').strip() or "Pago de cuota"
+        
+        fecha = None
+        if fila.get('fecha'):
+            try:
+                fecha = datetime.fromisoformat(str(fila['fecha']).strip())
+            except ValueError:
+                raise ValueError(f"Fecha inválida (use AAAA-MM-DD): {fila['fecha']!r}")
+        
+        return prestamo_id, monto, concepto, fecha
+    
     def listar_pagos_prestamo(self, prestamo_id: int, usuario_id: int, es_admin: bool = False) -> List[Pago]:
         """Lista todos los pagos de un préstamo específico, respetando el aislamiento de datos"""
         # Si usuario_id es None, significa que es un supervisor que quiere ver todos los usuarios no-admin
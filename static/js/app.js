@@ -3,7 +3,8 @@
 // Configuración global
 const APP_CONFIG = {
     apiBaseUrl: '',
-    refreshInterval: 30000, // 30 segundos
+    eventsUrl: '/api/eventos',
+    refreshInterval: 30000, // 30 segundos (solo si el navegador no soporta EventSource)
     animationDuration: 300
 };
 
@@ -65,11 +66,41 @@ class SistemaPrestamosApp {
 
     setupAutoRefresh() {
         // Actualizar estadísticas automáticamente si estamos en la página principal
-        if (window.location.pathname === '/') {
+        if (window.location.pathname !== '/') {
+            return;
+        }
+
+        if (!window.EventSource) {
+            // Navegadores sin SSE: consultar periódicamente
             setInterval(() => {
                 this.refreshStats();
             }, APP_CONFIG.refreshInterval);
+            return;
         }
+
+        this.connectEvents();
+    }
+
+    connectEvents() {
+        // El servidor envía solo las estadísticas que cambiaron; EventSource reconecta solo
+        this.eventSource = new EventSource(APP_CONFIG.eventsUrl);
+        this.eventSource.addEventListener('estadisticas', (event) => {
+            this.publishStats(JSON.parse(event.data));
+        });
+        this.eventSource.addEventListener('error', () => {
+            // Con un 503 (demasiados streams en el servidor) EventSource no reconecta:
+            // actualizar una vez y volver a intentar más tarde
+            if (this.eventSource.readyState === EventSource.CLOSED) {
+                this.refreshStats();
+                setTimeout(() => this.connectEvents(), APP_CONFIG.refreshInterval);
+            }
+        });
+    }
+
+    publishStats(stats) {
+        // Notificar a la página (p. ej. index.html) y actualizar los contadores genéricos
+        document.dispatchEvent(new CustomEvent('estadisticas-actualizadas', { detail: stats }));
+        this.updateStatsDisplay(stats);
     }
 
     setupFormValidation() {
@@ -183,7 +214,7 @@ class SistemaPrestamosApp {
             }
 
             // Actualizar estadísticas en la página
-            this.updateStatsDisplay(data);
+            this.publishStats(data);
             
         } catch (error) {
             console.error('Error al actualizar estadísticas:', error);
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Script para probar la bandeja de salida de emails
+=================================================
+
+Levanta un servidor SMTP local de depuración (sin TLS ni login) que guarda
+los mensajes recibidos y verifica que la bandeja los entregue reutilizando
+una sola conexión.
+"""
+
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+from email.mime.text import MIMEText
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bandeja_salida import BandejaSalida, ESTADO_ENVIADO, ESTADO_FALLIDO, ESTADO_PENDIENTE
+
+class ServidorSMTPDepuracion(socketserver.ThreadingTCPServer):
+    """Servidor SMTP mínimo que acepta todo y guarda los mensajes en memoria"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ManejadorSMTP)
+        self.mensajes = []
+        self.conexiones = 0
+        # Respuesta a RCPT TO por dirección (las demás se aceptan)
+        self.rechazos = {}
+
+class ManejadorSMTP(socketserver.StreamRequestHandler):
+    def responder(self, linea: str):
+        self.wfile.write(f"{linea}\r\n".encode())
+
+    def handle(self):
+        self.server.conexiones += 1
+        self.responder("220 localhost depuracion")
+        while True:
+            linea = self.rfile.readline().decode().strip()
+            comando = linea[:4].upper()
+            if not linea or comando == 'QUIT':
+                self.responder("221 adios")
+                return
+            if comando in ('EHLO', 'HELO'):
+                self.responder("250 localhost")
+            elif comando == 'RCPT':
+                direccion = linea.split(':', 1)[1].strip(' <>')
+                self.responder(self.server.rechazos.get(direccion, "250 ok"))
+            elif comando == 'DATA':
+                self.responder("354 fin con .")
+                lineas = []
+                while True:
+                    dato = self.rfile.readline().decode()
+                    if dato.rstrip('\r\n') == '.':
+                        break
+                    lineas.append(dato)
+                self.server.mensajes.append(''.join(lineas))
+                self.responder("250 aceptado")
+            else:
+                # MAIL, NOOP, RSET
+                self.responder("250 ok")
+
+def test_bandeja_salida():
+    """Encola varios emails y verifica su entrega por una sola conexión"""
+    print("📧 Probando bandeja de salida...")
+
+    servidor = ServidorSMTPDepuracion()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        bandeja = BandejaSalida(os.path.join(directorio, 'bandeja.db'), '127.0.0.1',
+                                servidor.server_address[1], usar_tls=False, tamano_lote=2)
+
+        ids = []
+        for i in range(5):
+            msg = MIMEText(f"Mensaje de prueba {i}", 'plain', 'utf-8')
+            msg['From'] = 'sistema@localhost'
+            msg['To'] = f'cliente{i}@localhost'
+            msg['Subject'] = f'Prueba {i}'
+            ids.append(bandeja.encolar(msg))
+
+        enviados = bandeja.enviar_pendientes()
+        bandeja.detener()
+
+        print(f"   Enviados: {enviados}, recibidos por el servidor: {len(servidor.mensajes)}")
+        print(f"   Conexiones SMTP abiertas: {servidor.conexiones}")
+
+        assert enviados == 5
+        assert len(servidor.mensajes) == 5
+        assert servidor.conexiones == 1
+        assert all(bandeja.obtener(i)['estado'] == ESTADO_ENVIADO for i in ids)
+
+    servidor.shutdown()
+    print("✅ Bandeja de salida funcionando correctamente")
+    return True
+
+def test_bandeja_salida_rechazos():
+    """Un rechazo temporal (4xx) de destinatarios se reintenta; uno definitivo (5xx) no"""
+    print("📧 Probando rechazos de destinatarios...")
+
+    servidor = ServidorSMTPDepuracion()
+    servidor.rechazos = {'lleno@localhost': "452 buzon lleno", 'noexiste@localhost': "550 no existe"}
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        bandeja = BandejaSalida(os.path.join(directorio, 'bandeja.db'), '127.0.0.1',
+                                servidor.server_address[1], usar_tls=False)
+
+        ids = {}
+        for destinatarios in (['lleno@localhost'], ['noexiste@localhost'], ['lleno@localhost', 'noexiste@localhost']):
+            msg = MIMEText("Mensaje de prueba", 'plain', 'utf-8')
+            msg['From'] = 'sistema@localhost'
+            msg['To'] = ', '.join(destinatarios)
+            msg['Subject'] = 'Prueba de rechazo'
+            ids[tuple(destinatarios)] = bandeja.encolar(msg)
+
+        bandeja.enviar_pendientes()
+        bandeja.detener()
+
+        estados = {destinatarios: bandeja.obtener(i)['estado'] for destinatarios, i in ids.items()}
+        print(f"   Estados: {estados}")
+        assert estados[('lleno@localhost',)] == ESTADO_PENDIENTE
+        assert estados[('noexiste@localhost',)] == ESTADO_FALLIDO
+        assert estados[('lleno@localhost', 'noexiste@localhost')] == ESTADO_PENDIENTE
+
+    servidor.shutdown()
+    print("✅ Rechazos de destinatarios clasificados correctamente")
+    return True
+
+if __name__ == "__main__":
+    test_bandeja_salida()
+    test_bandeja_salida_rechazos()
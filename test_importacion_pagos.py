@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Script para probar la importación masiva de pagos
+=================================================
+
+Crea una base de datos temporal con dos operadores y verifica que
+PagoService.importar_pagos:
+
+- no aplique nada si alguna fila tiene errores (todo o nada),
+- con `parcial` guarde solo las filas válidas,
+- cuente los pagos anteriores del mismo lote al validar el saldo,
+- rechace los préstamos que el usuario no puede ver.
+"""
+
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from importacion_pagos import es_verdadero
+from models import Cliente, Prestamo, Usuario
+from services import PagoService
+
+def crear_cartera(directorio: str):
+    """Base de datos con un préstamo activo por operador; devuelve (db, operador1, operador2, prestamo1, prestamo2)"""
+    db = Database(directorio)
+    admin = db.agregar_usuario(Usuario(0, 'admin', 'x', 'Administrador', rol='admin'), None)
+    operadores, prestamos = [], []
+    for numero in (1, 2):
+        operador = db.agregar_usuario(Usuario(0, f'operador{numero}', 'x', f'Operador {numero}', rol='operador'),
+                                      admin.id)
+        cliente = db.agregar_cliente(Cliente(0, 'Cliente', str(numero), f'1000000{numero}', '999000000'), operador.id)
+        # Interés simple a un año: el total (1100) es exacto y el saldo llega a cero
+        prestamo = db.agregar_prestamo(Prestamo(0, cliente.id, Decimal('1000'), Decimal('10'), 365, 'simple'),
+                                       operador.id)
+        operadores.append(operador)
+        prestamos.append(prestamo)
+    return (db, *operadores, *prestamos)
+
+def saldo(db: Database, prestamo_id: int) -> Decimal:
+    return db.obtener_prestamos_por_id(None, True)[prestamo_id].calcular_saldo_pendiente()
+
+def test_importacion_todo_o_nada():
+    """Una fila inválida impide aplicar todo el lote; con parcial se guardan las válidas"""
+    print("💰 Probando importación todo o nada / parcial...")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        db, operador, _, prestamo, _ = crear_cartera(directorio)
+        servicio = PagoService(db)
+        saldo_inicial = saldo(db, prestamo.id)
+        filas = [{'prestamo_id': prestamo.id, 'monto': '100'}, {'prestamo_id': 999, 'monto': '50'}]
+
+        resultado = servicio.importar_pagos(filas, operador.id)
+        print(f"   Sin parcial: aplicado={resultado['aplicado']}, errores={resultado['errores']}")
+        assert not resultado['aplicado']
+        assert resultado['aplicados'] == 0 and resultado['errores'] == 1
+        assert db.listar_pagos(operador.id) == []
+        assert saldo(db, prestamo.id) == saldo_inicial
+
+        resultado = servicio.importar_pagos(filas, operador.id, parcial=True)
+        print(f"   Con parcial: aplicado={resultado['aplicado']}, aplicados={resultado['aplicados']}")
+        assert resultado['aplicado']
+        assert resultado['aplicados'] == 1 and resultado['errores'] == 1
+        assert [r['ok'] for r in resultado['resultados']] == [True, False]
+        assert 'pago_id' in resultado['resultados'][0]
+        assert len(db.listar_pagos(operador.id)) == 1
+        assert saldo(db, prestamo.id) == saldo_inicial - 100
+
+    print("✅ Todo o nada y parcial funcionando correctamente")
+    return True
+
+def test_importacion_saldo_acumulado():
+    """Varias filas del mismo préstamo: la que excede el saldo restante se rechaza"""
+    print("💰 Probando filas que en conjunto exceden el saldo...")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        db, operador, _, prestamo, _ = crear_cartera(directorio)
+        servicio = PagoService(db)
+        saldo_inicial = saldo(db, prestamo.id)
+        filas = [{'prestamo_id': prestamo.id, 'monto': str(saldo_inicial - 10)},
+                 {'prestamo_id': prestamo.id, 'monto': '20'},
+                 {'prestamo_id': prestamo.id, 'monto': '10'}]
+
+        resultado = servicio.importar_pagos(filas, operador.id)
+        print(f"   Sin parcial: aplicado={resultado['aplicado']}, errores={resultado['errores']}")
+        assert not resultado['aplicado']
+        assert [r['ok'] for r in resultado['resultados']] == [True, False, True]
+        assert 'excede el saldo' in resultado['resultados'][1]['error']
+        assert saldo(db, prestamo.id) == saldo_inicial
+
+        resultado = servicio.importar_pagos(filas, operador.id, parcial=True)
+        print(f"   Con parcial: aplicados={resultado['aplicados']}, saldo final={saldo(db, prestamo.id)}")
+        assert resultado['aplicados'] == 2
+        assert saldo(db, prestamo.id) == 0
+        assert db.obtener_prestamos_por_id(None, True)[prestamo.id].estado == 'pagado'
+
+    print("✅ Validación del saldo acumulado funcionando correctamente")
+    return True
+
+def test_importacion_visibilidad():
+    """Un operador no puede registrar pagos en préstamos de otro operador"""
+    print("💰 Probando visibilidad de préstamos en la importación...")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        db, operador1, operador2, prestamo1, prestamo2 = crear_cartera(directorio)
+        servicio = PagoService(db)
+        saldo_ajeno = saldo(db, prestamo2.id)
+
+        resultado = servicio.importar_pagos([{'prestamo_id': prestamo2.id, 'monto': '100'}], operador1.id,
+                                            parcial=True)
+        print(f"   Préstamo ajeno: aplicado={resultado['aplicado']}, error={resultado['resultados'][0].get('error')}")
+        assert not resultado['aplicado']
+        assert 'no tienes permisos' in resultado['resultados'][0]['error']
+        assert saldo(db, prestamo2.id) == saldo_ajeno
+
+        resultado = servicio.importar_pagos([{'prestamo_id': prestamo1.id, 'monto': '100'},
+                                             {'prestamo_id': prestamo2.id, 'monto': '100'}], operador2.id)
+        assert not resultado['aplicado']
+        assert [r['ok'] for r in resultado['resultados']] == [False, True]
+
+    print("✅ Visibilidad en la importación funcionando correctamente")
+    return True
+
+def test_opcion_parcial():
+    """La opción parcial del formulario o JSON: "false" y "0" no la activan"""
+    assert es_verdadero(True) and es_verdadero(1) and es_verdadero('true') and es_verdadero('Sí')
+    assert not any(es_verdadero(valor) for valor in (False, 0, None, '', 'false', '0', 'no'))
+    return True
+
+if __name__ == "__main__":
+    test_importacion_todo_o_nada()
+    test_importacion_saldo_acumulado()
+    test_importacion_visibilidad()
+    test_opcion_parcial()
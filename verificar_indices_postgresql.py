@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Verificación de Índices con EXPLAIN
+===================================
+
+Ejecuta EXPLAIN sobre las consultas frecuentes del adaptador PostgreSQL y
+comprueba que cada una pueda resolverse con un índice. Las consultas se
+planifican con enable_seqscan desactivado: así el resultado no depende del
+tamaño de las tablas (con pocas filas PostgreSQL siempre prefiere leer la
+tabla entera) y un Seq Scan en el plan significa que ningún índice sirve.
+
+Sale con código 1 si alguna consulta no usa el índice esperado, para poder
+usarlo después de aplicar las migraciones o en CI.
+
+Uso: python verificar_indices_postgresql.py [--analyze] [--plan]
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, Set, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# (nombre, consulta, parámetros, tabla que debe leerse por índice)
+CONSULTAS: List[Tuple[str, str, tuple, str]] = [
+    ("préstamos activos de un dueño", """
+        SELECT p.* FROM prestamos p
+        WHERE p.usuario_id = %s AND p.estado = 'activo'
+        ORDER BY p.fecha_creacion DESC
+    """, (1,), 'prestamos'),
+    ("préstamos activos (admin)", """
+        SELECT p.* FROM prestamos p
+        WHERE p.estado = 'activo'
+        ORDER BY p.fecha_creacion DESC
+    """, (), 'prestamos'),
+    ("estadísticas de préstamos de un dueño", """
+        SELECT COUNT(*), SUM(CASE WHEN estado = 'activo' THEN monto_restante ELSE 0 END)
+        FROM prestamos WHERE usuario_id = %s
+    """, (1,), 'prestamos'),
+    ("préstamo por id y dueño", """
+        SELECT * FROM prestamos WHERE id = %s AND usuario_id = %s
+    """, (1, 1), 'prestamos'),
+    ("pagos de un préstamo", """
+        SELECT p.* FROM pagos p
+        WHERE p.prestamo_id = %s
+        ORDER BY p.fecha_pago DESC
+    """, (1,), 'pagos'),
+    ("pagos de los préstamos de un dueño", """
+        SELECT COUNT(*), SUM(p.monto)
+        FROM pagos p JOIN prestamos pr ON p.prestamo_id = pr.id
+        WHERE pr.usuario_id = %s
+    """, (1,), 'pagos'),
+    ("clientes activos de un dueño", """
+        SELECT * FROM clientes
+        WHERE usuario_id = %s AND activo = TRUE
+        ORDER BY nombre, apellido
+    """, (1,), 'clientes'),
+    ("cliente por DNI", """
+        SELECT * FROM clientes WHERE dni = %s AND activo = TRUE
+    """, ('00000000',), 'clientes'),
+    ("usuario por username", """
+        SELECT * FROM usuarios WHERE username = %s AND activo = TRUE
+    """, ('admin',), 'usuarios'),
+]
+
+def _recorrer_plan(nodo: Dict[str, Any], secuenciales: Set[str], indices: Set[str]):
+    """Junta las tablas leídas secuencialmente y los índices usados en el plan"""
+    tipo = nodo.get('Node Type', '')
+    if tipo == 'Seq Scan':
+        secuenciales.add(nodo.get('Relation Name'))
+    if 'Index Name' in nodo:
+        indices.add(nodo['Index Name'])
+    for hijo in nodo.get('Plans', []):
+        _recorrer_plan(hijo, secuenciales, indices)
+
+def verificar(conexion, analyze: bool = False, mostrar_plan: bool = False) -> bool:
+    """Verifica todas las consultas; devuelve True si todas usan índices"""
+    opciones = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    correcto = True
+
+    with conexion.cursor() as cursor:
+        cursor.execute("SET enable_seqscan = off")
+        for nombre, consulta, parametros, tabla in CONSULTAS:
+            cursor.execute(f"EXPLAIN ({opciones}) {consulta}", parametros or None)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            raiz = plan[0]
+
+            secuenciales, indices = set(), set()
+            _recorrer_plan(raiz['Plan'], secuenciales, indices)
+
+            if tabla in secuenciales:
+                correcto = False
+                print(f"❌ {nombre}: lectura secuencial de {tabla}")
+            else:
+                detalle = f"{raiz['Execution Time']:.2f} ms" if analyze else f"costo {raiz['Plan']['Total Cost']:.0f}"
+                print(f"✅ {nombre}: {', '.join(sorted(indices)) or 'sin índices'} ({detalle})")
+
+            if mostrar_plan:
+                print(json.dumps(raiz['Plan'], indent=2, ensure_ascii=False))
+        cursor.execute("RESET enable_seqscan")
+
+    # EXPLAIN ANALYZE ejecuta las consultas: no dejar nada abierto
+    conexion.rollback()
+    return correcto
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica con EXPLAIN que las consultas frecuentes usen índices")
+    parser.add_argument('--analyze', action='store_true', help="Usar EXPLAIN ANALYZE (ejecuta las consultas)")
+    parser.add_argument('--plan', action='store_true', help="Mostrar el plan completo de cada consulta")
+    args = parser.parse_args()
+
+    import psycopg2
+    from config_database import DatabaseConfig
+
+    if not DatabaseConfig.is_postgresql():
+        print("❌ DATABASE_URL no apunta a PostgreSQL")
+        sys.exit(1)
+
+    conexion = psycopg2.connect(DatabaseConfig.get_database_url())
+    try:
+        print("🔍 Verificando planes de las consultas frecuentes...")
+        correcto = verificar(conexion, args.analyze, args.plan)
+    finally:
+        conexion.close()
+
+    if not correcto:
+        print("⚠️ Hay consultas sin índice: aplique las migraciones (python migraciones_postgresql.py)")
+        sys.exit(1)
+    print("🎉 Todas las consultas usan índices")
+
+if __name__ == "__main__":
+    main()